@@ -1,268 +1,3247 @@
-import cv2
 import os
+import sys
 import ssl
+import bisect
 import time
 import json
+import math
+import queue
+import signal
+import shutil
+import sqlite3
+import importlib
+import itertools
+import subprocess
+import threading
+import multiprocessing
 import numpy as np
-import paho.mqtt.client as mqtt
-from gpiozero import LED
-from ultralytics import YOLO
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from collections import deque
-from typing import Dict, List, Optional, Tuple, Any
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+from multiprocessing import shared_memory
+from collections import Counter, OrderedDict, deque
+from contextlib import closing
+from typing import Callable, Dict, List, Optional, Tuple, Any
+
+PROCESS_START_TIME = time.perf_counter()
+
+class LazyModule:
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def load(self) -> Any:
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attribute: str) -> Any:
+        return getattr(self.load(), attribute)
+
+# Modul berat baru di-import saat pertama dipakai (startup lebih cepat, bisa paralel)
+cv2 = LazyModule("cv2")
+mqtt = LazyModule("paho.mqtt.client")
+gpiozero = LazyModule("gpiozero")
+yaml = LazyModule("yaml")
 
 class CameraConfig:
-    SOURCE = "usb0"
+    SOURCE = "usb0"                            # usbN (V4L2), picamN (picamera2/libcamera), file video, rtsp://...
     RESOLUTION_WIDTH = 640
     RESOLUTION_HEIGHT = 480
     FPS_BUFFER_SIZE = 50
+    FPS = 30                                   # Frame rate yang diminta dari driver
+    FOURCC = "MJPG"                            # "MJPG" (hemat bandwidth USB) atau "YUYV" (tanpa decode JPEG)
+    DRIVER_BUFFERS = 1                         # CAP_PROP_BUFFERSIZE, frame yang boleh antri di driver
+    FRAME_BUFFERS = 8                          # Buffer decode bergiliran, harus > frame yang tertahan di pipeline
+    HW_DECODE = True                           # Decode hardware untuk file/RTSP jika didukung build OpenCV
+    READ_TIMEOUT = 2.0                         # Stream dianggap putus jika tidak ada frame selama ini (detik)
+    RECONNECT_DELAY = 0.5                      # Jeda awal reconnect kamera (detik), naik 2x per percobaan
+    RECONNECT_MAX_DELAY = 10.0
 
 class MotionDetectionConfig:
     ENABLED = True                             # Aktifkan deteksi gerakan
     DETECTION_DURATION = 1.0                   # Durasi minimum deteksi (detik)
-    MOVEMENT_THRESHOLD = 85.0                  # Threshold pergerakan posisi (pixel)
-    POSITION_BUFFER_SIZE = 15                  # Ukuran buffer posisi 
+    # Jarak dinormalisasi diagonal box orang (body), kecepatan per detik: tidak bergantung FPS/resolusi
+    MOVEMENT_SPEED_THRESHOLD = 0.4             # Kecepatan pusat pose minimum (body/detik)
+    RELATIVE_MOVEMENT_RATE = 0.3               # Rata2 perpindahan keypoint minimum (body/detik)
+    KEYPOINT_STABILITY_RATE = 0.8              # Perubahan bentuk pose maksimum, translasi diabaikan (body/detik)
+    MIN_PAIR_INTERVAL = 0.2                    # Jarak waktu minimum frame pembanding (detik)
+    MAX_PAIR_GAP = 1.0                         # Frame lebih jauh dari ini tidak dibandingkan (detik)
+    MOTION_WINDOW = 4.0                        # Window riwayat pose (detik)
+    POSITION_BUFFER_SIZE = 128                 # Kapasitas buffer posisi, >= FPS x MOTION_WINDOW
     CONFIDENCE_THRESHOLD = 0.5                 # Keypoint harus >50% confidence
-    STABLE_DETECTION_FRAMES = 10               # Frame minimum untuk deteksi stabil
+    STABLE_DETECTION_TIME = 1.0                # Durasi minimum orang terdeteksi (detik)
+    PRESENCE_SATURATION = 1.5                  # Batas akumulasi waktu terdeteksi (detik)
+    STABLE_POSE_TIME = 0.3                     # Durasi minimum pose stabil (detik)
     MOTION_COOLDOWN = 1.0                      # Jeda setelah gerakan berhenti
     MIN_MOVEMENT_POINTS = 3                    # Minimum titik gerakan signifikan
-    RELATIVE_MOVEMENT_THRESHOLD = 0.15         # Threshold gerakan relatif
-    KEYPOINT_STABILITY_THRESHOLD = 0.05        # Threshold stabilitas keypoint
     MIN_STABLE_KEYPOINTS = 5                   # Minimum keypoint stabil yang diperlukan
     AUTO_OFF_DELAY = 10.0                      # Delay auto-off setelah tidak ada gerakan
 
+class InferenceConfig:
+    BACKEND = "ncnn"                           # "ncnn" (langsung) atau "ultralytics"
+    MODEL_PATH = "yolo11n-pose_ncnn_model"
+    NUM_THREADS = 4                            # Thread ncnn per inferensi
+    CONFIDENCE_THRESHOLD = 0.25                # Skor minimum box person
+    IOU_THRESHOLD = 0.7                        # Threshold NMS
+    MAX_CANDIDATES = 300                       # Kandidat maksimum sebelum NMS
+    MAX_DETECTIONS = 20
+
+class TrackingConfig:
+    MAX_TRACKS = 10                            # Jumlah orang maksimum yang dilacak
+    IOU_MATCH_THRESHOLD = 0.3                  # IoU minimum untuk mencocokkan box dengan track
+    MAX_CENTROID_DISTANCE = 120.0              # Jarak pusat keypoint maksimum (pixel) jika box tidak tersedia
+    TRACK_TIMEOUT = 2.0                        # Track dihapus setelah tidak terlihat selama ini (detik)
+
+class KeypointFilterConfig:
+    ENABLED = False                            # Filter One-Euro per keypoint sebelum analisis gerakan
+    MIN_CUTOFF = 1.0                           # Cutoff minimum (Hz), lebih kecil = lebih halus saat diam
+    BETA = 0.02                                # Kenaikan cutoff per kecepatan (px/s), lebih besar = lag lebih kecil
+    DERIVATE_CUTOFF = 1.0                      # Cutoff (Hz) untuk estimasi kecepatan
+    RESET_GAP = 0.5                            # Filter diinisialisasi ulang jika track hilang lebih lama (detik)
+
+class RecorderConfig:
+    ENABLED = False                            # Rekam keypoint ke file trace biner
+    PATH = "traces/keypoints.dmkt"
+    CHUNK_FRAMES = 256                         # Frame per chunk sebelum ditulis ke disk
+
+class EventStoreConfig:
+    ENABLED = False                            # Log event + rollup per jam di SQLite (WAL) lokal, opt-in karena menulis ke disk
+    PATH = "data/events.db"
+    QUEUE_SIZE = 10000                         # Event yang menunggu ditulis (dibuang jika penuh)
+    BATCH_SIZE = 200                           # Tulis dalam satu transaksi jika jumlah event mencapai ini
+    FLUSH_INTERVAL = 2.0                       # atau setelah selama ini (detik)
+    RETENTION_DAYS = 30                        # Event mentah lebih tua dihapus, rollup tetap disimpan
+    CHECKPOINT_INTERVAL = 60.0                 # Interval terbuka (lampu masih menyala, dll.) dihitung ke rollup tiap N detik
+    SYNC_INTERVAL = 3600.0                     # Kirim rollup jam yang sudah selesai lewat MQTT, 0 = nonaktif
+
+class PublisherConfig:
+    QUEUE_SIZE = 1000                          # Antrian pesan keluar (pesan terlama dibuang jika penuh)
+    BATCH_MAX_MESSAGES = 20                    # Kirim batch jika jumlah pesan mencapai ini
+    BATCH_MAX_DELAY = 1.0                      # atau jika pesan tertua sudah menunggu selama ini (detik)
+    QOS = 1
+    SPOOL_PATH = "spool/mqtt_spool.jsonl"      # Pesan saat broker offline, diputar ulang setelah reconnect
+    SPOOL_MAX_BYTES = 5 * 1024 * 1024
+    RETRY_INTERVAL = 1.0                       # Publish gagal saat masih terhubung: spool dicoba ulang setelah ini (detik)
+    FLUSH_TIMEOUT = 2.0                        # Batas tunggu flush saat shutdown
+
+class MQTTConfig:
+    BROKER = ""
+    PORT = 8883                                # TLS
+    USERNAME = ""
+    PASSWORD = ""                              # Sebaiknya lewat environment: DMOUV_MQTT__PASSWORD
+    DEVICE_IP = "dmouv"                        # Dipakai untuk prefix topic
+
+    STATUS_TOPIC = f"iot/{DEVICE_IP}/status"
+    SENSOR_TOPIC = f"iot/{DEVICE_IP}/sensor"
+    ACTION_TOPIC = f"iot/{DEVICE_IP}/action"
+    SETTINGS_UPDATE_TOPIC = f"iot/{DEVICE_IP}/settings/update"
+    ACK_TOPIC = f"iot/{DEVICE_IP}/ack"          # Ack per perintah (status + latency)
+
 class DeviceConfig:
     LAMP_PIN = 26
     FAN_PIN = 19
+    SCHEDULE_RECHECK_INTERVAL = 60.0           # Evaluasi ulang jadwal minimal tiap N detik (perubahan jam/DST)
+    PWM_DEVICES = ()                           # Perangkat PWMLED (dimming lampu / kecepatan kipas), mis. ("fan",)
+    ON_LEVEL = 1.0                             # Level PWM saat dinyalakan otomatis/terjadwal (0.0-1.0)
+    RAMP_TIME = 1.0                            # Durasi ramp level PWM (detik), 0 = langsung
+    RAMP_STEPS = 20                            # Jumlah langkah penulisan PWM per ramp
+    ACTUATOR_MAX_WAIT = 0.5                    # Interval maksimum pengecekan timer actuator (detik)
+    SET_GIL_SWITCH_INTERVAL = False            # Ubah sys.setswitchinterval untuk seluruh proses (sekali di main)
+    GIL_SWITCH_INTERVAL = 0.001                # Nilai switch interval jika diaktifkan, kecil = thread actuator cepat dapat GIL
 
-class MotionTracker:    
+class FleetConfig:
+    ENABLED = False                            # Satu proses melayani beberapa kamera/ruangan
+    ROOMS = [                                  # Sumber kamera (usbN, file video, RTSP) dan pin GPIO per ruangan
+        {"name": "living_room", "source": "usb0", "devices": {"lamp": 26, "fan": 19}},
+        {"name": "bedroom", "source": "usb1", "devices": {"lamp": 20, "fan": 21}},
+    ]
+    BATCH_TIMEOUT = 0.05                       # Tunggu frame ruangan lain maksimal (detik) per batch
+
+class DisplayConfig:
+    HEADLESS = not os.environ.get("DISPLAY")   # Tanpa monitor: tidak ada plot/imshow/putText
+    PREVIEW_ENABLED = True                     # Preview MJPEG on-demand lewat HTTP lokal
+    PREVIEW_HOST = "127.0.0.1"
+    PREVIEW_PORT = 8090
+    PREVIEW_EVERY_N = 3                        # Render 1 dari N frame saat ada viewer
+    PREVIEW_JPEG_QUALITY = 70
+
+class PipelineConfig:
+    ENABLED = True                             # Capture, inferensi dan kontrol berjalan di thread terpisah
+    FRAME_QUEUE_SIZE = 1                       # Hanya frame terbaru yang disimpan
+    RESULT_QUEUE_SIZE = 1                      # Hasil inferensi yang basi juga dibuang
+    LATENCY_WINDOW = 100                       # Jumlah sampel per stage untuk statistik latency
+    STATS_INTERVAL = 10.0                      # Interval laporan latency per stage (detik)
+
+class MetricsConfig:
+    ENABLED = True                             # Endpoint Prometheus /metrics di HTTP lokal
+    HOST = "127.0.0.1"
+    PORT = 9108
+    HISTOGRAM_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)   # detik
+    MQTT_SUMMARY_INTERVAL = 60.0               # Ringkasan metrik lewat MQTT tiap N detik, 0 = nonaktif
+    THERMAL_PATH = "/sys/class/thermal/thermal_zone0/temp"
+    THROTTLE_PATH = "/sys/devices/platform/soc/soc:firmware/get_throttled"
+    PROFILER_ENABLED = False                   # Sampling profiler (toggle runtime dengan SIGUSR1)
+    PROFILER_INTERVAL = 0.005                  # Interval sampling stack (detik)
+    PROFILER_TOP = 15                          # Jumlah fungsi teratas di laporan profiler
+
+class InferenceSchedulerConfig:
+    ENABLED = True                             # Lewati inferensi saat ruangan statis
+    MOTION_GRID = (80, 60)                     # Resolusi frame kecil untuk motion energy
+    MOTION_ENERGY_THRESHOLD = 4.0              # Rata2 selisih grayscale (0-255) yang dianggap aktivitas
+    ACTIVE_HOLD = 3.0                          # Detik inferensi penuh setelah aktivitas/orang terakhir
+    IDLE_MIN_INTERVAL = 0.25                   # Interval inferensi awal saat idle (detik)
+    IDLE_MAX_INTERVAL = 2.0                    # Batas atas interval idle (menjamin latency bangun)
+    IDLE_BACKOFF = 1.5                         # Faktor kenaikan interval idle
+    ACTIVE_IMGSZ = 640                         # Ukuran input saat ada aktivitas
+    PRESENCE_IMGSZ = 320                       # Ukuran input saat hanya mengecek kehadiran
+
+class ROIConfig:
+    ENABLED = False                            # Inferensi hanya di sekitar box orang yang terakhir terdeteksi
+    MARGIN = 0.25                              # Perluasan box ROI (fraksi lebar/tinggi box)
+    MIN_SIZE = 160                             # Sisi ROI minimum (pixel)
+    MAX_AREA_FRACTION = 0.6                    # ROI lebih besar dari ini = scan full frame
+    MIN_IMGSZ = 224                            # Input size minimum untuk ROI (kelipatan 32)
+    FULL_SCAN_INTERVAL = 1.0                   # Scan full frame berkala untuk orang baru (detik)
+
+class InferencePoolConfig:
+    ENABLED = False                            # Inferensi di proses worker terpisah (lepas dari GIL)
+    WORKERS = 2                                # Jumlah proses, masing-masing memuat model sekali
+    THREADS_PER_WORKER = 2                     # Thread ncnn per worker (WORKERS x THREADS <= jumlah core)
+    SLOTS_PER_WORKER = 2                       # Slot frame shared memory per worker
+    MAX_FRAME_WIDTH = 1280                     # Ukuran slot shared memory (frame terbesar yang diterima)
+    MAX_FRAME_HEIGHT = 720
+    START_TIMEOUT = 60.0                       # Batas waktu load + warm-up model di worker (detik)
+
+class GovernorConfig:
+    ENABLED = True                             # Turunkan kualitas inferensi saat CPU panas/throttle atau FPS jatuh
+    INTERVAL = 2.0                             # Evaluasi kondisi tiap N detik
+    TARGET_FPS = 8.0                           # Inferensi per detik yang harus sanggup dicapai backend saat aktif
+    BUSY_FRACTION = 0.5                        # Kapasitas rendah hanya dihitung jika inferensi memakai >= fraksi waktu ini
+    MIN_INFERENCE_RATE = 4.0                   # Inferensi per detik saat aktif tidak pernah dibatasi di bawah ini
+    TEMPERATURE_LIMIT = 75.0                   # °C, di atas ini kualitas diturunkan (firmware Pi membatasi clock mulai 80°C)
+    TEMPERATURE_HYSTERESIS = 5.0               # Kualitas dinaikkan lagi hanya di bawah LIMIT - HYSTERESIS
+    THROTTLE_MASK = 0xF                        # Bit get_throttled (kondisi saat ini) yang memicu penurunan kualitas
+    FPS_HEADROOM = 1.25                        # Naik level hanya jika kapasitas inferensi >= TARGET_FPS x ini
+    UPGRADE_DELAY = 30.0                       # Kondisi harus baik selama ini sebelum naik satu level (detik)
+    MAX_UPGRADE_DELAY = 600.0                  # UPGRADE_DELAY digandakan sampai batas ini jika level atas langsung gagal lagi
+    SENSOR = "sysfs"                           # "sysfs" (thermal zone + get_throttled) atau "simulated" untuk uji di luar Pi
+    SIMULATED_AMBIENT = 45.0                   # Suhu sensor simulasi saat idle (°C)
+    SIMULATED_HEAT_GAIN = 40.0                 # Kenaikan suhu simulasi pada beban semua core penuh (°C)
+    SIMULATED_TIME_CONSTANT = 60.0             # Konstanta waktu termal simulasi (detik)
+    LEVELS = [                                 # Level 0 = kualitas penuh; max_rate 0 = tanpa batas, preview = pengali PREVIEW_EVERY_N (0 = mati)
+        {"imgsz": 640, "threads": 4, "max_rate": 0, "preview": 1},
+        {"imgsz": 640, "threads": 4, "max_rate": 10, "preview": 2},
+        {"imgsz": 480, "threads": 4, "max_rate": 6, "preview": 4},
+        {"imgsz": 416, "threads": 3, "max_rate": 5, "preview": 0},
+        {"imgsz": 320, "threads": 2, "max_rate": 4, "preview": 0},
+    ]
+
+class ConfigError(ValueError):
+    pass
+
+CONFIG_SECTIONS = {section.__name__: section for section in (
+    CameraConfig, MotionDetectionConfig, InferenceConfig, TrackingConfig, KeypointFilterConfig, 
+    RecorderConfig, EventStoreConfig, PublisherConfig, MQTTConfig, DeviceConfig, FleetConfig, DisplayConfig, 
+    PipelineConfig, MetricsConfig, InferenceSchedulerConfig, ROIConfig, InferencePoolConfig, GovernorConfig)}
+
+# Batas nilai (min, max); field lain hanya dicek tipenya terhadap nilai default
+CONFIG_LIMITS = {
+    "CameraConfig.RESOLUTION_WIDTH": (32, 4096),
+    "CameraConfig.RESOLUTION_HEIGHT": (32, 4096),
+    "CameraConfig.FPS_BUFFER_SIZE": (1, None),
+    "CameraConfig.FPS": (1, 240),
+    "CameraConfig.DRIVER_BUFFERS": (1, 32),
+    "CameraConfig.FRAME_BUFFERS": (1, None),
+    "MotionDetectionConfig.POSITION_BUFFER_SIZE": (2, None),
+    "MotionDetectionConfig.CONFIDENCE_THRESHOLD": (0.0, 1.0),
+    "MotionDetectionConfig.MOVEMENT_SPEED_THRESHOLD": (0.0, None),
+    "MotionDetectionConfig.RELATIVE_MOVEMENT_RATE": (0.0, None),
+    "MotionDetectionConfig.KEYPOINT_STABILITY_RATE": (0.0, None),
+    "MotionDetectionConfig.MIN_PAIR_INTERVAL": (0.0, None),
+    "MotionDetectionConfig.MAX_PAIR_GAP": (0.0, None),
+    "MotionDetectionConfig.MOTION_WINDOW": (0.0, None),
+    "MotionDetectionConfig.STABLE_DETECTION_TIME": (0.0, None),
+    "MotionDetectionConfig.PRESENCE_SATURATION": (0.0, None),
+    "MotionDetectionConfig.STABLE_POSE_TIME": (0.0, None),
+    "MotionDetectionConfig.DETECTION_DURATION": (0.0, None),
+    "MotionDetectionConfig.AUTO_OFF_DELAY": (0.0, None),
+    "MotionDetectionConfig.MOTION_COOLDOWN": (0.0, None),
+    "MotionDetectionConfig.MIN_MOVEMENT_POINTS": (1, None),
+    "MotionDetectionConfig.MIN_STABLE_KEYPOINTS": (1, 17),
+    "InferenceConfig.NUM_THREADS": (1, 64),
+    "InferenceConfig.CONFIDENCE_THRESHOLD": (0.0, 1.0),
+    "InferenceConfig.IOU_THRESHOLD": (0.0, 1.0),
+    "InferenceConfig.MAX_DETECTIONS": (1, None),
+    "TrackingConfig.MAX_TRACKS": (1, None),
+    "TrackingConfig.IOU_MATCH_THRESHOLD": (0.0, 1.0),
+    "TrackingConfig.MAX_CENTROID_DISTANCE": (1.0, None),
+    "TrackingConfig.TRACK_TIMEOUT": (0.0, None),
+    "KeypointFilterConfig.MIN_CUTOFF": (0.001, None),
+    "KeypointFilterConfig.BETA": (0.0, None),
+    "KeypointFilterConfig.DERIVATE_CUTOFF": (0.001, None),
+    "KeypointFilterConfig.RESET_GAP": (0.0, None),
+    "DeviceConfig.ON_LEVEL": (0.0, 1.0),
+    "DeviceConfig.RAMP_TIME": (0.0, None),
+    "DeviceConfig.RAMP_STEPS": (1, None),
+    "DeviceConfig.GIL_SWITCH_INTERVAL": (0.0001, 0.1),
+    "MQTTConfig.PORT": (1, 65535),
+    "PublisherConfig.QOS": (0, 2),
+    "PublisherConfig.RETRY_INTERVAL": (0.0, None),
+    "EventStoreConfig.BATCH_SIZE": (1, None),
+    "EventStoreConfig.RETENTION_DAYS": (0, None),
+    "InferenceSchedulerConfig.IDLE_MIN_INTERVAL": (0.0, None),
+    "InferenceSchedulerConfig.IDLE_MAX_INTERVAL": (0.0, None),
+    "InferenceSchedulerConfig.IDLE_BACKOFF": (1.0, None),
+    "InferenceSchedulerConfig.ACTIVE_IMGSZ": (32, 1280),
+    "InferenceSchedulerConfig.PRESENCE_IMGSZ": (32, 1280),
+    "InferenceSchedulerConfig.MOTION_ENERGY_THRESHOLD": (0.0, 255.0),
+    "InferenceSchedulerConfig.ACTIVE_HOLD": (0.0, None),
+    "ROIConfig.MARGIN": (0.0, None),
+    "ROIConfig.MIN_SIZE": (32, None),
+    "ROIConfig.MAX_AREA_FRACTION": (0.0, 1.0),
+    "ROIConfig.MIN_IMGSZ": (32, 1280),
+    "ROIConfig.FULL_SCAN_INTERVAL": (0.0, None),
+    "PipelineConfig.STATS_INTERVAL": (0.0, None),
+    "MetricsConfig.MQTT_SUMMARY_INTERVAL": (0.0, None),
+    "DisplayConfig.PREVIEW_EVERY_N": (1, None),
+    "DisplayConfig.PREVIEW_JPEG_QUALITY": (1, 100),
+    "InferencePoolConfig.WORKERS": (1, None),
+    "GovernorConfig.INTERVAL": (0.1, None),
+    "GovernorConfig.TARGET_FPS": (0.1, None),
+    "GovernorConfig.BUSY_FRACTION": (0.0, 1.0),
+    "GovernorConfig.MIN_INFERENCE_RATE": (0.1, None),
+    "GovernorConfig.TEMPERATURE_HYSTERESIS": (0.0, None),
+    "GovernorConfig.FPS_HEADROOM": (1.0, None),
+    "GovernorConfig.UPGRADE_DELAY": (0.0, None),
+    "GovernorConfig.MAX_UPGRADE_DELAY": (0.0, None),
+    "GovernorConfig.TEMPERATURE_LIMIT": (0.0, 125.0),
+    "GovernorConfig.THROTTLE_MASK": (0, None),
+    "GovernorConfig.SIMULATED_AMBIENT": (-40.0, 125.0),
+    "GovernorConfig.SIMULATED_HEAT_GAIN": (0.0, None),
+    "GovernorConfig.SIMULATED_TIME_CONSTANT": (0.1, None),
+}
+# Ukuran input model harus kelipatan stride 32
+CONFIG_IMGSZ_FIELDS = ("InferenceSchedulerConfig.ACTIVE_IMGSZ", "InferenceSchedulerConfig.PRESENCE_IMGSZ", "ROIConfig.MIN_IMGSZ")
+CONFIG_CHOICES = {
+    "InferenceConfig.BACKEND": ("ncnn", "ultralytics"),
+    "CameraConfig.FOURCC": ("MJPG", "YUYV"),
+    "GovernorConfig.SENSOR": ("sysfs", "simulated"),
+}
+
+# Field yang boleh diubah lewat SETTINGS_UPDATE_TOPIC tanpa restart (tanpa memuat ulang model/kamera)
+HOT_RELOAD_FIELDS = {
+    "CameraConfig.RESOLUTION_WIDTH", "CameraConfig.RESOLUTION_HEIGHT", "CameraConfig.FPS_BUFFER_SIZE",
+    *(f"MotionDetectionConfig.{field}" for field in vars(MotionDetectionConfig) if field.isupper()),
+    "TrackingConfig.IOU_MATCH_THRESHOLD", "TrackingConfig.MAX_CENTROID_DISTANCE", "TrackingConfig.TRACK_TIMEOUT",
+    "KeypointFilterConfig.MIN_CUTOFF", "KeypointFilterConfig.BETA", "KeypointFilterConfig.DERIVATE_CUTOFF", 
+    "KeypointFilterConfig.RESET_GAP",
+    "InferenceConfig.CONFIDENCE_THRESHOLD", "InferenceConfig.IOU_THRESHOLD", "InferenceConfig.MAX_DETECTIONS",
+    *(f"InferenceSchedulerConfig.{field}" for field in vars(InferenceSchedulerConfig) if field.isupper()),
+    *(f"ROIConfig.{field}" for field in vars(ROIConfig) if field.isupper()),
+    "DeviceConfig.ON_LEVEL", "DeviceConfig.RAMP_TIME", "DeviceConfig.RAMP_STEPS",
+    "PipelineConfig.STATS_INTERVAL", "MetricsConfig.MQTT_SUMMARY_INTERVAL", "DisplayConfig.PREVIEW_EVERY_N", 
+    "DisplayConfig.PREVIEW_JPEG_QUALITY",
+    *(f"GovernorConfig.{field}" for field in vars(GovernorConfig) if field.isupper() and field not in ("ENABLED", "SENSOR")),
+}
+
+def _coerce_config_value(name: str, current: Any, value: Any) -> Any:
+    # Tipe diambil dari nilai default; string dari environment di-parse sebagai YAML untuk tipe non-string
+    if isinstance(value, str) and not isinstance(current, str):
+        try:
+            value = yaml.safe_load(value)
+        except yaml.YAMLError as e:
+            raise ConfigError(f"{name}: cannot parse {value!r}: {e}")
+    # json.loads/YAML menerima NaN dan Infinity, NaN lolos semua perbandingan batas
+    if isinstance(value, float) and not math.isfinite(value):
+        raise ConfigError(f"{name}: expected a finite number, got {value!r}")
+    if isinstance(current, bool):
+        if not isinstance(value, bool):
+            raise ConfigError(f"{name}: expected true/false, got {value!r}")
+    elif isinstance(current, int):
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or value != int(value):
+            raise ConfigError(f"{name}: expected an integer, got {value!r}")
+        value = int(value)
+    elif isinstance(current, float):
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ConfigError(f"{name}: expected a number, got {value!r}")
+        value = float(value)
+    elif isinstance(current, str):
+        if not isinstance(value, str):
+            raise ConfigError(f"{name}: expected a string, got {value!r}")
+    elif isinstance(current, (tuple, list)):
+        if not isinstance(value, (tuple, list)):
+            raise ConfigError(f"{name}: expected a list, got {value!r}")
+        value = type(current)(value)
+    
+    if name in CONFIG_LIMITS:
+        low, high = CONFIG_LIMITS[name]
+        if (low is not None and value < low) or (high is not None and value > high):
+            raise ConfigError(f"{name}: {value!r} is outside [{low}, {high if high is not None else 'inf'}]")
+    if name in CONFIG_CHOICES and value not in CONFIG_CHOICES[name]:
+        raise ConfigError(f"{name}: expected one of {CONFIG_CHOICES[name]}, got {value!r}")
+    return value
+
+def validate_config(updates: Dict[str, Dict[str, Any]], allowed: Optional[set] = None) -> Dict[str, Any]:
+    # Semua field divalidasi dulu, tidak ada yang diterapkan jika salah satu gagal
+    resolved: Dict[str, Any] = {}
+    errors = []
+    if not isinstance(updates, dict):
+        raise ConfigError(f"Config must be a mapping of sections, got {type(updates).__name__}")
+    for section_name, fields in updates.items():
+        section = CONFIG_SECTIONS.get(section_name)
+        if section is None:
+            errors.append(f"Unknown config section {section_name!r}")
+            continue
+        if not isinstance(fields, dict):
+            errors.append(f"{section_name}: expected a mapping of fields")
+            continue
+        for field, value in fields.items():
+            name = f"{section_name}.{field}"
+            if not field.isupper() or not hasattr(section, field):
+                errors.append(f"Unknown config field {name}")
+            elif allowed is not None and name not in allowed:
+                errors.append(f"{name} cannot be changed at runtime")
+            else:
+                try:
+                    resolved[name] = _coerce_config_value(name, getattr(section, field), value)
+                except ConfigError as e:
+                    errors.append(str(e))
+                except (ValueError, TypeError, OverflowError) as e:
+                    errors.append(f"{name}: invalid value {value!r} ({e})")
+    
+    def final(name: str) -> Any:
+        section_name, _, field = name.partition(".")
+        return resolved.get(name, getattr(CONFIG_SECTIONS[section_name], field))
+    
+    if final("InferenceSchedulerConfig.IDLE_MIN_INTERVAL") > final("InferenceSchedulerConfig.IDLE_MAX_INTERVAL"):
+        errors.append("InferenceSchedulerConfig.IDLE_MIN_INTERVAL must not exceed IDLE_MAX_INTERVAL")
+    if final("MotionDetectionConfig.MIN_PAIR_INTERVAL") >= final("MotionDetectionConfig.MAX_PAIR_GAP"):
+        errors.append("MotionDetectionConfig.MIN_PAIR_INTERVAL must be below MAX_PAIR_GAP")
+    if final("MotionDetectionConfig.MOTION_WINDOW") < final("MotionDetectionConfig.DETECTION_DURATION"):
+        errors.append("MotionDetectionConfig.MOTION_WINDOW must cover DETECTION_DURATION")
+    if final("GovernorConfig.TARGET_FPS") > final("CameraConfig.FPS"):
+        errors.append("GovernorConfig.TARGET_FPS must not exceed CameraConfig.FPS")
+    for name in CONFIG_IMGSZ_FIELDS:
+        if final(name) % 32:
+            errors.append(f"{name} must be a multiple of 32")
+    grid = final("InferenceSchedulerConfig.MOTION_GRID")
+    if len(grid) != 2 or not all(isinstance(side, int) and not isinstance(side, bool) and 8 <= side <= 640 for side in grid):
+        errors.append("InferenceSchedulerConfig.MOTION_GRID must be two integers (width, height) in [8, 640]")
+    if final("GovernorConfig.MAX_UPGRADE_DELAY") < final("GovernorConfig.UPGRADE_DELAY"):
+        errors.append("GovernorConfig.MAX_UPGRADE_DELAY must not be below UPGRADE_DELAY")
+    levels = final("GovernorConfig.LEVELS")
+    if not levels or not all(isinstance(level, dict) and 
+                             all(isinstance(level.get(key), (int, float)) and math.isfinite(level[key]) and level[key] >= 0 
+                                 for key in ("imgsz", "threads", "max_rate", "preview")) and 
+                             level["imgsz"] >= 32 and level["threads"] >= 1 for level in levels):
+        errors.append("GovernorConfig.LEVELS must be a non-empty list of {imgsz >= 32, threads >= 1, max_rate, preview}")
+    if final("InferencePoolConfig.ENABLED") and (
+        final("CameraConfig.RESOLUTION_WIDTH") > final("InferencePoolConfig.MAX_FRAME_WIDTH") or 
+        final("CameraConfig.RESOLUTION_HEIGHT") > final("InferencePoolConfig.MAX_FRAME_HEIGHT")):
+        errors.append("Camera resolution exceeds the inference pool frame slots (InferencePoolConfig.MAX_FRAME_*)")
+    # Frame dipegang oleh queue, tiap thread dan slot pool sebelum buffer decode-nya dipakai ulang
+    in_flight = final("PipelineConfig.FRAME_QUEUE_SIZE") + final("PipelineConfig.RESULT_QUEUE_SIZE") + 3
+    if final("InferencePoolConfig.ENABLED"):
+        in_flight += final("InferencePoolConfig.WORKERS") * final("InferencePoolConfig.SLOTS_PER_WORKER")
+    if final("CameraConfig.FRAME_BUFFERS") <= in_flight:
+        errors.append(f"CameraConfig.FRAME_BUFFERS must exceed the {in_flight} frames the pipeline can hold")
+    if errors:
+        raise ConfigError("; ".join(errors))
+    return resolved
+
+def apply_config(resolved: Dict[str, Any]) -> None:
+    for name, value in resolved.items():
+        section_name, _, field = name.partition(".")
+        setattr(CONFIG_SECTIONS[section_name], field, value)
+
+def drain_config_updates(updates: queue.Queue) -> List[Tuple[Dict[str, Any], Optional[str], Any]]:
+    # Semua update yang antri diterapkan berurutan, sekaligus, oleh thread consumer
+    applied = []
+    while True:
+        try:
+            resolved, room, command = updates.get_nowait()
+        except queue.Empty:
+            return applied
+        apply_config(resolved)
+        applied.append((resolved, room, command))
+
+def load_config(path: Optional[str] = None, environ: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    environ = os.environ if environ is None else environ
+    path = path or environ.get("DMOUV_CONFIG") or ("config.yaml" if os.path.isfile("config.yaml") else None)
+    updates: Dict[str, Dict[str, Any]] = {}
+    if path is not None:
+        try:
+            with open(path) as config_file:
+                updates = yaml.safe_load(config_file) or {}
+        except (OSError, yaml.YAMLError) as e:
+            raise ConfigError(f"Failed to read config file {path}: {e}")
+        if not isinstance(updates, dict):
+            raise ConfigError(f"Config file {path} must contain a mapping of sections")
+    
+    # Environment menimpa file: DMOUV_<SECTION>__<FIELD>, mis. DMOUV_MQTT__PASSWORD, DMOUV_CAMERA__SOURCE
+    prefixes = {f"DMOUV_{section_name[:-len('Config')].upper()}__": section_name for section_name in CONFIG_SECTIONS}
+    for key, value in environ.items():
+        for prefix, section_name in prefixes.items():
+            if key.startswith(prefix):
+                updates.setdefault(section_name, {})[key[len(prefix):]] = value
+    
+    resolved = validate_config(updates)
+    # Topic diturunkan dari DEVICE_IP kecuali diisi eksplisit
+    if "MQTTConfig.DEVICE_IP" in resolved:
+        device_ip = resolved["MQTTConfig.DEVICE_IP"]
+        for field, suffix in (("STATUS_TOPIC", "status"), ("SENSOR_TOPIC", "sensor"), 
+                              ("ACTION_TOPIC", "action"), ("SETTINGS_UPDATE_TOPIC", "settings/update"),
+                              ("ACK_TOPIC", "ack")):
+            resolved.setdefault(f"MQTTConfig.{field}", f"iot/{device_ip}/{suffix}")
+    apply_config(resolved)
+    if path is not None:
+        print(f"Loaded configuration from {path}")
+    return resolved
+
+class StageStats:
+    def __init__(self, window: Optional[int] = None):
+        self._lock = threading.Lock()
+        self._window = window or PipelineConfig.LATENCY_WINDOW
+        self.latencies: Dict[str, deque] = {}
+        self.dropped: Dict[str, int] = {}
+        self.counters: Dict[str, int] = {}
+        self.processed = 0
+        # Histogram kumulatif (tidak dibatasi window) untuk endpoint Prometheus
+        self.histograms: Dict[str, List[Any]] = {}      # stage -> [bucket counts, sum, count]
+
+    def record(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            if stage not in self.latencies:
+                self.latencies[stage] = deque(maxlen=self._window)
+                self.histograms[stage] = [[0] * (len(MetricsConfig.HISTOGRAM_BUCKETS) + 1), 0.0, 0]
+            self.latencies[stage].append(seconds)
+            histogram = self.histograms[stage]
+            histogram[0][bisect.bisect_left(MetricsConfig.HISTOGRAM_BUCKETS, seconds)] += 1
+            histogram[1] += seconds
+            histogram[2] += 1
+
+    def drop(self, stage: str, count: int = 1) -> None:
+        with self._lock:
+            self.dropped[stage] = self.dropped.get(stage, 0) + count
+
+    def increment(self, name: str, count: int = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + count
+
+    def mark_processed(self) -> None:
+        with self._lock:
+            self.processed += 1
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            stages = {}
+            for stage, samples in self.latencies.items():
+                values = np.fromiter(samples, dtype=np.float64, count=len(samples))
+                if len(values) == 0:
+                    continue
+                p50, p95, p99 = np.percentile(values, [50, 95, 99]) * 1000
+                stages[stage] = {
+                    "count": len(values),
+                    "mean_ms": float(values.mean() * 1000),
+                    "p50_ms": float(p50),
+                    "p95_ms": float(p95),
+                    "p99_ms": float(p99),
+                    "max_ms": float(values.max() * 1000),
+                }
+            return {
+                "stages": stages,
+                "dropped": dict(self.dropped),
+                "counters": dict(self.counters),
+                "processed": self.processed,
+            }
+
+    def histogram_snapshot(self) -> Dict[str, Tuple[List[int], float, int]]:
+        with self._lock:
+            return {stage: (list(counts), total, count)
+                    for stage, (counts, total, count) in self.histograms.items()}
+
+    def report(self) -> str:
+        summary = self.summary()
+        parts = [f"{stage}: {values['mean_ms']:.1f}ms (p95 {values['p95_ms']:.1f}ms)"
+                 for stage, values in summary["stages"].items()]
+        dropped = ", ".join(f"{stage}={count}" for stage, count in summary["dropped"].items()) or "none"
+        counters = "".join(f" {name}={count}" for name, count in summary["counters"].items())
+        return f"Pipeline stats | {' | '.join(parts)} | processed={summary['processed']}{counters} dropped: {dropped}"
+
+class StartupTimer:
+    def __init__(self, origin: float = PROCESS_START_TIME):
+        self.origin = origin
+        self._lock = threading.Lock()
+        self.phases: List[Tuple[str, float, float]] = []     # (nama, mulai sejak origin, durasi)
+
+    def measure(self, name: str, func, *args: Any) -> Any:
+        start_time = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            end_time = time.perf_counter()
+            with self._lock:
+                self.phases.append((name, start_time - self.origin, end_time - start_time))
+
+    def mark(self, name: str) -> None:
+        with self._lock:
+            self.phases.append((name, time.perf_counter() - self.origin, 0.0))
+
+    def report(self) -> str:
+        with self._lock:
+            phases = sorted(self.phases, key=lambda phase: phase[1])
+        lines = ["Startup timing (seconds since process start):"]
+        for name, started, duration in phases:
+            if duration > 0:
+                lines.append(f"  {name:<20} start {started:7.3f}  took {duration:7.3f}")
+            else:
+                lines.append(f"  {name:<20} at    {started:7.3f}")
+        return "\n".join(lines)
+
+class LatestOnlyQueue:
+    def __init__(self, maxsize: int, name: str, stats: StageStats):
+        self._queue = queue.Queue(maxsize=max(1, maxsize))
+        self.name = name
+        self.stats = stats
+
+    def put(self, item: Any) -> None:
+        while True:
+            try:
+                self._queue.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    self._queue.get_nowait()        # buang frame lama, simpan yang terbaru
+                    self.stats.drop(self.name)
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout: Optional[float] = None) -> Any:
+        return self._queue.get(timeout=timeout)
+
+    def qsize(self) -> int:
+        return self._queue.qsize()
+
+class MJPEGPreviewServer:
+    BOUNDARY = "dmouvframe"
+
+    def __init__(self, host: str, port: int):
+        self._condition = threading.Condition()
+        self._frame: Optional[bytes] = None
+        self._frame_id = 0
+        self._viewers = 0
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="preview", daemon=True)
+
+    def _make_handler(self):
+        preview = self
+
+        class PreviewHandler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if self.path not in ("/", "/stream"):
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Cache-Control", "no-cache")
+                self.send_header("Content-Type", 
+                                 f"multipart/x-mixed-replace; boundary={MJPEGPreviewServer.BOUNDARY}")
+                self.end_headers()
+                preview._stream_to(self.wfile)
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+        return PreviewHandler
+
+    def _stream_to(self, wfile) -> None:
+        with self._condition:
+            self._viewers += 1
+            last_frame_id = self._frame_id      # tunggu frame baru yang dirender untuk viewer ini
+        try:
+            while True:
+                with self._condition:
+                    self._condition.wait_for(lambda: self._frame_id != last_frame_id, timeout=5.0)
+                    if self._frame_id == last_frame_id:
+                        continue
+                    frame, last_frame_id = self._frame, self._frame_id
+                wfile.write(f"--{self.BOUNDARY}\r\n".encode())
+                wfile.write(b"Content-Type: image/jpeg\r\n")
+                wfile.write(f"Content-Length: {len(frame)}\r\n\r\n".encode())
+                wfile.write(frame)
+                wfile.write(b"\r\n")
+        except (BrokenPipeError, ConnectionResetError, OSError):
+            pass
+        finally:
+            with self._condition:
+                self._viewers -= 1
+
+    def start(self) -> None:
+        self._thread.start()
+        host, port = self._server.server_address[:2]
+        print(f"Preview available at http://{host}:{port}/stream")
+
+    def has_viewers(self) -> bool:
+        return self._viewers > 0
+
+    def publish(self, jpeg: bytes) -> None:
+        with self._condition:
+            self._frame = jpeg
+            self._frame_id += 1
+            self._condition.notify_all()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+def read_cpu_temperature() -> Optional[float]:
+    try:
+        with open(MetricsConfig.THERMAL_PATH) as thermal_file:
+            return int(thermal_file.read().strip()) / 1000.0
+    except (OSError, ValueError):
+        return None
+
+def read_throttle_state() -> Optional[int]:
+    # Bit 0-3: undervoltage, frekuensi dibatasi, throttled, soft temp limit (saat ini)
+    # Bit 16-19: kondisi yang sama pernah terjadi sejak boot
+    try:
+        with open(MetricsConfig.THROTTLE_PATH) as throttle_file:
+            return int(throttle_file.read().strip(), 16)
+    except (OSError, ValueError):
+        pass
+    if shutil.which("vcgencmd") is None:
+        return None
+    try:
+        output = subprocess.run(["vcgencmd", "get_throttled"], capture_output=True, text=True, timeout=1.0).stdout
+        return int(output.strip().split("=")[-1], 16)
+    except (OSError, ValueError, subprocess.SubprocessError):
+        return None
+
+class MetricsRegistry:
     def __init__(self):
-        self.person_positions = deque(maxlen=MotionDetectionConfig.POSITION_BUFFER_SIZE)
-        self.position_timestamps = deque(maxlen=MotionDetectionConfig.POSITION_BUFFER_SIZE)
-        self.keypoint_history = deque(maxlen=MotionDetectionConfig.POSITION_BUFFER_SIZE)
-        self.is_motion_detected = True
+        self._sources: List[Tuple[Dict[str, str], StageStats]] = []
+        self._gauges: List[Tuple[str, Dict[str, str], Callable[[], Optional[float]]]] = []
+
+    def add_stats(self, stats: StageStats, labels: Optional[Dict[str, str]] = None) -> None:
+        self._sources.append((labels or {}, stats))
+
+    def add_gauge(self, name: str, read: Callable[[], Optional[float]], labels: Optional[Dict[str, str]] = None) -> None:
+        self._gauges.append((name, labels or {}, read))
+
+    def include(self, other: "MetricsRegistry") -> None:
+        self._sources.extend(other._sources)
+        self._gauges.extend(other._gauges)
+
+    def add_system_gauges(self) -> None:
+        self.add_gauge("cpu_temperature_celsius", read_cpu_temperature)
+        self.add_gauge("throttled_state", read_throttle_state)
+        self.add_gauge("throttled_now", lambda: None if (state := read_throttle_state()) is None else float(state & 0xF != 0))
+
+    @staticmethod
+    def _labels(labels: Dict[str, str]) -> str:
+        if not labels:
+            return ""
+        return "{" + ",".join(f'{key}="{value}"' for key, value in labels.items()) + "}"
+
+    def render(self) -> str:
+        families: "OrderedDict[str, Tuple[str, List[str]]]" = OrderedDict()
+
+        def sample(family: str, kind: str, labels: Dict[str, str], value: float, suffix: str = "") -> None:
+            families.setdefault(family, (kind, []))[1].append(f"dmouv_{family}{suffix}{self._labels(labels)} {value}")
+
+        for labels, stats in self._sources:
+            for stage, (counts, total, count) in stats.histogram_snapshot().items():
+                stage_labels = {**labels, "stage": stage}
+                cumulative = 0
+                for bound, bucket_count in zip(MetricsConfig.HISTOGRAM_BUCKETS + ("+Inf",), counts):
+                    cumulative += bucket_count
+                    sample("stage_seconds", "histogram", {**stage_labels, "le": str(bound)}, cumulative, "_bucket")
+                sample("stage_seconds", "histogram", stage_labels, total, "_sum")
+                sample("stage_seconds", "histogram", stage_labels, count, "_count")
+            summary = stats.summary()
+            sample("frames_processed_total", "counter", labels, summary["processed"])
+            for queue_name, count in summary["dropped"].items():
+                sample("dropped_total", "counter", {**labels, "queue": queue_name}, count)
+            for name, count in summary["counters"].items():
+                sample("events_total", "counter", {**labels, "event": name}, count)
+        for name, labels, read in self._gauges:
+            try:
+                value = read()
+            except Exception:
+                value = None
+            if value is not None:
+                sample(name, "gauge", labels, value)
+
+        lines = []
+        for family, (kind, samples) in families.items():
+            lines.append(f"# TYPE dmouv_{family} {kind}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> Dict[str, Any]:
+        # Ringkasan kecil untuk MQTT: p95 per stage, counter, dan kondisi termal
+        result: Dict[str, Any] = {}
+        for labels, stats in self._sources:
+            summary = stats.summary()
+            key = labels.get("room", "system")
+            result[key] = {
+                "p95_ms": {stage: round(values["p95_ms"], 2) for stage, values in summary["stages"].items()},
+                "processed": summary["processed"],
+                "dropped": summary["dropped"],
+                "counters": summary["counters"],
+            }
+        for name, labels, read in self._gauges:
+            try:
+                result[name] = read()
+            except Exception:
+                result[name] = None
+        return result
+
+class SamplingProfiler:
+    IDLE_FILES = ("threading.py", "queue.py", "selectors.py", "socketserver.py")
+
+    def __init__(self):
+        self.samples: Counter = Counter()
+        self.total = 0
+        self._lock = threading.Lock()       # samples dibaca handler HTTP /profile dan SIGUSR1 saat sampler berjalan
+        self._enabled = threading.Event()
+        self._thread = threading.Thread(target=self._sample_loop, name="profiler", daemon=True)
+
+    @property
+    def enabled(self) -> bool:
+        return self._enabled.is_set()
+
+    def toggle(self) -> None:
+        if self.enabled:
+            self._enabled.clear()
+            print(self.report())
+        else:
+            with self._lock:
+                self.samples.clear()
+                self.total = 0
+            self._enabled.set()
+            if not self._thread.is_alive():
+                self._thread.start()
+            print("Sampling profiler enabled")
+
+    def _sample_loop(self) -> None:
+        own_file = os.path.abspath(__file__)
+        while True:
+            self._enabled.wait()
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            locations = []
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == threading.get_ident():
+                    continue
+                innermost = frame
+                # Waktu di library (cv2, numpy, ncnn) diatribusikan ke fungsi terdalam di modul ini
+                while frame is not None and os.path.abspath(frame.f_code.co_filename) != own_file:
+                    frame = frame.f_back
+                if os.path.basename(innermost.f_code.co_filename) in self.IDLE_FILES:
+                    location = "(idle)"
+                elif frame is None:
+                    continue
+                else:
+                    location = f"{frame.f_code.co_name}:{frame.f_lineno}"
+                locations.append((names.get(thread_id, str(thread_id)), location))
+            with self._lock:
+                self.samples.update(locations)
+                self.total += 1
+            time.sleep(MetricsConfig.PROFILER_INTERVAL)
+
+    def report(self, top: Optional[int] = None) -> str:
+        top = top or MetricsConfig.PROFILER_TOP
+        with self._lock:
+            samples, total = self.samples.copy(), self.total
+        lines = [f"Profiler: {total} samples every {MetricsConfig.PROFILER_INTERVAL * 1000:.0f}ms"]
+        for (thread_name, location), count in samples.most_common(top):
+            lines.append(f"  {100.0 * count / max(1, total):5.1f}%  {thread_name:<12} {location}")
+        return "\n".join(lines)
+
+class MetricsServer:
+    def __init__(self, host: str, port: int, registry: MetricsRegistry, profiler: Optional[SamplingProfiler] = None, 
+                 event_store: Optional["EventStore"] = None):
+        self.registry = registry
+        self.profiler = profiler
+        self.event_store = event_store
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics", daemon=True)
+
+    def _make_handler(self):
+        metrics = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                path, _, query = self.path.partition("?")
+                if path == "/metrics":
+                    body = metrics.registry.render().encode()
+                    content_type = "text/plain; version=0.0.4"
+                elif path == "/profile" and metrics.profiler is not None:
+                    body = metrics.profiler.report().encode()
+                    content_type = "text/plain"
+                elif path == "/rollups" and metrics.event_store is not None:
+                    # /rollups?hours=24&metric=occupied_seconds&room=bedroom
+                    params = {key: values[-1] for key, values in parse_qs(query).items()}
+                    try:
+                        since = metrics.event_store.clock() - float(params.get("hours", 24)) * 3600
+                    except ValueError:
+                        self.send_error(400)
+                        return
+                    rows = metrics.event_store.rollups(since, metric=params.get("metric"), room=params.get("room"))
+                    body = json.dumps(rows).encode()
+                    content_type = "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+        return MetricsHandler
+
+    def start(self) -> None:
+        self._thread.start()
+        host, port = self._server.server_address[:2]
+        print(f"Metrics available at http://{host}:{port}/metrics")
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+class SysfsThermalSensor:
+    def read(self) -> Tuple[Optional[float], Optional[int]]:
+        return read_cpu_temperature(), read_throttle_state()
+
+class SimulatedThermalSensor:
+    # Model termal orde satu untuk uji di luar Pi: suhu mendekati AMBIENT + HEAT_GAIN x beban CPU
+    def __init__(self, load: Optional[Callable[[], float]] = None, clock: Callable[[], float] = time.perf_counter):
+        self.load = load or self._process_load      # fraksi semua core yang terpakai sejak pembacaan terakhir
+        self.clock = clock
+        self.temperature = GovernorConfig.SIMULATED_AMBIENT
+        self._sticky = 0
+        self._last_read = clock()
+        self._last_cpu = (time.perf_counter(), self._cpu_seconds())
+
+    @staticmethod
+    def _cpu_seconds() -> float:
+        times = os.times()
+        return times.user + times.system
+
+    def _process_load(self) -> float:
+        now, cpu = time.perf_counter(), self._cpu_seconds()
+        (last_now, last_cpu), self._last_cpu = self._last_cpu, (now, cpu)
+        if now <= last_now:
+            return 0.0
+        return min(1.0, (cpu - last_cpu) / (now - last_now) / (os.cpu_count() or 1))
+
+    def read(self) -> Tuple[Optional[float], Optional[int]]:
+        now = self.clock()
+        elapsed, self._last_read = max(0.0, now - self._last_read), now
+        target = GovernorConfig.SIMULATED_AMBIENT + GovernorConfig.SIMULATED_HEAT_GAIN * self.load()
+        self.temperature += (target - self.temperature) * (1 - math.exp(-elapsed / GovernorConfig.SIMULATED_TIME_CONSTANT))
+        # Bit seperti get_throttled pada Pi 4: clock dibatasi mulai 80°C, throttle mulai 85°C
+        state = 0
+        if self.temperature >= 80.0:
+            state |= 0x2 | 0x8
+        if self.temperature >= 85.0:
+            state |= 0x4
+        self._sticky |= state << 16
+        return self.temperature, state | self._sticky
+
+def create_thermal_sensor(sensor: Optional[str] = None) -> Any:
+    sensor = sensor or GovernorConfig.SENSOR
+    if sensor == "simulated":
+        return SimulatedThermalSensor()
+    return SysfsThermalSensor()
+
+class QualityGovernor:
+    def __init__(self, 
+                 stats: StageStats, 
+                 apply: Callable[[Dict[str, Any]], None], 
+                 sensor: Any = None, 
+                 clock: Callable[[], float] = time.time, 
+                 parallelism: int = 1, 
+                 event_store: Optional["EventStore"] = None, 
+                 room: Optional[str] = None, 
+                 scalable_input: Optional[bool] = None):
+        self.stats = stats
+        self.apply = apply          # menerapkan settings() ke scheduler, backend dan preview
+        self.sensor = sensor if sensor is not None else create_thermal_sensor()
+        self.clock = clock
+        self.parallelism = parallelism
+        self.event_store = event_store
+        self.room = room
+        # Graph ncnn hasil export memakai input tetap, imgsz lebih kecil tidak mempercepat inferensi
+        self.scalable_input = InferenceConfig.BACKEND != "ncnn" if scalable_input is None else scalable_input
+        self.level = 0
+        self.rate_level = 0         # level yang batas lajunya dipakai, hanya naik karena suhu/throttle
+        self.temperature: Optional[float] = None
+        self.throttle_state: Optional[int] = None
+        self.fps: Optional[float] = None
+        self.inference_rate: Optional[float] = None
+        self.inference_capacity: Optional[float] = None
+        self.inference_busy: Optional[float] = None
+        self._last_update = clock()
+        self._last_processed = stats.processed - stats.counters.get("inference_rate_limited", 0)
+        self._last_inference = self._inference_totals()
+        self._good_since: Optional[float] = None
+        self._last_upgrade = -float("inf")
+        self._upgrade_backoff = 1          # UPGRADE_DELAY digandakan setelah naik level yang gagal
+        self._applied = self.settings()
+        self.apply(self._applied)
+
+    def settings(self, level: Optional[int] = None) -> Dict[str, Any]:
+        levels = GovernorConfig.LEVELS
+        level = min(self.level if level is None else level, len(levels) - 1)
+        values = levels[level]
+        max_rate = float(levels[min(level, self.rate_level)]["max_rate"])
+        return {
+            "imgsz": int(values["imgsz"]),
+            "threads": max(1, min(int(values["threads"]), InferenceConfig.NUM_THREADS)),
+            # Batas laju tidak pernah di bawah MIN_INFERENCE_RATE: deteksi minimum tetap terjamin
+            "max_rate": max(max_rate, GovernorConfig.MIN_INFERENCE_RATE) if max_rate > 0 else 0.0,
+            "preview": int(values["preview"]),
+        }
+
+    def _inference_totals(self) -> Tuple[float, int]:
+        counts, total, count = self.stats.histogram_snapshot().get("inference", ([], 0.0, 0))
+        return total, count
+
+    def _measure(self, now: float) -> None:
+        elapsed = now - self._last_update
+        # Frame yang dilewati oleh batas laju governor sendiri murah dan tidak dihitung
+        processed = self.stats.processed - self.stats.counters.get("inference_rate_limited", 0)
+        total, count = self._inference_totals()
+        inference_time, inferences = total - self._last_inference[0], count - self._last_inference[1]
+        self.fps = (processed - self._last_processed) / elapsed
+        self.inference_rate = inferences / elapsed
+        # Laju yang sanggup dicapai backend jika setiap frame diinferensi, tidak bergantung batas laju
+        self.inference_capacity = self.parallelism * inferences / inference_time if inference_time > 0 else None
+        self.inference_busy = inference_time / (elapsed * self.parallelism)
+        self._last_update, self._last_processed, self._last_inference = now, processed, (total, count)
+        self.temperature, self.throttle_state = self.sensor.read()
+
+    def _upgrade_delay(self) -> float:
+        return min(GovernorConfig.UPGRADE_DELAY * self._upgrade_backoff, GovernorConfig.MAX_UPGRADE_DELAY)
+
+    def _load_target(self) -> Optional[int]:
+        # Batas laju hanya menurunkan laju deteksi, jadi beban inferensi hanya diatasi dengan input lebih kecil
+        levels = GovernorConfig.LEVELS
+        if not self.scalable_input:
+            return None
+        imgsz = levels[self.level]["imgsz"]
+        for level in range(self.level + 1, len(levels)):
+            if levels[level]["imgsz"] < imgsz:
+                return level
+        return None
+
+    def _floor_limit(self, target: int) -> int:
+        # Level dengan thread lebih sedikit hanya dipakai jika kapasitasnya masih di atas MIN_INFERENCE_RATE;
+        # kapasitas diperkirakan linear terhadap jumlah thread (pesimistis) dan luas input
+        if self.inference_capacity is None:
+            return target
+        current = self.settings(self.level)
+        while target > self.level:
+            settings = self.settings(target)
+            capacity = self.inference_capacity * settings["threads"] / current["threads"]
+            if self.scalable_input:
+                capacity *= (current["imgsz"] / settings["imgsz"]) ** 2
+            if capacity >= GovernorConfig.MIN_INFERENCE_RATE * GovernorConfig.FPS_HEADROOM:
+                return target
+            target -= 1
+        return target
+
+    def decide(self, now: float) -> Tuple[int, Optional[str]]:
+        last_level = len(GovernorConfig.LEVELS) - 1
+        reasons = []
+        if self.temperature is not None and self.temperature >= GovernorConfig.TEMPERATURE_LIMIT:
+            reasons.append(f"temperature {self.temperature:.1f}C")
+        if self.throttle_state is not None and self.throttle_state & GovernorConfig.THROTTLE_MASK:
+            reasons.append(f"throttled 0x{self.throttle_state:x}")
+        thermal = bool(reasons)
+        overloaded = (self.inference_capacity is not None and 
+                      self.inference_capacity < GovernorConfig.TARGET_FPS and 
+                      self.inference_busy >= GovernorConfig.BUSY_FRACTION)
+        # Beban yang tidak bisa diatasi (input sudah terkecil/tetap) tidak menahan pemulihan dari suhu
+        load_target = self._load_target() if overloaded else None
+        if load_target is not None:
+            reasons.append(f"{self.inference_capacity:.1f} inferences/s capacity")
+        target = self.level + 1 if thermal else load_target
+        if target is not None:
+            target = self._floor_limit(target)
+        if reasons:
+            self._good_since = None
+            if self.level >= last_level or target is None or target <= self.level:
+                return self.level, None
+            # Level atas yang langsung gagal lagi dicoba lebih jarang (mencegah naik-turun terus)
+            if now - self._last_upgrade < self._upgrade_delay():
+                self._upgrade_backoff *= 2
+            else:
+                self._upgrade_backoff = 1
+            if thermal:
+                self.rate_level = target
+            return target, ", ".join(reasons)
+        
+        cool = (self.temperature is None or 
+                self.temperature < GovernorConfig.TEMPERATURE_LIMIT - GovernorConfig.TEMPERATURE_HYSTERESIS)
+        # Kapasitas hanya perlu dicek jika level di atas memakai input lebih besar (lebih lambat)
+        levels = GovernorConfig.LEVELS
+        fast = (self.level == 0 or not self.scalable_input or 
+                levels[self.level - 1]["imgsz"] <= levels[self.level]["imgsz"] or 
+                self.inference_capacity is None or 
+                self.inference_capacity >= GovernorConfig.TARGET_FPS * GovernorConfig.FPS_HEADROOM)
+        if self.level == 0 or not cool or not fast:
+            self._good_since = None
+            return self.level, None
+        if self._good_since is None:
+            self._good_since = now
+        if now - self._good_since < self._upgrade_delay():
+            return self.level, None
+        self._good_since = None
+        self._last_upgrade = now
+        self.rate_level = min(self.rate_level, self.level - 1)
+        return self.level - 1, "recovered"
+
+    def update(self) -> bool:
+        now = self.clock()
+        if now - self._last_update < GovernorConfig.INTERVAL:
+            return False
+        self._measure(now)
+        self.level = min(self.level, len(GovernorConfig.LEVELS) - 1)
+        self.rate_level = min(self.rate_level, self.level)
+        level, reason = self.decide(now)
+        previous, self.level = self.level, level
+        settings = self.settings()
+        if settings != self._applied:       # juga saat LEVELS/MIN_INFERENCE_RATE diubah lewat MQTT
+            self._applied = settings
+            self.apply(settings)
+        if level == previous:
+            return False
+        self.stats.increment("governor_downgrades" if level > previous else "governor_upgrades")
+        temperature = "n/a" if self.temperature is None else f"{self.temperature:.1f}C"
+        print(f"{f'[{self.room}] ' if self.room else ''}Quality governor: level {previous} -> {level} ({reason}); "
+              f"imgsz {settings['imgsz']}, {settings['threads']} threads, max rate {settings['max_rate'] or 'unlimited'}, "
+              f"preview x{settings['preview']}; {temperature}, {self.fps:.1f} fps, "
+              f"{self.inference_rate:.1f} inferences/s")
+        if self.event_store is not None:
+            self.event_store.record(now, self.room, "governor", reason, float(level), 
+                                    {**settings, "previous": previous, "temperature": self.temperature, 
+                                     "fps": round(self.fps, 2)})
+        return True
+
+    def register_gauges(self, metrics: "MetricsRegistry") -> None:
+        metrics.add_gauge("governor_level", lambda: self.level)
+        metrics.add_gauge("governor_imgsz", lambda: self.settings()["imgsz"])
+        metrics.add_gauge("governor_threads", lambda: self.settings()["threads"])
+        metrics.add_gauge("governor_max_rate", lambda: self.settings()["max_rate"])
+        metrics.add_gauge("governor_temperature_celsius", lambda: self.temperature)
+        metrics.add_gauge("inference_rate", lambda: self.inference_rate)
+
+class InferenceScheduler:
+    def __init__(self, stats: StageStats):
+        self.stats = stats
+        self.previous_small_frame = None
+        self.last_motion_energy = 0.0
+        self.active_until = 0.0
+        self.idle_interval = InferenceSchedulerConfig.IDLE_MIN_INTERVAL
+        self.last_inference_time = 0.0
+        self.activity_start_time = None
+        self.max_imgsz: Optional[int] = None    # batas dari QualityGovernor
+        self.min_interval = 0.0
+        self.next_allowed_time = 0.0
+
+    def _motion_energy(self, frame: np.ndarray) -> float:
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        small = cv2.resize(gray, InferenceSchedulerConfig.MOTION_GRID, interpolation=cv2.INTER_AREA)
+        previous, self.previous_small_frame = self.previous_small_frame, small
+        if previous is None or previous.shape != small.shape:     # frame pertama atau MOTION_GRID diubah
+            return float("inf")
+        return float(cv2.absdiff(small, previous).mean())
+
+    def is_active(self, now: float) -> bool:
+        return now < self.active_until
+
+    def plan(self, frame: np.ndarray, now: float) -> Tuple[bool, int]:
+        should_infer, imgsz = self._plan(frame, now)
+        if self.max_imgsz is not None:
+            imgsz = min(imgsz, self.max_imgsz)
+        if should_infer:
+            if now < self.next_allowed_time:
+                self.stats.increment("inference_rate_limited")
+                return False, imgsz
+            # Jadwal tetap, bukan jarak dari inferensi terakhir: rata-rata laju tetap max_rate walau frame tidak pas
+            self.next_allowed_time = max(self.next_allowed_time, now - self.min_interval) + self.min_interval
+        return should_infer, imgsz
+
+    def _plan(self, frame: np.ndarray, now: float) -> Tuple[bool, int]:
+        if not InferenceSchedulerConfig.ENABLED:
+            return True, InferenceSchedulerConfig.ACTIVE_IMGSZ
+        
+        self.last_motion_energy = self._motion_energy(frame)
+        if self.last_motion_energy > InferenceSchedulerConfig.MOTION_ENERGY_THRESHOLD:
+            if not self.is_active(now) and self.activity_start_time is None:
+                self.activity_start_time = now      # bangun dari idle
+            self.active_until = max(self.active_until, now + InferenceSchedulerConfig.ACTIVE_HOLD)
+        
+        if self.is_active(now):
+            return True, InferenceSchedulerConfig.ACTIVE_IMGSZ
+        
+        if now - self.last_inference_time >= self.idle_interval:
+            return True, InferenceSchedulerConfig.PRESENCE_IMGSZ
+        
+        self.stats.increment("inference_skipped")
+        return False, InferenceSchedulerConfig.PRESENCE_IMGSZ
+
+    def report_result(self, person_present: bool, now: float) -> None:
+        self.last_inference_time = now
+        if self.activity_start_time is not None:
+            self.stats.record("wake_latency", now - self.activity_start_time)
+            self.activity_start_time = None
+        
+        if person_present:
+            self.active_until = max(self.active_until, now + InferenceSchedulerConfig.ACTIVE_HOLD)
+            self.idle_interval = InferenceSchedulerConfig.IDLE_MIN_INTERVAL
+        elif not self.is_active(now):
+            self.idle_interval = min(self.idle_interval * InferenceSchedulerConfig.IDLE_BACKOFF, 
+                                     InferenceSchedulerConfig.IDLE_MAX_INTERVAL)
+
+class RegionOfInterestPlanner:
+    def __init__(self, stats: StageStats):
+        self.stats = stats
+        self.last_box: Optional[np.ndarray] = None      # gabungan box deteksi terakhir (koordinat frame)
+        self.last_count = 0
+        self.last_full_scan = -float("inf")
+
+    def plan(self, frame_shape: Tuple[int, ...], now: float, 
+             imgsz: Optional[int]) -> Tuple[Optional[Tuple[int, int, int, int]], Optional[int]]:
+        if (not ROIConfig.ENABLED or self.last_box is None or 
+            now - self.last_full_scan >= ROIConfig.FULL_SCAN_INTERVAL):
+            return self._full_scan(now, imgsz)
+        
+        height, width = frame_shape[:2]
+        x0, y0, x1, y1 = self.last_box
+        center_x, center_y = (x0 + x1) / 2, (y0 + y1) / 2
+        half_width = max((x1 - x0) * (1 + 2 * ROIConfig.MARGIN), ROIConfig.MIN_SIZE) / 2
+        half_height = max((y1 - y0) * (1 + 2 * ROIConfig.MARGIN), ROIConfig.MIN_SIZE) / 2
+        left, top = int(max(0, center_x - half_width)), int(max(0, center_y - half_height))
+        right, bottom = int(min(width, center_x + half_width)), int(min(height, center_y + half_height))
+        if (right - left) * (bottom - top) > ROIConfig.MAX_AREA_FRACTION * width * height:
+            return self._full_scan(now, imgsz)
+        
+        # Input size mengikuti ukuran ROI (kelipatan 32), crop kecil tidak perlu di-upscale ke 640
+        roi_imgsz = int(np.ceil(max(right - left, bottom - top) / 32.0)) * 32
+        roi_imgsz = max(roi_imgsz, ROIConfig.MIN_IMGSZ)
+        if imgsz is not None:
+            roi_imgsz = min(roi_imgsz, imgsz)
+        self.stats.increment("roi_inference")
+        return (left, top, right, bottom), roi_imgsz
+
+    def _full_scan(self, now: float, imgsz: Optional[int]) -> Tuple[None, Optional[int]]:
+        self.last_full_scan = now
+        return None, imgsz
+
+    def report(self, detections: "PoseDetections", roi_used: bool) -> None:
+        if len(detections) == 0 or (roi_used and len(detections) < self.last_count):
+            if roi_used:
+                self.stats.increment("roi_lost")     # orang keluar dari ROI, frame berikutnya scan full
+            self.last_box = None
+            self.last_count = 0
+            return
+        boxes = detections.boxes
+        self.last_box = np.concatenate([boxes[:, :2].min(axis=0), boxes[:, 2:].max(axis=0)])
+        self.last_count = len(detections)
+
+class KeypointRingBuffer:
+    def __init__(self, size: int, num_keypoints: int = 17):
+        self.size = max(2, size)
+        self.keypoints = np.zeros((self.size, num_keypoints, 3), dtype=np.float32)
+        self.masks = np.zeros((self.size, num_keypoints), dtype=bool)     # keypoint confidence > threshold
+        self.valid = np.zeros(self.size, dtype=bool)                      # frame dengan pose stabil
+        self.centers = np.zeros((self.size, 2), dtype=np.float64)
+        self.scales = np.ones(self.size, dtype=np.float64)                # diagonal box orang (px)
+        self.timestamps = np.zeros(self.size, dtype=np.float64)
+        self.velocities = np.zeros((self.size, num_keypoints, 2), dtype=np.float32)     # px/s dari filter keypoint
+        self.has_velocity = np.zeros(self.size, dtype=bool)
+        # Metrik frame terhadap frame acuannya disimpan di slot frame tersebut, 
+        # durasinya = selang waktu sejak frame sebelumnya agar tidak ada waktu yang terhitung dua kali
+        self.pair_active = np.zeros(self.size, dtype=bool)
+        self.pair_significant = np.zeros(self.size, dtype=bool)
+        self.pair_stable = np.zeros(self.size, dtype=bool)
+        self.pair_duration = np.zeros(self.size, dtype=np.float64)
+        self.head = 0
+        self.count = 0
+        self.valid_frames = 0
+        self.significant_movements = 0
+        self.significant_duration = 0.0
+
+    def _remove_pair(self, index: int) -> None:
+        if not self.pair_active[index]:
+            return
+        self.pair_active[index] = False
+        if self.pair_significant[index]:
+            self.significant_movements -= 1
+            self.significant_duration -= self.pair_duration[index]
+            if self.significant_movements == 0:
+                self.significant_duration = 0.0      # hindari akumulasi error floating point
+
+    def _evict_oldest(self) -> None:
+        index = (self.head - self.count) % self.size
+        self.valid_frames -= int(self.valid[index])
+        self.valid[index] = False
+        self._remove_pair(index)
+        self.count -= 1
+
+    def append(self, 
+               keypoints: Optional[np.ndarray], 
+               mask: Optional[np.ndarray], 
+               center: Optional[Tuple[float, float]], 
+               timestamp: float,
+               velocities: Optional[np.ndarray] = None,
+               scale: float = 1.0,
+               window: Optional[float] = None) -> None:
+        if self.count == self.size:
+            self._evict_oldest()
+        if window is not None:
+            # Window berbasis waktu: jumlah frame di window mengikuti FPS, kapasitas hanya batas atas
+            cutoff = timestamp - window
+            while self.count > 0 and self.timestamps[(self.head - self.count) % self.size] < cutoff:
+                self._evict_oldest()
+        
+        index = self.head
+        if keypoints is None:
+            self.valid[index] = False
+            self.masks[index] = False
+        else:
+            self.keypoints[index] = keypoints
+            self.masks[index] = mask
+            self.valid[index] = True
+            self.centers[index] = center
+            self.scales[index] = scale
+            self.valid_frames += 1
+        self.has_velocity[index] = velocities is not None and keypoints is not None
+        if self.has_velocity[index]:
+            self.velocities[index] = velocities
+        self.pair_active[index] = False
+        self.timestamps[index] = timestamp
+        self.head = (index + 1) % self.size
+        self.count += 1
+
+    def newest_index(self, offset: int = 0) -> int:
+        return (self.head - 1 - offset) % self.size
+
+    def set_newest_pair(self, significant: bool, stable: bool, duration: float) -> None:
+        index = self.newest_index()
+        self.pair_active[index] = True
+        self.pair_significant[index] = significant
+        self.pair_stable[index] = stable
+        self.pair_duration[index] = duration
+        if significant:
+            self.significant_movements += 1
+            self.significant_duration += duration
+
+    def ordered_indices(self, last: Optional[int] = None) -> np.ndarray:
+        length = self.count if last is None else min(last, self.count)
+        return (self.head - length + np.arange(length)) % self.size     # urutan lama -> baru
+
+    def resize(self, size: int) -> None:
+        # Simpan frame terbaru (maksimal size) dalam urutan lama -> baru, metrik pasangan ikut disalin
+        resized = KeypointRingBuffer(size, self.keypoints.shape[1])
+        indices = self.ordered_indices(resized.size)
+        length = len(indices)
+        for name in ("keypoints", "masks", "valid", "centers", "scales", "timestamps", "velocities", "has_velocity", 
+                     "pair_active", "pair_significant", "pair_stable", "pair_duration"):
+            getattr(resized, name)[:length] = getattr(self, name)[indices]
+        resized.head = length % resized.size
+        resized.count = length
+        resized.valid_frames = int(resized.valid.sum())
+        significant = resized.pair_active & resized.pair_significant
+        resized.significant_movements = int(significant.sum())
+        resized.significant_duration = float(resized.pair_duration[significant].sum())
+        self.__dict__.update(resized.__dict__)
+
+    def clear(self) -> None:
+        self.valid[:] = False
+        self.masks[:] = False
+        self.pair_active[:] = False
+        self.head = 0
+        self.count = 0
+        self.valid_frames = 0
+        self.significant_movements = 0
+        self.significant_duration = 0.0
+
+def pair_motion_rates(newer: np.ndarray, 
+                      older: np.ndarray, 
+                      newer_masks: np.ndarray, 
+                      older_masks: np.ndarray, 
+                      elapsed: np.ndarray, 
+                      velocities: np.ndarray, 
+                      has_velocity: np.ndarray, 
+                      scales: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Metrik gerakan untuk T pasangan frame sekaligus (satu pasangan per track): (T, 17, 2) -> 3 x (T,)
+    mask = newer_masks & older_masks
+    counts = mask.sum(axis=1)
+    valid = (elapsed > 0) & (counts > 0)
+    weights = mask / np.maximum(counts, 1)[:, None]         # rata2 hanya atas keypoint yang yakin di kedua frame
+    safe_elapsed = np.where(valid, elapsed, 1.0)
+    
+    offset = (newer.astype(np.float64) - older) * mask[..., None]
+    translation = np.einsum("tk,tkc->tc", weights, offset)
+    movement = (np.linalg.norm(offset, axis=2) * weights).sum(axis=1) / safe_elapsed
+    deformation = (offset - translation[:, None, :]) * mask[..., None]
+    articulation = (np.linalg.norm(deformation, axis=2) * weights).sum(axis=1) / safe_elapsed     # perubahan bentuk pose
+    
+    # Kecepatan terfilter (jika ada) tidak ikut melompat saat keypoint keluar/masuk mask
+    velocity_weights = newer_masks / np.maximum(newer_masks.sum(axis=1), 1)[:, None]
+    center_velocity = np.einsum("tk,tkc->tc", velocity_weights, velocities.astype(np.float64))
+    center_speed = np.where(has_velocity, np.linalg.norm(center_velocity, axis=1), 
+                            np.linalg.norm(translation, axis=1) / safe_elapsed)
+    
+    scale = np.maximum(scales, 1.0)
+    rates = [np.where(valid, value / scale, 0.0) for value in (center_speed, movement, articulation)]
+    return rates[0], rates[1], rates[2]        # satuan body/detik
+
+class MotionTracker:    
+    def __init__(self, initially_triggered: bool = True):
+        self.history = KeypointRingBuffer(MotionDetectionConfig.POSITION_BUFFER_SIZE)
+        self.is_motion_detected = initially_triggered
         self.motion_start_time = None
         self.last_motion_time = None
-        self.person_detected = True
-        self.motion_triggered = True
-        self.stable_pose_count = 3
+        self.person_detected = initially_triggered
+        self.motion_triggered = initially_triggered
+        self.stable_pose_count = 3 if initially_triggered else 0
+        self.stable_pose_time = 0.0         # lama pose stabil berturut-turut (detik)
+        self.stable_since: Optional[float] = None
         self.reference_keypoints = None
+        self.speed = 0.0        # kecepatan pusat pose (px/s) frame terakhir, jika filter aktif
 
     def get_stable_keypoints(self, keypoints: Optional[np.ndarray]) -> Optional[np.ndarray]:
         if keypoints is None or len(keypoints) == 0:
             return None
         
-        keypoint_data = keypoints[0]
-        stable_keypoints = []
-        
-        for i in range(len(keypoint_data)):
-            if (len(keypoint_data[i]) >= 3 and    # Nilai (x, y, Confidence)
-                keypoint_data[i][2] > MotionDetectionConfig.CONFIDENCE_THRESHOLD):
-                stable_keypoints.append([
-                    keypoint_data[i][0], 
-                    keypoint_data[i][1], 
-                    keypoint_data[i][2]
-                ])
+        keypoint_data = np.asarray(keypoints[0], dtype=np.float32)
+        if keypoint_data.ndim != 2 or keypoint_data.shape[1] < 3:      # Nilai (x, y, Confidence)
+            return None
         
-        return (np.array(stable_keypoints) 
-                if len(stable_keypoints) >= MotionDetectionConfig.MIN_STABLE_KEYPOINTS      # Keypoint confidence >50% + 5 Keypoint yang stabil 
+        confident = np.count_nonzero(keypoint_data[:, 2] > MotionDetectionConfig.CONFIDENCE_THRESHOLD)
+        return (keypoint_data[:, :3] 
+                if confident >= MotionDetectionConfig.MIN_STABLE_KEYPOINTS      # Keypoint confidence >50% + 5 Keypoint yang stabil 
                 else None)
 
-    def calculate_pose_center(self, stable_keypoints: Optional[np.ndarray]) -> Optional[Tuple[float, float]]:
+    @staticmethod
+    def keypoint_mask(stable_keypoints: np.ndarray) -> np.ndarray:
+        return stable_keypoints[..., 2] > MotionDetectionConfig.CONFIDENCE_THRESHOLD
+
+    def calculate_pose_center(self, 
+                              stable_keypoints: Optional[np.ndarray], 
+                              mask: Optional[np.ndarray] = None) -> Optional[Tuple[float, float]]:
         if stable_keypoints is None or len(stable_keypoints) == 0:
             return None
-            
-        center_x = np.mean(stable_keypoints[:, 0])
-        center_y = np.mean(stable_keypoints[:, 1])
         
-        return (center_x, center_y)     # rata2 keypoint stabil untuk menentukan titik pusat pose sebagai acuan tracking pergerakan orang.
+        if mask is None:
+            mask = self.keypoint_mask(stable_keypoints)
+        points = stable_keypoints[mask, :2]
+        if len(points) == 0:
+            return None
+        
+        center_x, center_y = points.mean(axis=0)
+        return (float(center_x), float(center_y))     # rata2 keypoint stabil untuk menentukan titik pusat pose sebagai acuan tracking pergerakan orang.
 
-    def calculate_relative_movement(self, 
-                                  current_keypoints: Optional[np.ndarray], 
-                                  reference_keypoints: Optional[np.ndarray]) -> float:
-        if current_keypoints is None or reference_keypoints is None:
-            return 0.0
+    @staticmethod
+    def keypoint_scale(stable_keypoints: np.ndarray, mask: np.ndarray) -> float:
+        points = stable_keypoints[mask, :2]
+        if len(points) < 2:
+            return 1.0
+        width, height = points.max(axis=0) - points.min(axis=0)
+        return max(float(np.hypot(width, height)), 1.0)      # fallback tanpa box: diagonal sebaran keypoint
+
+    def _reference_index(self) -> Optional[int]:
+        # Frame acuan berjarak >= MIN_PAIR_INTERVAL: noise keypoint dibagi rentang waktu yang sama di semua FPS
+        history = self.history
+        newest_time = history.timestamps[history.newest_index()]
+        for offset in range(1, history.count):
+            index = history.newest_index(offset)
+            elapsed = newest_time - history.timestamps[index]
+            if elapsed > MotionDetectionConfig.MAX_PAIR_GAP:
+                return None
+            if elapsed >= MotionDetectionConfig.MIN_PAIR_INTERVAL and history.valid[index]:
+                return index
+        return None
+
+    def calculate_motion_rates(self, newer: int, older: int) -> Tuple[float, float, float]:
+        rates = pair_motion_rates(*self._pair_arrays([(self.history, newer, older)]))
+        return tuple(float(rate[0]) for rate in rates)
+
+    @staticmethod
+    def _pair_arrays(pairs: List[Tuple[KeypointRingBuffer, int, int]]) -> Tuple[np.ndarray, ...]:
+        # Kumpulkan frame baru + frame acuan dari beberapa history (satu per track) menjadi array (T, ...)
+        return (np.stack([history.keypoints[newer, :, :2] for history, newer, _ in pairs]),
+                np.stack([history.keypoints[older, :, :2] for history, _, older in pairs]),
+                np.stack([history.masks[newer] for history, newer, _ in pairs]),
+                np.stack([history.masks[older] for history, _, older in pairs]),
+                np.array([history.timestamps[newer] - history.timestamps[older] for history, newer, older in pairs]),
+                np.stack([history.velocities[newer] for history, newer, _ in pairs]),
+                np.array([history.has_velocity[newer] for history, newer, _ in pairs], dtype=bool),
+                np.array([history.scales[newer] for history, newer, _ in pairs]))
+
+    def _pending_pair(self) -> Optional[Tuple[int, int]]:
+        history = self.history
+        newer = history.newest_index()
+        if not history.valid[newer]:
+            return None
+        reference = self._reference_index()
+        return None if reference is None else (newer, reference)
+
+    def _apply_pair_rates(self, newer: int, center_rate: float, movement_rate: float, articulation_rate: float) -> None:
+        history = self.history
+        duration = min(float(history.timestamps[newer] - history.timestamps[history.newest_index(1)]), 
+                       MotionDetectionConfig.MAX_PAIR_GAP)
+        significant = (movement_rate > MotionDetectionConfig.RELATIVE_MOVEMENT_RATE and 
+                       center_rate > MotionDetectionConfig.MOVEMENT_SPEED_THRESHOLD)       # dianggap signifikan kalau memenuhi 2 diatas 
+        stable = articulation_rate <= MotionDetectionConfig.KEYPOINT_STABILITY_RATE
+        history.set_newest_pair(significant, stable, duration)
+
+    def _update_newest_pair(self) -> None:
+        pair = self._pending_pair()
+        if pair is not None:
+            self._apply_pair_rates(pair[0], *self.calculate_motion_rates(*pair))
+
+    def is_keypoints_stable(self) -> bool:
+        history = self.history
+        newest = history.newest_index()
+        return bool(history.count > 0 and history.pair_active[newest] and history.pair_stable[newest])
+
+    def detect_skeleton_motion(self) -> bool:
+        history = self.history
+        if (not MotionDetectionConfig.ENABLED or 
+            history.valid_frames < MotionDetectionConfig.MIN_MOVEMENT_POINTS):
+            return False
         
-        if len(current_keypoints) != len(reference_keypoints):
-            return 0.0
+        if history.count < 2:       # Min 2 keypoint untuk analisis
+            return False
         
-        total_relative_movement = 0.0        
-        valid_comparisons = 0
+        return (history.significant_movements >= MotionDetectionConfig.MIN_MOVEMENT_POINTS and 
+                history.significant_duration >= MotionDetectionConfig.DETECTION_DURATION)     # dianggap detected kalau memenuhi 2 diatas
+
+    def update_motion_detection(self, 
+                                keypoints: Optional[np.ndarray], 
+                                current_time: Optional[float] = None,
+                                velocities: Optional[np.ndarray] = None,
+                                scale: Optional[float] = None) -> None:
+        if current_time is None:
+            current_time = time.time()      # real-time
+        stable_keypoints = self.get_stable_keypoints(keypoints)
+        if stable_keypoints is None:
+            self.observe_absent(current_time)
+            return
         
-        for i in range(len(current_keypoints)):
-            current_point = current_keypoints[i][:2]
-            reference_point = reference_keypoints[i][:2]
-            
-            distance = np.sqrt(np.sum((current_point - reference_point) ** 2))      # Euclidean
-            
-            reference_distance = np.sqrt(reference_point[0]**2 + reference_point[1]**2)
-            if reference_distance > 0:
-                relative_distance = distance / reference_distance
-                total_relative_movement += relative_distance
-                valid_comparisons += 1
+        mask = self.keypoint_mask(stable_keypoints)
+        center_point = self.calculate_pose_center(stable_keypoints, mask)
+        if scale is None or scale < 1.0:
+            scale = self.keypoint_scale(stable_keypoints, mask)
+        if velocities is not None:
+            velocities = np.asarray(velocities, dtype=np.float32).reshape(-1, 2)
+            self.speed = float(np.linalg.norm(velocities[mask].mean(axis=0))) if mask.any() else 0.0
+        self.observe_pose(stable_keypoints, mask, center_point, current_time, velocities, scale)
+        self._update_newest_pair()
+        self.update_pose_state(current_time)
+
+    def observe_pose(self, 
+                     stable_keypoints: np.ndarray, 
+                     mask: np.ndarray, 
+                     center_point: Any, 
+                     current_time: float, 
+                     velocities: Optional[np.ndarray], 
+                     scale: float) -> None:
+        # Hanya menyimpan frame; metrik pasangan dihitung terpisah agar bisa dibatch untuk banyak track
+        self.history.append(stable_keypoints, mask, center_point, current_time, velocities, 
+                            scale, MotionDetectionConfig.MOTION_WINDOW)
+        self.person_detected = True
+
+    def update_pose_state(self, current_time: float) -> None:
+        if self.is_keypoints_stable():
+            if self.stable_since is None:
+                self.stable_since = float(self.history.timestamps[self.history.newest_index(1)])
+            self.stable_pose_count += 1
+        else:
+            self.stable_since = None
+            self.stable_pose_count = 0
+        self.stable_pose_time = 0.0 if self.stable_since is None else current_time - self.stable_since
         
-        return total_relative_movement / valid_comparisons if valid_comparisons > 0 else 0.0        # Pergerakan relatif rata2 antar keypoint yang dinormalisasi untuk menghindari bias posisi pada frame.        
+        if self.stable_pose_time >= MotionDetectionConfig.STABLE_POSE_TIME:
+            if self.detect_skeleton_motion():
+                if not self.is_motion_detected:
+                    self.motion_start_time = current_time
+                    self.is_motion_detected = True
+                
+                self.last_motion_time = current_time
+                
+                if ((self.motion_start_time is not None) and 
+                    (current_time - self.motion_start_time) >= MotionDetectionConfig.DETECTION_DURATION):
+                    self.motion_triggered = True        # motion detection aktif jika pose stabil >= STABLE_POSE_TIME
 
-    def is_keypoints_stable(self) -> bool:
-        if len(self.keypoint_history) < 3:      # 3 frame terakhir
-            return False
+    def observe_absent(self, current_time: float) -> None:
+        self.history.append(None, None, None, current_time, window=MotionDetectionConfig.MOTION_WINDOW)
+        self.person_detected = False
+        self.stable_since = None
+        self.stable_pose_count = 0
+        self.stable_pose_time = 0.0
         
-        recent_keypoints = list(self.keypoint_history)[-3:]
+        if (self.last_motion_time and 
+            current_time - self.last_motion_time > MotionDetectionConfig.MOTION_COOLDOWN):
+            self.is_motion_detected = False
+            self.motion_triggered = False
+            self.motion_start_time = None       
+
+class OneEuroKeypointFilter:
+    def __init__(self, capacity: int, num_keypoints: int = 17):
+        # State semua track disimpan dalam satu array agar filter tervektorisasi (track x keypoint)
+        self.positions = np.zeros((capacity, num_keypoints, 2), dtype=np.float32)
+        self.velocities = np.zeros((capacity, num_keypoints, 2), dtype=np.float32)
+        self.initialized = np.zeros((capacity, num_keypoints), dtype=bool)
+        self.last_time = np.full(capacity, -np.inf, dtype=np.float64)
+
+    def reset(self, slot: int) -> None:
+        self.initialized[slot] = False
+        self.velocities[slot] = 0.0
+        self.last_time[slot] = -np.inf
+
+    @staticmethod
+    def _alpha(elapsed: np.ndarray, cutoff: Any) -> np.ndarray:
+        tau = 1.0 / (2.0 * np.pi * cutoff)
+        return 1.0 / (1.0 + tau / elapsed)
+
+    def update(self, slots: np.ndarray, keypoints: np.ndarray, timestamp: float) -> Tuple[np.ndarray, np.ndarray]:
+        slots = np.asarray(slots, dtype=np.intp)
+        elapsed = timestamp - self.last_time[slots]
+        stale = ~(elapsed <= KeypointFilterConfig.RESET_GAP)      # slot baru (-inf) atau track lama hilang
+        self.initialized[slots[stale]] = False
+        self.velocities[slots[stale]] = 0.0
+        elapsed = np.maximum(np.where(stale, 1.0, elapsed), 1e-3)[:, None, None]
         
-        for i in range(1, len(recent_keypoints)):
-            if recent_keypoints[i] is None or recent_keypoints[i-1] is None:
-                return False
-            
-            if len(recent_keypoints[i]) != len(recent_keypoints[i-1]):
-                return False
-            
-            movement = self.calculate_relative_movement(
-                recent_keypoints[i], 
-                recent_keypoints[i-1]
-            )
-            if movement > MotionDetectionConfig.KEYPOINT_STABILITY_THRESHOLD:
-                return False
+        measured = keypoints[..., :2]
+        # Bobot confidence: keypoint yang kurang yakin bergerak lebih lambat, di bawah threshold ditahan
+        confidence = keypoints[..., 2]
+        weight = np.where(confidence > MotionDetectionConfig.CONFIDENCE_THRESHOLD, 
+                          np.clip(confidence, 0.0, 1.0), 0.0)[..., None]
+        
+        previous = self.positions[slots]
+        fresh = (~self.initialized[slots])[..., None]
+        previous = np.where(fresh, measured, previous)
         
-        return True     # Kestabilan pose (Membandingkan) pergerakan antar 3 frame terakhir dan dianggap stabil jika pergerakan <5% threshold.
+        raw_velocity = (measured - previous) / elapsed
+        velocity = self.velocities[slots]
+        velocity = velocity + self._alpha(elapsed, KeypointFilterConfig.DERIVATE_CUTOFF) * weight * (raw_velocity - velocity)
+        speed = np.linalg.norm(velocity, axis=-1, keepdims=True)
+        cutoff = KeypointFilterConfig.MIN_CUTOFF + KeypointFilterConfig.BETA * speed
+        position = previous + self._alpha(elapsed, cutoff) * weight * (measured - previous)
+        
+        self.positions[slots] = position
+        self.velocities[slots] = velocity
+        self.initialized[slots] |= weight[..., 0] > 0
+        self.last_time[slots] = timestamp
+        
+        filtered = keypoints.copy()
+        filtered[..., :2] = np.where(self.initialized[slots][..., None], position, measured)
+        # Turunan posisi terfilter; turunan One-Euro di atas bias (diukur terhadap posisi yang tertinggal)
+        return filtered, ((position - previous) / elapsed).astype(np.float32)
 
-    def detect_skeleton_motion(self) -> bool:
-        if (not MotionDetectionConfig.ENABLED or 
-            len(self.person_positions) < MotionDetectionConfig.MIN_MOVEMENT_POINTS):
-            return False
+class PersonTrack:
+    def __init__(self, track_id: int, box: np.ndarray, centroid: np.ndarray, timestamp: float):
+        self.track_id = track_id
+        self.slot = 0           # indeks state di OneEuroKeypointFilter
+        self.box = box
+        self.centroid = centroid
+        self.first_seen = timestamp
+        self.last_seen = timestamp
+        self.motion_tracker = MotionTracker(initially_triggered=False)
+
+def box_iou_matrix(boxes_a: np.ndarray, boxes_b: np.ndarray) -> np.ndarray:
+    top_left = np.maximum(boxes_a[:, None, :2], boxes_b[None, :, :2])
+    bottom_right = np.minimum(boxes_a[:, None, 2:], boxes_b[None, :, 2:])
+    intersection = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+    area_a = np.prod(boxes_a[:, 2:] - boxes_a[:, :2], axis=1)
+    area_b = np.prod(boxes_b[:, 2:] - boxes_b[:, :2], axis=1)
+    union = area_a[:, None] + area_b[None, :] - intersection
+    return np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
+
+def greedy_match(score: np.ndarray, min_score: float) -> List[Tuple[int, int]]:
+    matches = []
+    if score.size == 0:
+        return matches
+    order = np.argsort(score, axis=None)[::-1]
+    used_rows = np.zeros(score.shape[0], dtype=bool)
+    used_cols = np.zeros(score.shape[1], dtype=bool)
+    for row, col in zip(*np.unravel_index(order, score.shape)):
+        if score[row, col] <= min_score:
+            break
+        if used_rows[row] or used_cols[col]:
+            continue
+        used_rows[row] = used_cols[col] = True
+        matches.append((int(row), int(col)))
+        if len(matches) == min(score.shape):
+            break
+    return matches
+
+class MultiPersonTracker:
+    def __init__(self):
+        self.tracks: Dict[int, PersonTrack] = {}
+        self._next_track_id = 1
+        self.keypoint_filter: Optional[OneEuroKeypointFilter] = None
+        if KeypointFilterConfig.ENABLED:
+            self.keypoint_filter = OneEuroKeypointFilter(TrackingConfig.MAX_TRACKS)
+        self._free_slots = list(range(TrackingConfig.MAX_TRACKS))
+
+    @property
+    def motion_triggered(self) -> bool:
+        return any(track.motion_tracker.motion_triggered for track in self.tracks.values())
+
+    def resize_history(self, size: int) -> None:
+        for track in self.tracks.values():
+            track.motion_tracker.history.resize(size)
+
+    @property
+    def person_detected(self) -> bool:
+        return any(track.motion_tracker.person_detected for track in self.tracks.values())
+
+    @property
+    def stable_pose_count(self) -> int:
+        return max((track.motion_tracker.stable_pose_count for track in self.tracks.values()), default=0)
+
+    @property
+    def stable_pose_time(self) -> float:
+        return max((track.motion_tracker.stable_pose_time for track in self.tracks.values()), default=0.0)
+
+    @staticmethod
+    def _keypoint_centroids(keypoints: np.ndarray) -> np.ndarray:
+        confident = keypoints[..., 2] > MotionDetectionConfig.CONFIDENCE_THRESHOLD
+        counts = np.maximum(confident.sum(axis=1, keepdims=True), 1)
+        return (keypoints[..., :2] * confident[..., None]).sum(axis=1) / counts
+
+    @staticmethod
+    def _keypoint_boxes(keypoints: np.ndarray) -> np.ndarray:
+        confident = keypoints[..., 2] > MotionDetectionConfig.CONFIDENCE_THRESHOLD
+        x = np.where(confident, keypoints[..., 0], np.nan)
+        y = np.where(confident, keypoints[..., 1], np.nan)
+        with np.errstate(all="ignore"):
+            boxes = np.stack([np.nanmin(x, axis=1), np.nanmin(y, axis=1), 
+                              np.nanmax(x, axis=1), np.nanmax(y, axis=1)], axis=1)
+        return np.nan_to_num(boxes)
+
+    def _association_scores(self, 
+                            track_boxes: np.ndarray, 
+                            track_centroids: np.ndarray,
+                            boxes: np.ndarray, 
+                            centroids: np.ndarray) -> np.ndarray:
+        iou = box_iou_matrix(track_boxes, boxes)
+        distance = np.linalg.norm(track_centroids[:, None, :] - centroids[None, :, :], axis=2)
+        proximity = 1.0 - distance / TrackingConfig.MAX_CENTROID_DISTANCE      # 0 di jarak maksimum
+        # IoU diutamakan, jarak pusat keypoint sebagai fallback untuk box yang tidak overlap
+        return np.where(iou >= TrackingConfig.IOU_MATCH_THRESHOLD, 1.0 + iou, proximity)
+
+    def update_motion_detection(self, 
+                                keypoints: Optional[np.ndarray], 
+                                boxes: Optional[np.ndarray] = None,
+                                current_time: Optional[float] = None) -> None:
+        if current_time is None:
+            current_time = time.time()
+        
+        if keypoints is None or len(keypoints) == 0:
+            keypoints = np.zeros((0, 17, 3), dtype=np.float32)
+        keypoints = np.asarray(keypoints, dtype=np.float32)
+        if boxes is None or len(boxes) != len(keypoints):
+            boxes = self._keypoint_boxes(keypoints) if len(keypoints) else np.zeros((0, 4), dtype=np.float32)
+        boxes = np.asarray(boxes, dtype=np.float32)
+        centroids = self._keypoint_centroids(keypoints)
         
-        positions = list(self.person_positions)
-        timestamps = list(self.position_timestamps)
-        keypoint_history = list(self.keypoint_history)
+        track_ids = list(self.tracks.keys())
+        track_boxes = np.array([self.tracks[i].box for i in track_ids], dtype=np.float32).reshape(-1, 4)
+        track_centroids = np.array([self.tracks[i].centroid for i in track_ids], dtype=np.float32).reshape(-1, 2)
         
-        if len(keypoint_history) < 2:       # Min 2 keypoint untuk analisis
-            return False
+        scores = self._association_scores(track_boxes, track_centroids, boxes, centroids)
+        matches = greedy_match(scores, min_score=0.0)
         
-        significant_movements = 0
-        total_duration = 0
+        assigned: List[Tuple[PersonTrack, int]] = []
+        matched_tracks = set()
+        matched_detections = set()
+        for row, col in matches:
+            track = self.tracks[track_ids[row]]
+            track.box = boxes[col]
+            track.centroid = centroids[col]
+            track.last_seen = current_time
+            assigned.append((track, col))
+            matched_tracks.add(track.track_id)
+            matched_detections.add(col)
         
-        for i in range(len(positions) - 1):
-            if keypoint_history[i] is None or keypoint_history[i+1] is None:
+        for track_id in track_ids:
+            if track_id in matched_tracks:
                 continue
-                
-            time_difference = timestamps[i+1] - timestamps[i]
-            if time_difference <= 0 or time_difference > MotionDetectionConfig.DETECTION_DURATION:
+            track = self.tracks[track_id]
+            track.motion_tracker.update_motion_detection(None, current_time)
+            if current_time - track.last_seen > TrackingConfig.TRACK_TIMEOUT:
+                self._free_slots.append(track.slot)
+                del self.tracks[track_id]
+        
+        unmatched = [col for col in range(len(keypoints)) if col not in matched_detections]
+        unmatched.sort(key=lambda col: -float(keypoints[col, :, 2].sum()))      # prioritaskan deteksi paling yakin
+        for col in unmatched:
+            if len(self.tracks) >= TrackingConfig.MAX_TRACKS:
+                break
+            track = PersonTrack(self._next_track_id, boxes[col], centroids[col], current_time)
+            track.slot = self._free_slots.pop()
+            if self.keypoint_filter is not None:
+                self.keypoint_filter.reset(track.slot)
+            self._next_track_id += 1
+            self.tracks[track.track_id] = track
+            assigned.append((track, col))
+        
+        if not assigned:
+            return
+        # Jarak dinormalisasi diagonal box, keputusan tidak bergantung resolusi dan jarak orang ke kamera
+        scales = np.hypot(boxes[:, 2] - boxes[:, 0], boxes[:, 3] - boxes[:, 1])
+        columns = [col for _, col in assigned]
+        observed = keypoints[columns]
+        velocities = None
+        if self.keypoint_filter is not None:
+            # Satu panggilan filter untuk semua track yang terlihat di frame ini
+            slots = np.array([track.slot for track, _ in assigned])
+            observed, velocities = self.keypoint_filter.update(slots, observed, current_time)
+        self._update_tracks(assigned, observed, velocities, scales[columns], current_time)
+
+    def _update_tracks(self, 
+                       assigned: List[Tuple[PersonTrack, int]], 
+                       keypoints: np.ndarray, 
+                       velocities: Optional[np.ndarray], 
+                       scales: np.ndarray, 
+                       current_time: float) -> None:
+        # Sama dengan MotionTracker.update_motion_detection per track, tapi mask, pusat pose dan 
+        # metrik pasangan dihitung sekali untuk semua track (T, 17, ...) dan bukan di loop Python
+        masks = keypoints[..., 2] > MotionDetectionConfig.CONFIDENCE_THRESHOLD
+        counts = masks.sum(axis=1)
+        stable = counts >= MotionDetectionConfig.MIN_STABLE_KEYPOINTS
+        centers = np.einsum("tk,tkc->tc", masks / np.maximum(counts, 1)[:, None], keypoints[..., :2].astype(np.float64))
+        if velocities is not None:
+            center_velocity = np.einsum("tk,tkc->tc", masks / np.maximum(counts, 1)[:, None], velocities)
+            speeds = np.linalg.norm(center_velocity, axis=1)
+        
+        pending = []
+        observed = []
+        for index, (track, _) in enumerate(assigned):
+            tracker = track.motion_tracker
+            if not stable[index]:
+                tracker.observe_absent(current_time)
                 continue
-            
-            relative_movement = self.calculate_relative_movement(
-                keypoint_history[i+1], 
-                keypoint_history[i]
-            )
-            
-            position_distance = np.sqrt(
-                (positions[i+1][0] - positions[i][0])**2 + 
-                (positions[i+1][1] - positions[i][1])**2
-            )
-            
-            if (relative_movement > MotionDetectionConfig.RELATIVE_MOVEMENT_THRESHOLD and 
-                position_distance > MotionDetectionConfig.MOVEMENT_THRESHOLD):
-                significant_movements += 1
-                total_duration += time_difference       # dianggap signifikan kalau memenuhi 2 diatas 
+            scale = float(scales[index])
+            if scale < 1.0:
+                scale = tracker.keypoint_scale(keypoints[index], masks[index])
+            if velocities is not None:
+                tracker.speed = float(speeds[index])
+            tracker.observe_pose(keypoints[index], masks[index], centers[index], current_time, 
+                                 None if velocities is None else velocities[index], scale)
+            observed.append(tracker)
+            pair = tracker._pending_pair()
+            if pair is not None:
+                pending.append((tracker, *pair))
         
-        return (significant_movements >= MotionDetectionConfig.MIN_MOVEMENT_POINTS and 
-                total_duration >= MotionDetectionConfig.DETECTION_DURATION)     # dianggap detected kalau memenuhi 2 diatas
+        if pending:
+            rates = pair_motion_rates(*MotionTracker._pair_arrays([(tracker.history, newer, older) 
+                                                                   for tracker, newer, older in pending]))
+            for (tracker, newer, _), center_rate, movement_rate, articulation_rate in zip(pending, *rates):
+                tracker._apply_pair_rates(newer, float(center_rate), float(movement_rate), float(articulation_rate))
+        for tracker in observed:
+            tracker.update_pose_state(current_time)
 
-    def update_motion_detection(self, keypoints: Optional[np.ndarray]) -> None:
-        current_time = time.time()      # real-time
-        stable_keypoints = self.get_stable_keypoints(keypoints)
+COCO_SKELETON = np.array([
+    [15, 13], [13, 11], [16, 14], [14, 12], [11, 12], [5, 11], [6, 12], [5, 6], [5, 7], 
+    [6, 8], [7, 9], [8, 10], [1, 2], [0, 1], [0, 2], [1, 3], [2, 4], [3, 5], [4, 6]
+])
+
+class PoseDetections:
+    def __init__(self, boxes: np.ndarray, scores: np.ndarray, keypoints: np.ndarray):
+        self.boxes = boxes              # (N, 4) xyxy dalam koordinat frame
+        self.scores = scores            # (N,)
+        self.keypoints = keypoints      # (N, 17, 3) x, y, confidence
+
+    @classmethod
+    def empty(cls, num_keypoints: int = 17) -> "PoseDetections":
+        return cls(np.zeros((0, 4), dtype=np.float32), 
+                   np.zeros(0, dtype=np.float32), 
+                   np.zeros((0, num_keypoints, 3), dtype=np.float32))
+
+    def __len__(self) -> int:
+        return len(self.keypoints)
+
+    def translate(self, dx: float, dy: float) -> "PoseDetections":
+        offset = np.array([dx, dy], dtype=np.float32)
+        keypoints = self.keypoints.copy()
+        keypoints[..., :2] += offset
+        return PoseDetections(self.boxes + np.tile(offset, 2), self.scores, keypoints)
+
+    def scale(self, factor: float) -> "PoseDetections":
+        keypoints = self.keypoints.copy()
+        keypoints[..., :2] *= factor
+        return PoseDetections(self.boxes * factor, self.scores, keypoints)
+
+    def plot(self, frame: np.ndarray) -> np.ndarray:
+        annotated_frame = frame.copy()
+        for box, score, person in zip(self.boxes.astype(int), self.scores, self.keypoints):
+            cv2.rectangle(annotated_frame, tuple(box[:2]), tuple(box[2:]), (255, 128, 0), 2)
+            cv2.putText(annotated_frame, f"person {score:.2f}", (box[0], max(box[1] - 5, 10)), 
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 128, 0), 1)
+            visible = person[:, 2] > MotionDetectionConfig.CONFIDENCE_THRESHOLD
+            points = person[:, :2].astype(int)
+            for start, end in COCO_SKELETON:
+                if visible[start] and visible[end]:
+                    cv2.line(annotated_frame, tuple(points[start]), tuple(points[end]), (0, 255, 255), 2)
+            for point in points[visible]:
+                cv2.circle(annotated_frame, tuple(point), 3, (0, 0, 255), -1)
+        return annotated_frame
+
+def non_max_suppression(boxes: np.ndarray, scores: np.ndarray, iou_threshold: float) -> np.ndarray:
+    order = np.argsort(scores)[::-1]
+    iou = box_iou_matrix(boxes[order], boxes[order])
+    suppressed = np.zeros(len(order), dtype=bool)
+    keep = []
+    for i in range(len(order)):
+        if suppressed[i]:
+            continue
+        keep.append(i)
+        suppressed |= iou[i] > iou_threshold
+    return order[keep]
+
+TRACE_MAGIC = b"DMKT"
+TRACE_VERSION = 1
+TRACE_HEADER = np.dtype([("magic", "S4"), ("version", "<u2"), ("num_keypoints", "<u2"), ("row_size", "<u4")])
+TRACE_ROW = np.dtype([
+    ("timestamp", "<f8"),
+    ("frame", "<u4"),
+    ("count", "u1"),                    # jumlah orang di frame (0 = baris kosong)
+    ("person", "u1"),
+    ("score", "<f2"),
+    ("box", "<f2", (4,)),
+    ("keypoints", "<f2", (17, 3)),
+])
+TRACE_INDEX_ROW = np.dtype([("first_frame", "<u4"), ("frames", "<u4"), ("row", "<u8"), ("rows", "<u4"), ("timestamp", "<f8")])
+
+class KeypointTraceWriter:
+    def __init__(self, path: str, chunk_frames: Optional[int] = None, max_people: Optional[int] = None):
+        self.path = path
+        self.chunk_frames = chunk_frames or RecorderConfig.CHUNK_FRAMES
+        self.max_people = max_people or TrackingConfig.MAX_TRACKS
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
         
-        self.keypoint_history.append(stable_keypoints)
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            # Lanjutkan file lama: buang baris terpotong lalu tulis ulang index yang valid
+            reader = KeypointTraceReader(path)
+            self.frame_number = reader.num_frames
+            self.rows_written = reader.num_rows
+            index = reader.index
+            del reader
+            os.truncate(path, TRACE_HEADER.itemsize + self.rows_written * TRACE_ROW.itemsize)
+            index.tofile(path + ".idx")
+            self._data_file = open(path, "ab")
+        else:
+            self.frame_number = 0
+            self.rows_written = 0
+            self._data_file = open(path, "wb")
+            header = np.array([(TRACE_MAGIC, TRACE_VERSION, 17, TRACE_ROW.itemsize)], dtype=TRACE_HEADER)
+            self._data_file.write(header.tobytes())
+            open(path + ".idx", "wb").close()
+        self._index_file = open(path + ".idx", "ab")
         
-        if stable_keypoints is not None:
-            self.person_detected = True
-            
-            if self.is_keypoints_stable():
-                self.stable_pose_count += 1
+        self._buffer = np.zeros(self.chunk_frames * max(1, self.max_people), dtype=TRACE_ROW)
+        self._buffered_rows = 0
+        self._buffered_frames = 0
+        self._chunk_first_frame = self.frame_number
+        self._chunk_timestamp = 0.0
+
+    def append(self, timestamp: float, detections: PoseDetections) -> None:
+        count = min(len(detections), self.max_people, 255)
+        rows = max(count, 1)
+        if self._buffered_frames == 0:
+            self._chunk_first_frame = self.frame_number
+            self._chunk_timestamp = timestamp
+        
+        block = self._buffer[self._buffered_rows:self._buffered_rows + rows]
+        block["timestamp"] = timestamp
+        block["frame"] = self.frame_number
+        block["count"] = count
+        if count:
+            block["person"] = np.arange(count)
+            block["score"] = detections.scores[:count]
+            block["box"] = detections.boxes[:count]
+            block["keypoints"] = detections.keypoints[:count]
+        else:
+            block["person"] = 0
+            block["score"] = 0
+            block["box"] = 0
+            block["keypoints"] = 0
+        
+        self._buffered_rows += rows
+        self._buffered_frames += 1
+        self.frame_number += 1
+        if self._buffered_frames >= self.chunk_frames:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._buffered_rows == 0:
+            return
+        self._data_file.write(self._buffer[:self._buffered_rows].tobytes())
+        self._data_file.flush()
+        # Index ditulis setelah data, jadi index tidak pernah menunjuk ke data yang belum ada
+        index_row = np.array([(self._chunk_first_frame, self._buffered_frames, self.rows_written, 
+                               self._buffered_rows, self._chunk_timestamp)], dtype=TRACE_INDEX_ROW)
+        self._index_file.write(index_row.tobytes())
+        self._index_file.flush()
+        self.rows_written += self._buffered_rows
+        self._buffered_rows = 0
+        self._buffered_frames = 0
+
+    def close(self) -> None:
+        self.flush()
+        self._data_file.close()
+        self._index_file.close()
+
+class TraceBatch:
+    def __init__(self, rows: np.ndarray):
+        self.rows = rows
+        frames = rows["frame"]
+        self.starts = np.flatnonzero(np.r_[True, frames[1:] != frames[:-1]])
+        self.timestamps = rows["timestamp"][self.starts]
+        self.counts = rows["count"][self.starts]
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def keypoints(self) -> np.ndarray:
+        return self.rows["keypoints"].astype(np.float32)
+
+    def frames(self):
+        keypoints = self.keypoints()
+        boxes = self.rows["box"].astype(np.float32)
+        scores = self.rows["score"].astype(np.float32)
+        for start, timestamp, count in zip(self.starts, self.timestamps, self.counts):
+            end = start + count
+            yield float(timestamp), PoseDetections(boxes[start:end], scores[start:end], keypoints[start:end])
+
+class KeypointTraceReader:
+    def __init__(self, path: str):
+        self.path = path
+        header = np.fromfile(path, dtype=TRACE_HEADER, count=1)
+        if len(header) == 0 or header["magic"][0] != TRACE_MAGIC:
+            raise ValueError(f"{path} is not a keypoint trace")
+        if header["row_size"][0] != TRACE_ROW.itemsize:
+            raise ValueError(f"Unsupported trace row size {header['row_size'][0]}")
+        
+        self.num_rows = (os.path.getsize(path) - TRACE_HEADER.itemsize) // TRACE_ROW.itemsize     # abaikan baris terpotong
+        self.rows = (np.memmap(path, dtype=TRACE_ROW, mode="r", offset=TRACE_HEADER.itemsize, shape=(self.num_rows,))
+                     if self.num_rows else np.zeros(0, dtype=TRACE_ROW))
+        self.index = self._load_index()
+        self.num_frames = int(self.index["first_frame"][-1] + self.index["frames"][-1]) if len(self.index) else 0
+
+    def _load_index(self) -> np.ndarray:
+        index_path = self.path + ".idx"
+        index = (np.fromfile(index_path, dtype=TRACE_INDEX_ROW) 
+                 if os.path.exists(index_path) else np.zeros(0, dtype=TRACE_INDEX_ROW))
+        index = index[index["row"] + index["rows"] <= self.num_rows]
+        indexed_rows = int(index["row"][-1] + index["rows"][-1]) if len(index) else 0
+        if indexed_rows < self.num_rows:
+            # Data tanpa index (misal proses mati sebelum index ditulis): bangun ulang dari kolom frame
+            tail = TraceBatch(self.rows[indexed_rows:])
+            first_frame = int(self.rows["frame"][indexed_rows])
+            tail_index = np.array([(first_frame, len(tail), indexed_rows, self.num_rows - indexed_rows, 
+                                    tail.timestamps[0])], dtype=TRACE_INDEX_ROW)
+            index = np.concatenate([index, tail_index])
+        return index
+
+    def __len__(self) -> int:
+        return self.num_frames
+
+    def iter_batches(self, max_rows: int = 1 << 16, start_time: Optional[float] = None):
+        first_chunk = 0
+        if start_time is not None and len(self.index):
+            first_chunk = max(int(np.searchsorted(self.index["timestamp"], start_time, side="right")) - 1, 0)
+        batch_start = int(self.index["row"][first_chunk]) if len(self.index) else 0
+        for chunk in self.index[first_chunk:]:
+            chunk_end = int(chunk["row"] + chunk["rows"])
+            if chunk_end - batch_start >= max_rows:
+                yield TraceBatch(self.rows[batch_start:chunk_end])
+                batch_start = chunk_end
+        if batch_start < self.num_rows:
+            yield TraceBatch(self.rows[batch_start:self.num_rows])
+
+    def iter_frames(self):
+        for batch in self.iter_batches():
+            yield from batch.frames()
+
+def replay_trace(path: str, tracker: Optional[MultiPersonTracker] = None) -> MultiPersonTracker:
+    tracker = tracker or MultiPersonTracker()
+    for timestamp, detections in KeypointTraceReader(path).iter_frames():
+        if len(detections):
+            tracker.update_motion_detection(detections.keypoints, detections.boxes, timestamp)
+        else:
+            tracker.update_motion_detection(None, None, timestamp)
+    return tracker
+
+class EventStore:
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS events (
+            id INTEGER PRIMARY KEY, ts REAL NOT NULL, room TEXT NOT NULL, kind TEXT NOT NULL, 
+            subject TEXT NOT NULL, value REAL, data TEXT);
+        CREATE INDEX IF NOT EXISTS events_ts ON events (ts);
+        CREATE TABLE IF NOT EXISTS rollups (
+            hour INTEGER NOT NULL, room TEXT NOT NULL, metric TEXT NOT NULL, subject TEXT NOT NULL, 
+            seconds REAL NOT NULL, PRIMARY KEY (hour, room, metric, subject));
+        CREATE TABLE IF NOT EXISTS sync_state (name TEXT PRIMARY KEY, position REAL NOT NULL);
+    """
+
+    def __init__(self, path: Optional[str] = None, clock: Callable[[], float] = time.time, 
+                 stats: Optional[StageStats] = None):
+        self.path = path or EventStoreConfig.PATH
+        self.clock = clock
+        self.stats = stats or StageStats()
+        self.sync_publisher: Optional[Callable[[List[Dict[str, Any]]], None]] = None
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(self.SCHEMA)
+        self._queue: queue.Queue = queue.Queue(maxsize=EventStoreConfig.QUEUE_SIZE)
+        # Interval yang masih terbuka per (room, metric, subject): (mulai, bobot)
+        self._open: Dict[Tuple[str, str, str], Tuple[float, float]] = {}
+        self._last_prune = 0.0
+        self._last_checkpoint = time.perf_counter()
+        self._last_sync = time.perf_counter()
+        self._thread = threading.Thread(target=self._writer, name="event-store", daemon=True)
+        self._thread.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=5.0)
+        connection.execute("PRAGMA synchronous=NORMAL")      # aman dengan WAL, fsync hanya saat checkpoint
+        return connection
+
+    def record(self, timestamp: float, room: Optional[str], kind: str, subject: str = "", 
+               value: Optional[float] = None, data: Optional[Dict[str, Any]] = None) -> None:
+        # Dipanggil dari thread mana pun, tidak pernah menunggu disk
+        try:
+            self._queue.put_nowait((timestamp, room or "", kind, subject, value, 
+                                    json.dumps(data) if data is not None else None))
+        except queue.Full:
+            self.stats.drop("event_store")
+
+    def _writer(self) -> None:
+        connection = self._connect()
+        running = True
+        while running:
+            batch = []
+            deadline = time.perf_counter() + EventStoreConfig.FLUSH_INTERVAL
+            while len(batch) < EventStoreConfig.BATCH_SIZE:
+                try:
+                    event = self._queue.get(timeout=max(0.0, deadline - time.perf_counter()))
+                except queue.Empty:
+                    break
+                if event is None:
+                    running = False
+                    break
+                batch.append(event)
+            try:
+                self._write_batch(connection, batch, final=not running)
+                self._maintain(connection)
+            except sqlite3.Error as e:
+                print(f"Event store write failed: {e}")
+                self.stats.drop("event_store", len(batch))
+        connection.close()
+
+    def _write_batch(self, connection: sqlite3.Connection, batch: List[Tuple], final: bool = False) -> None:
+        start_time = time.perf_counter()
+        credits: Dict[Tuple[int, str, str, str], float] = {}
+        for timestamp, room, kind, subject, value, data in batch:
+            if kind == "occupancy":
+                self._transition(credits, (room, "occupied_seconds", ""), timestamp, float(value > 0))
+            elif kind == "device":
+                self._transition(credits, (room, "on_seconds", subject), timestamp, float(value > 0))
+                self._transition(credits, (room, "level_seconds", subject), timestamp, value)
+        # Interval yang masih terbuka dihitung sampai sekarang agar rollup jam berjalan tetap terkini
+        if batch or final or start_time - self._last_checkpoint >= EventStoreConfig.CHECKPOINT_INTERVAL:
+            self._last_checkpoint = start_time
+            self._checkpoint(credits, self.clock(), final)
+        if not batch and not credits:
+            return
+        
+        with connection:
+            connection.executemany("INSERT INTO events (ts, room, kind, subject, value, data) VALUES (?, ?, ?, ?, ?, ?)", 
+                                   batch)
+            self._store_credits(connection, credits)
+        if batch:
+            self.stats.record("event_store_write", time.perf_counter() - start_time)
+            self.stats.increment("events_stored", len(batch))
+
+    def _checkpoint(self, credits: Dict[Tuple[int, str, str, str], float], until: float, final: bool = False) -> None:
+        for key, (start, weight) in list(self._open.items()):
+            if until > start:
+                self._credit(credits, key, start, until, weight)
+                self._open[key] = (until, weight)
+            if final:
+                del self._open[key]
+
+    @staticmethod
+    def _store_credits(connection: sqlite3.Connection, credits: Dict[Tuple[int, str, str, str], float]) -> None:
+        connection.executemany("""INSERT INTO rollups (hour, room, metric, subject, seconds) VALUES (?, ?, ?, ?, ?)
+                                  ON CONFLICT (hour, room, metric, subject) DO UPDATE SET seconds = seconds + excluded.seconds""", 
+                               [(*key, seconds) for key, seconds in credits.items()])
+
+    def _transition(self, credits: Dict[Tuple[int, str, str, str], float], 
+                    key: Tuple[str, str, str], timestamp: float, weight: float) -> None:
+        if key in self._open:
+            start, open_weight = self._open.pop(key)
+            self._credit(credits, key, start, timestamp, open_weight)
+        if weight > 0:
+            self._open[key] = (timestamp, weight)
+
+    @staticmethod
+    def _credit(credits: Dict[Tuple[int, str, str, str], float], 
+                key: Tuple[str, str, str], start: float, end: float, weight: float) -> None:
+        # Interval dipecah per jam (epoch UTC) agar rollup bisa langsung dijumlahkan per jam
+        while start < end:
+            hour = int(start // 3600) * 3600
+            segment_end = min(end, hour + 3600)
+            credits[(hour, *key)] = credits.get((hour, *key), 0.0) + (segment_end - start) * weight
+            start = segment_end
+
+    def _maintain(self, connection: sqlite3.Connection) -> None:
+        now = time.perf_counter()
+        if EventStoreConfig.RETENTION_DAYS > 0 and now - self._last_prune >= 3600:
+            self._last_prune = now
+            with connection:
+                connection.execute("DELETE FROM events WHERE ts < ?", 
+                                   (self.clock() - EventStoreConfig.RETENTION_DAYS * 86400,))
+        if (self.sync_publisher is not None and EventStoreConfig.SYNC_INTERVAL > 0 and 
+            now - self._last_sync >= EventStoreConfig.SYNC_INTERVAL):
+            self._last_sync = now
+            self._sync(connection)
+
+    def _sync(self, connection: sqlite3.Connection) -> None:
+        # Hanya jam yang sudah selesai; posisi disimpan agar tiap jam dikirim sekali walau restart
+        row = connection.execute("SELECT position FROM sync_state WHERE name = 'rollups'").fetchone()
+        synced_until = row[0] if row else 0
+        current_hour = int(self.clock() // 3600) * 3600
+        # Interval yang masih terbuka dihitung sampai batas jam dulu, jam yang sudah dikirim tidak berubah lagi
+        credits: Dict[Tuple[int, str, str, str], float] = {}
+        self._checkpoint(credits, current_hour)
+        if credits:
+            with connection:
+                self._store_credits(connection, credits)
+        rows = connection.execute("""SELECT hour, room, metric, subject, seconds FROM rollups 
+                                     WHERE hour >= ? AND hour < ? ORDER BY hour""", 
+                                  (synced_until, current_hour)).fetchall()
+        if rows:
+            self.sync_publisher([{"hour": hour, "room": room, "metric": metric, "subject": subject, 
+                                  "seconds": round(seconds, 1)} for hour, room, metric, subject, seconds in rows])
+        with connection:
+            connection.execute("INSERT OR REPLACE INTO sync_state (name, position) VALUES ('rollups', ?)", (current_hour,))
+
+    def rollups(self, since: float, until: Optional[float] = None, 
+                metric: Optional[str] = None, room: Optional[str] = None) -> List[Dict[str, Any]]:
+        query = "SELECT hour, room, metric, subject, seconds FROM rollups WHERE hour >= ? AND hour < ?"
+        params: List[Any] = [int(since // 3600) * 3600, until if until is not None else float("inf")]
+        if metric is not None:
+            query += " AND metric = ?"
+            params.append(metric)
+        if room is not None:
+            query += " AND room = ?"
+            params.append(room)
+        with closing(self._connect()) as connection:
+            rows = connection.execute(query + " ORDER BY hour, room, metric, subject", params).fetchall()
+        return [{"hour": hour, "room": room, "metric": metric, "subject": subject, "seconds": seconds} 
+                for hour, room, metric, subject, seconds in rows]
+
+    def events(self, since_id: int = 0, limit: int = 1000) -> List[Dict[str, Any]]:
+        with closing(self._connect()) as connection:
+            rows = connection.execute("""SELECT id, ts, room, kind, subject, value, data FROM events 
+                                         WHERE id > ? ORDER BY id LIMIT ?""", (since_id, limit)).fetchall()
+        return [{"id": event_id, "ts": timestamp, "room": room, "kind": kind, "subject": subject, "value": value, 
+                 "data": json.loads(data) if data else None} 
+                for event_id, timestamp, room, kind, subject, value, data in rows]
+
+    def close(self) -> None:
+        if self._thread.is_alive():
+            self._queue.put(None)       # blocking: event yang sudah antri tetap ditulis
+            self._thread.join(timeout=5.0)
+
+class UltralyticsPoseBackend:
+    name = "ultralytics"
+
+    def __init__(self, model_path: str):
+        from ultralytics import YOLO
+        self.model = YOLO(model_path, task="pose")
+
+    def predict(self, frame: np.ndarray, imgsz: Optional[int] = None) -> PoseDetections:
+        return self.predict_batch([frame], imgsz)[0]
+
+    def predict_batch(self, frames: List[np.ndarray], imgsz: Optional[int] = None) -> List[PoseDetections]:
+        options = {"verbose": False, 
+                   "conf": InferenceConfig.CONFIDENCE_THRESHOLD, 
+                   "iou": InferenceConfig.IOU_THRESHOLD}
+        if imgsz is not None:
+            options["imgsz"] = imgsz
+        detections = []
+        for result in self.model.predict(list(frames), **options):
+            if result.keypoints is None or len(result.keypoints) == 0:
+                detections.append(PoseDetections.empty())
             else:
-                self.stable_pose_count = 0
+                detections.append(PoseDetections(result.boxes.xyxy.cpu().numpy(), 
+                                                 result.boxes.conf.cpu().numpy(), 
+                                                 result.keypoints.data.cpu().numpy()))
+        return detections
+
+    def warmup(self, imgsz: int = 640) -> None:
+        self.predict(np.zeros((imgsz, imgsz, 3), dtype=np.uint8), imgsz)
+
+class NCNNPoseBackend:
+    name = "ncnn"
+
+    def __init__(self, model_dir: str, num_threads: Optional[int] = None):
+        import ncnn
+        import yaml
+        
+        with open(os.path.join(model_dir, "metadata.yaml")) as metadata_file:
+            metadata = yaml.safe_load(metadata_file)
+        self.imgsz = int(metadata.get("imgsz", [640, 640])[0])
+        self.kpt_shape = tuple(metadata.get("kpt_shape", [17, 3]))
+        self.stride = int(metadata.get("stride", 32))
+        
+        self._ncnn = ncnn
+        self.net = ncnn.Net()
+        self.net.opt.use_vulkan_compute = False
+        self.net.opt.num_threads = num_threads or InferenceConfig.NUM_THREADS
+        self.net.load_param(os.path.join(model_dir, "model.ncnn.param"))
+        self.net.load_model(os.path.join(model_dir, "model.ncnn.bin"))
+        
+        # Buffer letterbox dipakai ulang setiap frame
+        self._canvas = np.full((self.imgsz, self.imgsz, 3), 114, dtype=np.uint8)
+        self._resized: Optional[np.ndarray] = None
+        self._geometry: Optional[Tuple[int, int, int, int, int, int]] = None
+        self._norm_values = [1 / 255.0] * 3
+
+    def set_num_threads(self, num_threads: int) -> None:
+        self.net.opt.num_threads = num_threads
+
+    def _letterbox(self, frame: np.ndarray) -> Tuple[float, int, int]:
+        height, width = frame.shape[:2]
+        if self._geometry is None or self._geometry[:2] != (height, width):
+            scale = min(self.imgsz / height, self.imgsz / width)
+            new_width, new_height = int(round(width * scale)), int(round(height * scale))
+            left, top = (self.imgsz - new_width) // 2, (self.imgsz - new_height) // 2
+            self._geometry = (height, width, new_width, new_height, left, top)
+            self._resized = np.empty((new_height, new_width, 3), dtype=np.uint8)
+            self._canvas[:] = 114
+        
+        height, width, new_width, new_height, left, top = self._geometry
+        cv2.resize(frame, (new_width, new_height), dst=self._resized, interpolation=cv2.INTER_LINEAR)
+        self._canvas[top:top + new_height, left:left + new_width] = self._resized
+        return new_width / width, left, top
+
+    def _decode(self, output: np.ndarray, scale: float, left: int, top: int, 
+                frame_shape: Tuple[int, ...]) -> PoseDetections:
+        num_keypoints, keypoint_dims = self.kpt_shape
+        predictions = output.reshape(5 + num_keypoints * keypoint_dims, -1)
+        scores = predictions[4]
+        candidates = np.flatnonzero(scores > InferenceConfig.CONFIDENCE_THRESHOLD)
+        if len(candidates) == 0:
+            return PoseDetections.empty(num_keypoints)
+        if len(candidates) > InferenceConfig.MAX_CANDIDATES:
+            top_scores = np.argpartition(scores[candidates], -InferenceConfig.MAX_CANDIDATES)
+            candidates = candidates[top_scores[-InferenceConfig.MAX_CANDIDATES:]]
+        
+        selected = predictions[:, candidates].T
+        center, size = selected[:, 0:2], selected[:, 2:4]
+        boxes = np.concatenate([center - size / 2, center + size / 2], axis=1)
+        scores = selected[:, 4]
+        
+        keep = non_max_suppression(boxes, scores, InferenceConfig.IOU_THRESHOLD)[:InferenceConfig.MAX_DETECTIONS]
+        boxes, scores = boxes[keep], scores[keep]
+        keypoints = selected[keep, 5:].reshape(-1, num_keypoints, keypoint_dims).copy()
+        
+        # Kembalikan ke koordinat frame asli (hapus padding dan skala letterbox)
+        offset = np.array([left, top], dtype=np.float32)
+        height, width = frame_shape[:2]
+        boxes = ((boxes.reshape(-1, 2, 2) - offset) / scale).reshape(-1, 4)
+        boxes[:, 0::2] = boxes[:, 0::2].clip(0, width)
+        boxes[:, 1::2] = boxes[:, 1::2].clip(0, height)
+        keypoints[..., :2] = (keypoints[..., :2] - offset) / scale
+        return PoseDetections(boxes.astype(np.float32), scores.astype(np.float32), keypoints.astype(np.float32))
+
+    def predict(self, frame: np.ndarray, imgsz: Optional[int] = None) -> PoseDetections:
+        # Graph hasil export memiliki jumlah anchor tetap (8400), jadi imgsz selalu dari metadata
+        scale, left, top = self._letterbox(frame)
+        input_mat = self._ncnn.Mat.from_pixels(self._canvas, self._ncnn.Mat.PixelType.PIXEL_BGR2RGB, 
+                                               self.imgsz, self.imgsz)
+        input_mat.substract_mean_normalize([], self._norm_values)
+        
+        with self.net.create_extractor() as extractor:
+            extractor.input("in0", input_mat)
+            _, output = extractor.extract("out0")
+            predictions = np.array(output)
+        return self._decode(predictions, scale, left, top, frame.shape)
+
+    def predict_batch(self, frames: List[np.ndarray], imgsz: Optional[int] = None) -> List[PoseDetections]:
+        # Graph ncnn hasil export berukuran batch 1, jadi frame dijalankan bergiliran di net yang sama
+        return [self.predict(frame, imgsz) for frame in frames]
+
+    def warmup(self, imgsz: Optional[int] = None) -> None:
+        # Inferensi pertama membayar inisialisasi graph, jangan sampai terjadi di loop utama
+        self.predict(np.zeros((self.imgsz, self.imgsz, 3), dtype=np.uint8))
+
+def create_pose_backend(backend: Optional[str] = None, 
+                        model_path: Optional[str] = None, 
+                        num_threads: Optional[int] = None) -> Any:
+    backend = backend or InferenceConfig.BACKEND
+    model_path = model_path or InferenceConfig.MODEL_PATH
+    if backend == "ncnn":
+        return NCNNPoseBackend(model_path, num_threads)
+    if backend == "ultralytics":
+        return UltralyticsPoseBackend(model_path)
+    raise ValueError(f"Unknown inference backend: {backend}")
+
+# Field InferenceConfig yang bisa di-hot-reload, dikirim bersama setiap task karena worker hanya menyalin config saat spawn
+POOL_TASK_FIELDS = ("CONFIDENCE_THRESHOLD", "IOU_THRESHOLD", "MAX_DETECTIONS")
+
+def _inference_pool_worker(shm_name: str, 
+                           slot_bytes: int, 
+                           config: Dict[str, Any], 
+                           num_threads: int, 
+                           tasks: Any, 
+                           results: Any) -> None:
+    # Proses anak (spawn) tidak mewarisi override config dari proses utama
+    for key, value in config.items():
+        setattr(InferenceConfig, key, value)
+    frames = shared_memory.SharedMemory(name=shm_name)
+    try:
+        backend = create_pose_backend(num_threads=num_threads)
+        backend.warmup()
+    except Exception as e:
+        results.put(("error", os.getpid(), str(e)))
+        frames.close()
+        return
+    results.put(("ready", os.getpid(), backend.name))
+    
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        sequence, slot, shape, imgsz, thresholds = task
+        for key, value in zip(POOL_TASK_FIELDS, thresholds):
+            setattr(InferenceConfig, key, value)
+        frame = np.ndarray(shape, dtype=np.uint8, buffer=frames.buf, offset=slot * slot_bytes)
+        try:
+            detections = backend.predict(frame, imgsz)
+            results.put(("result", sequence, slot, 
+                         (detections.boxes, detections.scores, detections.keypoints), None))
+        except Exception as e:
+            results.put(("result", sequence, slot, None, str(e)))
+        frame = None     # lepas view sebelum shared memory ditutup
+    frames.close()
+
+class InferenceWorkerPool:
+    def __init__(self, 
+                 workers: Optional[int] = None, 
+                 threads_per_worker: Optional[int] = None, 
+                 stats: Optional[StageStats] = None):
+        self.workers = workers or InferencePoolConfig.WORKERS
+        self.threads_per_worker = threads_per_worker or InferencePoolConfig.THREADS_PER_WORKER
+        self.stats = stats
+        self.name = f"{InferenceConfig.BACKEND}x{self.workers}"
+        self.slot_count = self.workers * max(1, InferencePoolConfig.SLOTS_PER_WORKER)
+        self.slot_bytes = InferencePoolConfig.MAX_FRAME_WIDTH * InferencePoolConfig.MAX_FRAME_HEIGHT * 3
+        
+        # Frame dikirim lewat slot shared memory, antrian hanya membawa nomor slot dan metadata
+        self._context = multiprocessing.get_context("spawn")
+        self._memory = shared_memory.SharedMemory(create=True, size=self.slot_count * self.slot_bytes)
+        self._tasks = self._context.Queue()
+        self._results = self._context.Queue()
+        self._free_slots: queue.Queue = queue.Queue()
+        for slot in range(self.slot_count):
+            self._free_slots.put(slot)
+        
+        self._processes: List[Any] = []
+        self._collector: Optional[threading.Thread] = None
+        self._condition = threading.Condition()
+        self._completed: Dict[int, Tuple[Any, Optional[PoseDetections]]] = {}
+        self._submitted: Dict[int, Tuple[Any, float]] = {}
+        self._submit_lock = threading.Lock()
+        self._next_submit = 0
+        self._next_result = 0
+        self._closed = False
+
+    def start(self) -> None:
+        config = {key: value for key, value in vars(InferenceConfig).items() if key.isupper()}
+        for index in range(self.workers):
+            process = self._context.Process(target=_inference_pool_worker, 
+                                            args=(self._memory.name, self.slot_bytes, config, 
+                                                  self.threads_per_worker, self._tasks, self._results), 
+                                            name=f"inference-{index}", daemon=True)
+            process.start()
+            self._processes.append(process)
+        
+        deadline = time.perf_counter() + InferencePoolConfig.START_TIMEOUT
+        for _ in range(self.workers):
+            try:
+                message = self._results.get(timeout=max(0.0, deadline - time.perf_counter()))
+            except queue.Empty:
+                self.close()
+                raise RuntimeError("Inference workers did not start in time")
+            if message[0] == "error":
+                self.close()
+                raise RuntimeError(f"Inference worker failed to load model: {message[2]}")
+        
+        self._collector = threading.Thread(target=self._collect_results, name="inference-collector", daemon=True)
+        self._collector.start()
+        print(f"Inference pool started: {self.workers} workers x {self.threads_per_worker} threads")
+
+    def healthy(self) -> bool:
+        return not self._closed and all(process.is_alive() for process in self._processes)
+
+    def submit(self, frame: Optional[np.ndarray], imgsz: Optional[int] = None, 
+               context: Any = None, timeout: Optional[float] = None) -> int:
+        # frame None = inferensi dilewati, tetap diberi nomor urut agar hasil keluar berurutan
+        if frame is not None and frame.nbytes > self.slot_bytes:
+            raise ValueError(f"Frame {frame.shape} exceeds inference pool slot size")
+        slot = self._free_slots.get(timeout=timeout) if frame is not None else None
+        
+        with self._submit_lock:
+            sequence = self._next_submit
+            self._next_submit += 1
+            if slot is None:
+                with self._condition:
+                    self._completed[sequence] = (context, None)
+                    self._condition.notify_all()
+                return sequence
             
-            center_point = self.calculate_pose_center(stable_keypoints)
-            if center_point is not None:
-                self.person_positions.append(center_point)
-                self.position_timestamps.append(current_time)
+            frame = np.ascontiguousarray(frame, dtype=np.uint8)
+            view = np.ndarray(frame.shape, dtype=np.uint8, buffer=self._memory.buf, offset=slot * self.slot_bytes)
+            view[...] = frame
+            self._submitted[sequence] = (context, time.perf_counter())
+            thresholds = tuple(getattr(InferenceConfig, key) for key in POOL_TASK_FIELDS)
+            self._tasks.put((sequence, slot, frame.shape, imgsz, thresholds))
+        return sequence
+
+    def _collect_results(self) -> None:
+        while not self._closed:
+            try:
+                message = self._results.get(timeout=0.1)
+            except (queue.Empty, EOFError, OSError):
+                continue
+            if message[0] != "result":
+                continue
+            _, sequence, slot, arrays, error = message
+            self._free_slots.put(slot)
             
-            if self.stable_pose_count >= 5:     # 5 frame
-                if self.detect_skeleton_motion():
-                    if not self.is_motion_detected:
-                        self.motion_start_time = current_time
-                        self.is_motion_detected = True
-                    
-                    self.last_motion_time = current_time
-                    
-                    if ((self.motion_start_time is not None) and 
-                        (current_time - self.motion_start_time) >= MotionDetectionConfig.DETECTION_DURATION):
-                        self.motion_triggered = True        # motion detection aktif jika pose stabil ≥5 frame dan stabil 
+            context, submit_time = self._submitted.pop(sequence)
+            if self.stats is not None:
+                self.stats.record("inference", time.perf_counter() - submit_time)
+            if error is not None:
+                print(f"Inference error (frame {sequence}): {error}")
+                detections = PoseDetections.empty()
+            else:
+                detections = PoseDetections(*arrays)
+            with self._condition:
+                self._completed[sequence] = (context, detections)
+                self._condition.notify_all()
+
+    def get(self, timeout: Optional[float] = None) -> Tuple[int, Any, Optional[PoseDetections]]:
+        # Hasil dikembalikan sesuai nomor urut submit, walaupun worker selesai tidak berurutan
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._next_result in self._completed, timeout):
+                raise queue.Empty
+            sequence = self._next_result
+            self._next_result += 1
+            context, detections = self._completed.pop(sequence)
+        return sequence, context, detections
+
+    def predict_batch(self, frames: List[np.ndarray], imgsz: Optional[int] = None) -> List[PoseDetections]:
+        for frame in frames:
+            self.submit(frame, imgsz)
+        return [self.get()[2] for _ in frames]
+
+    def predict(self, frame: np.ndarray, imgsz: Optional[int] = None) -> PoseDetections:
+        return self.predict_batch([frame], imgsz)[0]
+
+    def warmup(self, imgsz: Optional[int] = None) -> None:
+        pass     # setiap worker melakukan warm-up sendiri saat start()
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        for _ in self._processes:
+            self._tasks.put(None)
+        for process in self._processes:
+            process.join(timeout=2.0)
+            if process.is_alive():
+                process.terminate()
+        if self._collector is not None:
+            self._collector.join(timeout=1.0)
+        self._memory.close()
+        self._memory.unlink()
+
+WEEKDAY_NAMES = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+WEEKDAY_GROUPS = {"daily": range(7), "weekdays": range(5), "weekends": range(5, 7)}
+SECONDS_PER_DAY = 24 * 3600
+SECONDS_PER_WEEK = 7 * SECONDS_PER_DAY
+
+class ScheduleError(ValueError):
+    pass
+
+class DeviceSchedule:
+    def __init__(self, windows: List[Dict[str, Any]]):
+        if not windows:
+            raise ScheduleError("Schedule needs at least one window")
         
-        else:
-            self.person_detected = False
-            self.stable_pose_count = 0      
+        # Semua window dikompilasi sekali menjadi batas-batas detik dalam seminggu
+        intervals = []
+        for window in windows:
+            if not isinstance(window, dict):
+                raise ScheduleError(f"Invalid schedule window: {window!r}")
+            on_second = self._parse_time(window.get("on"))
+            off_second = self._parse_time(window.get("off"))
+            if on_second == off_second:
+                raise ScheduleError(f"Window {window.get('on')}-{window.get('off')} has zero length")
+            duration = (off_second - on_second) % SECONDS_PER_DAY     # off < on = melewati tengah malam
             
-            if (self.last_motion_time and 
-                current_time - self.last_motion_time > MotionDetectionConfig.MOTION_COOLDOWN):
-                self.is_motion_detected = False
-                self.motion_triggered = False
-                self.motion_start_time = None       
+            for day in self._parse_days(window.get("days", "daily")):
+                start = day * SECONDS_PER_DAY + on_second
+                end = start + duration
+                if end > SECONDS_PER_WEEK:
+                    intervals.append((start, SECONDS_PER_WEEK))
+                    intervals.append((0, end - SECONDS_PER_WEEK))
+                else:
+                    intervals.append((start, end))
+        
+        merged: List[List[int]] = []
+        for start, end in sorted(intervals):
+            if merged and start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        self.windows = windows
+        self._boundaries = [second for interval in merged for second in interval]
+
+    @staticmethod
+    def _parse_time(value: Any) -> int:
+        try:
+            parts = [int(part) for part in str(value).split(":")]
+        except ValueError:
+            raise ScheduleError(f"Invalid time {value!r}, expected HH:MM")
+        if len(parts) not in (2, 3):
+            raise ScheduleError(f"Invalid time {value!r}, expected HH:MM")
+        hour, minute, second = (parts + [0])[:3]
+        if not (0 <= hour < 24 and 0 <= minute < 60 and 0 <= second < 60):
+            raise ScheduleError(f"Time out of range: {value!r}")
+        return hour * 3600 + minute * 60 + second
+
+    @staticmethod
+    def _parse_days(value: Any) -> List[int]:
+        if isinstance(value, str):
+            value = [value]
+        days = set()
+        for day in value or []:
+            if isinstance(day, int) and 0 <= day < 7:
+                days.add(day)
+            elif isinstance(day, str) and day.lower() in WEEKDAY_GROUPS:
+                days.update(WEEKDAY_GROUPS[day.lower()])
+            elif isinstance(day, str) and day.lower()[:3] in WEEKDAY_NAMES:
+                days.add(WEEKDAY_NAMES.index(day.lower()[:3]))
+            else:
+                raise ScheduleError(f"Invalid day {day!r}")
+        if not days:
+            raise ScheduleError("Schedule window has no days")
+        return sorted(days)
+
+    def state_at(self, timestamp: float) -> Tuple[bool, float]:
+        local = datetime.fromtimestamp(timestamp)
+        week_second = (local.weekday() * SECONDS_PER_DAY + local.hour * 3600 + 
+                       local.minute * 60 + local.second + local.microsecond / 1e6)
+        index = bisect.bisect_right(self._boundaries, week_second)
+        active = index % 2 == 1
+        if index < len(self._boundaries):
+            next_boundary = self._boundaries[index]
+        else:
+            next_boundary = self._boundaries[0] + SECONDS_PER_WEEK
+        if next_boundary == SECONDS_PER_WEEK and self._boundaries[0] == 0 and len(self._boundaries) > 2:
+            # Window Minggu malam yang berlanjut ke Senin tidak berakhir di pergantian minggu
+            next_boundary = self._boundaries[1] + SECONDS_PER_WEEK
+        return active, timestamp + (next_boundary - week_second)
 
 class SmartDevice:
-    def __init__(self, name: str, gpio_pin: int):
+    def __init__(self, name: str, gpio_pin: int, pwm: bool = False):
         self.name = name
-        self.instance = LED(gpio_pin)
-        self.state = 0  # 0 = OFF, 1 = ON
+        self.pwm = pwm
+        self.instance = gpiozero.PWMLED(gpio_pin) if pwm else gpiozero.LED(gpio_pin)
+        self.state = 0  # 0 = OFF, 1 = ON (state logis, level bisa masih ramp)
+        self.level = 0.0  # level yang terakhir ditulis ke GPIO
+        self.target_level = 0.0  # level tujuan (akhir ramp), dicatat di event store
         self.mode = "auto"  # auto, manual, scheduled
         self.schedule_on = None
         self.schedule_off = None
+        self.schedule: Optional[DeviceSchedule] = None
+        self._schedule_active = False
+        self._schedule_checked_at = 0.0
+        self._schedule_valid_until = 0.0     # waktu transisi berikutnya, sebelum itu state tidak berubah
         self.is_person_reported = False
         self.no_motion_start_time = None
 
+    def write_level(self, level: float) -> bool:
+        if not self.pwm:
+            level = 1.0 if level > 0 else 0.0
+        if level == self.level:
+            return False        # tidak ada transisi, GPIO tidak ditulis ulang
+        if self.pwm:
+            self.instance.value = level
+        elif level > 0:
+            self.instance.on()
+        else:
+            self.instance.off()
+        self.level = level
+        return True
+
     def turn_on(self) -> None:
-        self.instance.on()
+        self.write_level(1.0)
         self.state = 1
 
     def turn_off(self) -> None:
-        self.instance.off()
+        self.write_level(0.0)
         self.state = 0
 
     def set_mode(self, mode: str) -> None:
         if mode in ["auto", "manual", "scheduled"]:
             self.mode = mode
 
-    def set_schedule(self, on_time: str, off_time: str) -> None:
+    def set_schedule(self, 
+                     on_time: Optional[str] = None, 
+                     off_time: Optional[str] = None, 
+                     windows: Optional[List[Dict[str, Any]]] = None) -> None:
+        # Jadwal lama tetap dipakai jika jadwal baru tidak valid (ScheduleError)
+        if windows is None:
+            windows = [{"on": on_time, "off": off_time}]
+        self.schedule = DeviceSchedule(windows)
         self.schedule_on = on_time
         self.schedule_off = off_time
+        self._schedule_valid_until = 0.0
 
-    def is_scheduled_active(self, current_time: datetime.time) -> bool:
-        if not self.schedule_on or not self.schedule_off:
+    def is_scheduled_active(self, timestamp: float) -> bool:
+        if self.schedule is None:
             return False
+        if not self._schedule_checked_at <= timestamp < self._schedule_valid_until:
+            self._schedule_active, next_transition = self.schedule.state_at(timestamp)
+            self._schedule_checked_at = timestamp
+            self._schedule_valid_until = min(next_transition, timestamp + DeviceConfig.SCHEDULE_RECHECK_INTERVAL)
+        return self._schedule_active
+
+    def close(self) -> None:
+        self.instance.close()
+
+class DeviceCommand:
+    # Perintah dari aplikasi didahulukan dari keputusan otomatis, stop diproses paling akhir
+    PRIORITIES = {"action": 0, "mode": 0, "schedule": 0, "presence": 1}
+    STOP_PRIORITY = 2
+
+    def __init__(self, kind: str, device: Optional[str] = None, value: Any = None, timestamp: float = 0.0):
+        self.kind = kind            # presence, action, mode, schedule (config hanya untuk ack)
+        self.device = device
+        self.value = value
+        self.timestamp = timestamp
+        self.enqueued_at = time.perf_counter()
+        self.priority = self.PRIORITIES.get(kind, 1)
+        # Diisi untuk perintah dari MQTT, dipakai untuk ack dan latency
+        self.command_id: Any = None
+        self.received_at: Optional[float] = None     # perf_counter saat pesan diterima
+        self.sent_at: Optional[float] = None         # timestamp (epoch) dari aplikasi, jika dikirim
+
+class DeviceController:
+    def __init__(self, devices: Dict[str, SmartDevice], clock: Callable[[], float] = time.time):
+        self.devices = devices
+        self.clock = clock
+        self.stats = StageStats()
+        self.mqtt_handler: Any = None
+        self.event_store: Optional[EventStore] = None
+        self.room: Optional[str] = None
+        self._commands: queue.PriorityQueue = queue.PriorityQueue()
+        self._sequence = itertools.count()      # urutan FIFO di dalam prioritas yang sama
+        self._closed = False
+        self._dispatch_lock = threading.Lock()
+        self._submitted_presence = "hold"       # dibaca/ditulis hanya oleh thread vision
+        self._presence = "hold"                 # dibaca/ditulis hanya oleh thread actuator
+        self._ramps: Dict[str, Tuple[float, float, float]] = {}
+        self._thread = threading.Thread(target=self._worker, name="actuator", daemon=True)
+
+    def start(self, mqtt_handler: Any, stats: Optional[StageStats] = None, 
+              event_store: Optional[EventStore] = None, room: Optional[str] = None) -> None:
+        self.mqtt_handler = mqtt_handler
+        self.event_store = event_store
+        self.room = room
+        if stats is not None:
+            self.stats = stats
+        self._thread.start()
+
+    def submit(self, kind: str, device: Optional[str] = None, value: Any = None) -> None:
+        self.dispatch(DeviceCommand(kind, device, value, self.clock()))
+
+    def dispatch(self, command: DeviceCommand) -> None:
+        # Semua perubahan state perangkat lewat antrian ini, hanya thread actuator yang menulis
+        if not command.timestamp:
+            command.timestamp = self.clock()
+        with self._dispatch_lock:
+            if not self._closed:
+                self._commands.put((command.priority, next(self._sequence), command))
+                return
+        self._ack(command, "shutting down")     # antrian sudah ditutup, perintah tidak akan dijalankan
+
+    def update_presence(self, should_be_active: bool, should_be_inactive: bool) -> None:
+        presence = "present" if should_be_active else "absent" if should_be_inactive else "hold"
+        if presence != self._submitted_presence:
+            self._submitted_presence = presence
+            self.submit("presence", value=presence)
+
+    def _worker(self) -> None:
+        while True:
+            try:
+                _, _, command = self._commands.get(timeout=self._next_timeout())
+            except queue.Empty:
+                command = False
+            if command is None:
+                break
+            if command:
+                try:
+                    error = self._apply(command)
+                except Exception as e:
+                    print(f"Device command {command.kind} failed: {e}")
+                    error = str(e)
+                self.stats.record("actuation_queue", time.perf_counter() - command.enqueued_at)
+                self._ack(command, error)
+            try:
+                self._run_timers()
+            except Exception as e:
+                print(f"Device timers failed: {e}")
+
+    def _ack(self, command: DeviceCommand, error: Optional[str] = None) -> None:
+        if command.received_at is None or self.mqtt_handler is None:
+            return      # keputusan otomatis tidak di-ack
+        self.stats.record("command_latency", time.perf_counter() - command.received_at)
+        data: Dict[str, Any] = {"status": "rejected" if error else "applied"}
+        if error:
+            data["error"] = error
+        device = self.devices.get(command.device)
+        if device is not None:
+            data.update({"state": device.state, "level": device.target_level, "mode": device.mode})
+        self.mqtt_handler.publish_ack(command, data)
+
+    def _next_timeout(self) -> float:
+        timeout = DeviceConfig.ACTUATOR_MAX_WAIT
+        if self._ramps:
+            timeout = min(timeout, DeviceConfig.RAMP_TIME / max(1, DeviceConfig.RAMP_STEPS))
+        now = self.clock()
+        for device in self.devices.values():
+            if device.mode == "auto" and device.no_motion_start_time is not None and self._presence == "absent":
+                timeout = min(timeout, device.no_motion_start_time + MotionDetectionConfig.AUTO_OFF_DELAY - now)
+            elif device.mode == "scheduled" and device.schedule is not None:
+                timeout = min(timeout, device._schedule_valid_until - now)
+        return max(0.0, timeout)
+
+    def _log(self, kind: str, subject: str = "", value: Optional[float] = None, 
+             data: Optional[Dict[str, Any]] = None, timestamp: Optional[float] = None) -> None:
+        if self.event_store is not None:
+            self.event_store.record(timestamp or self.clock(), self.room, kind, subject, value, data)
+
+    def _set_target(self, device: SmartDevice, level: float, source: str) -> None:
+        level = min(1.0, max(0.0, float(level)))
+        if level != device.target_level:
+            device.target_level = level
+            self._log("device", device.name, level, {"source": source})
+        device.state = 1 if level > 0 else 0
+        if device.pwm and DeviceConfig.RAMP_TIME > 0:
+            self._ramps[device.name] = (device.level, level, time.perf_counter())
+            self._step_ramps()
+        else:
+            self._write(device, level)
+            self._ramps.pop(device.name, None)
+
+    def _write(self, device: SmartDevice, level: float) -> None:
+        if device.write_level(level):
+            self.stats.increment("gpio_writes")
+        else:
+            self.stats.increment("gpio_writes_skipped")
+
+    def _step_ramps(self) -> None:
+        now = time.perf_counter()
+        for name, (start_level, target_level, start_time) in list(self._ramps.items()):
+            steps = max(1, DeviceConfig.RAMP_STEPS)
+            if DeviceConfig.RAMP_TIME <= 0:
+                step = steps        # RAMP_TIME di-reload ke 0 saat ramp berjalan: langsung ke level target
+            else:
+                # Langkah pertama langsung ditulis agar perintah terlihat di GPIO tanpa menunggu satu interval ramp
+                step = min(steps, int((now - start_time) / DeviceConfig.RAMP_TIME * steps) + 1)     # level dikuantisasi per langkah
+            self._write(self.devices[name], round(start_level + (target_level - start_level) * step / steps, 4))
+            if step >= steps:
+                del self._ramps[name]
+
+    def _report(self, device: SmartDevice, data: Dict[str, Any], timestamp: float) -> None:
+        if self.mqtt_handler is not None:
+            self.mqtt_handler.publish_sensor_data(device.name, data, timestamp=timestamp)
+
+    def _apply(self, command: DeviceCommand) -> Optional[str]:
+        if command.kind == "presence":
+            if command.value != "hold" and command.value != self._presence:
+                self._log("occupancy", value=float(command.value == "present"), timestamp=command.timestamp)
+            self._presence = command.value
+            for device in self.devices.values():
+                if device.mode == "auto":
+                    self._apply_presence(device, command.timestamp)
+            return None
+        
+        device = self.devices.get(command.device)
+        if device is None:
+            return f"unknown device {command.device!r}"
+        if command.kind == "action":
+            return self._apply_action(device, command.value)
+        elif command.kind == "mode":
+            device.set_mode(command.value)
+            print(f"Settings update: {device.name} mode set to {device.mode}")
+            self._log("mode", device.name, data={"mode": device.mode}, timestamp=command.timestamp)
+            device.no_motion_start_time = None
+            if device.mode == "auto":
+                self._apply_presence(device, command.timestamp)
+        elif command.kind == "schedule":
+            try:
+                device.set_schedule(**command.value)
+                print(f"Settings update: {device.name} schedule updated")
+                self._log("schedule", device.name, data=command.value, timestamp=command.timestamp)
+            except ScheduleError as e:
+                print(f"Settings update: invalid schedule for {device.name}: {e}")
+                if self.mqtt_handler is not None:
+                    self.mqtt_handler.publish_settings_error(device.name, "schedule", str(e))
+                return str(e)
+        return None
+
+    def _apply_presence(self, device: SmartDevice, timestamp: float) -> None:
+        if self._presence == "present":
+            device.no_motion_start_time = None
+            if device.state == 0:
+                self._set_target(device, DeviceConfig.ON_LEVEL, "auto")
+                print(f"Auto control: {device.name} turned ON (motion detected)")
+            if not device.is_person_reported:
+                device.is_person_reported = True
+                self._report(device, {"motion_detected": True}, timestamp)
+        elif self._presence == "absent":
+            if device.state == 1 and device.no_motion_start_time is None:
+                device.no_motion_start_time = timestamp     # timer AUTO_OFF_DELAY mulai berjalan
+            if device.is_person_reported:
+                device.is_person_reported = False
+                self._report(device, {"motion_cleared": True}, timestamp)
+
+    def _apply_action(self, device: SmartDevice, value: Dict[str, Any]) -> Optional[str]:
+        action = value.get("action")
+        level = value.get("level")
+        if action in ("turn_on", "set_level"):
+            # Level 0 eksplisit tetap 0, hanya level yang tidak diisi memakai default
+            if level is None:
+                level = DeviceConfig.ON_LEVEL if action == "turn_on" else 0.0
+            if (isinstance(level, bool) or not isinstance(level, (int, float)) or
+                not math.isfinite(level) or not 0.0 <= level <= 1.0):
+                return f"level must be a number in [0, 1], got {level!r}"
+        device.set_mode("manual")
+        if action == "turn_on":
+            self._set_target(device, level, "manual")
+            print(f"Manual control: {device.name} turned ON")
+        elif action == "turn_off":
+            self._set_target(device, 0.0, "manual")
+            print(f"Manual control: {device.name} turned OFF")
+        elif action == "set_level":
+            self._set_target(device, level, "manual")
+            print(f"Manual control: {device.name} level set to {level}")
+        return None
+
+    def _run_timers(self) -> None:
+        now = self.clock()
+        for device in self.devices.values():
+            if (device.mode == "auto" and device.no_motion_start_time is not None and 
+                self._presence == "absent" and 
+                now - device.no_motion_start_time >= MotionDetectionConfig.AUTO_OFF_DELAY):
+                device.no_motion_start_time = None
+                if device.state == 1:
+                    self._set_target(device, 0.0, "auto")
+                    print(f"Auto control: {device.name} turned OFF (no motion)")
+            elif device.mode == "scheduled":
+                is_active_time = device.is_scheduled_active(now)
+                if is_active_time and device.state == 0:
+                    self._set_target(device, DeviceConfig.ON_LEVEL, "scheduled")
+                    print(f"Scheduled control: {device.name} turned ON")
+                elif not is_active_time and device.state == 1:
+                    self._set_target(device, 0.0, "scheduled")
+                    print(f"Scheduled control: {device.name} turned OFF")
+        if self._ramps:
+            self._step_ramps()
+
+    def queue_depth(self) -> int:
+        return self._commands.qsize()
+
+    def close(self) -> None:
+        with self._dispatch_lock:
+            self._closed = True
+            # Perintah yang sudah antri tetap diproses (dan di-ack) dulu
+            self._commands.put((DeviceCommand.STOP_PRIORITY, next(self._sequence), None))
+        if self._thread.is_alive():
+            self._thread.join(timeout=2.0)
+        for device in self.devices.values():
+            device.close()
+
+class OutboundMessage:
+    def __init__(self, topic: str, payload: Dict[str, Any], coalesce_key: Optional[Tuple] = None,
+                 immediate: bool = False, spool: bool = True):
+        self.topic = topic
+        self.payload = payload
+        self.coalesce_key = coalesce_key
+        self.immediate = immediate
+        self.spool = spool
+        self.enqueued_at = time.perf_counter()
+
+class MQTTPublisher:
+    def __init__(self, client: Any, stats: Optional[StageStats] = None):
+        self.client = client
+        self.stats = stats or StageStats()
+        self._queue = LatestOnlyQueue(PublisherConfig.QUEUE_SIZE, "mqtt_queue", self.stats)
+        self._pending: "OrderedDict[Any, OutboundMessage]" = OrderedDict()
+        self._sequence = 0
+        self._connected = threading.Event()
+        self._stopping = threading.Event()
+        self._wake = threading.Event()
+        self._spooled = self.spool_bytes() > 0      # hanya diubah oleh thread publisher (dan __init__)
+        self._retry_at = 0.0                        # spool tidak diputar ulang sebelum ini setelah publish gagal
+        self._last_info = None
+        self._thread = threading.Thread(target=self._worker, name="mqtt-publisher", daemon=True)
+
+    def start(self) -> None:
+        # connect() dipanggil ulang saat retry; thread hanya boleh di-start sekali
+        if not self._thread.is_alive():
+            self._thread.start()
+
+    def set_connected(self, connected: bool) -> None:
+        if connected:
+            self._connected.set()
+            self._wake.set()        # putar ulang spool secepatnya
+        else:
+            self._connected.clear()
+
+    def publish(self, topic: str, payload: Dict[str, Any], coalesce_key: Optional[Tuple] = None,
+                immediate: bool = False, spool: bool = True) -> None:
+        self._queue.put(OutboundMessage(topic, payload, coalesce_key, immediate, spool))
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize() + len(self._pending)
+
+    def spool_bytes(self) -> int:
+        try:
+            return os.path.getsize(PublisherConfig.SPOOL_PATH)
+        except OSError:
+            return 0
+
+    def metrics(self) -> Dict[str, Any]:
+        summary = self.stats.summary()
+        return {
+            "queue_depth": self.queue_depth(),
+            "spool_bytes": self.spool_bytes(),
+            "publish_latency": summary["stages"].get("mqtt_publish_latency", {}),
+            "counters": {name: count for name, count in summary["counters"].items() if name.startswith("mqtt_")},
+            "dropped": summary["dropped"].get("mqtt_queue", 0),
+        }
+
+    def _add_pending(self, message: OutboundMessage) -> None:
+        if message.coalesce_key is not None and message.coalesce_key in self._pending:
+            # Event state yang lama sudah tidak relevan, cukup kirim state terbaru
+            previous = self._pending.pop(message.coalesce_key)
+            message.enqueued_at = previous.enqueued_at
+            self.stats.increment("mqtt_coalesced")
+        key = message.coalesce_key
+        if key is None:
+            self._sequence += 1
+            key = ("sequence", self._sequence)
+        self._pending[key] = message
+
+    def _batch_due(self, now: float) -> bool:
+        if not self._pending:
+            return False
+        oldest = next(iter(self._pending.values()))
+        return (len(self._pending) >= PublisherConfig.BATCH_MAX_MESSAGES or 
+                now - oldest.enqueued_at >= PublisherConfig.BATCH_MAX_DELAY or
+                any(message.immediate for message in self._pending.values()))
+
+    def _worker(self) -> None:
+        while True:
+            if self._pending:
+                oldest = next(iter(self._pending.values()))
+                timeout = max(0.0, PublisherConfig.BATCH_MAX_DELAY - (time.perf_counter() - oldest.enqueued_at))
+            else:
+                timeout = 0.2
+            try:
+                self._add_pending(self._queue.get(timeout=min(timeout, 0.2)))
+                while len(self._pending) < PublisherConfig.BATCH_MAX_MESSAGES:
+                    self._add_pending(self._queue.get(timeout=0))
+            except queue.Empty:
+                pass
+            
+            if self._wake.is_set():
+                self._wake.clear()
+                self._retry_at = 0.0
+            # Spool diputar ulang setiap kali terhubung dan tersisa pesan, termasuk sisa replay yang terputus
+            if self._spooled and self._connected.is_set() and time.perf_counter() >= self._retry_at:
+                self._replay_spool()
+            
+            stopping = self._stopping.is_set()
+            if stopping or self._batch_due(time.perf_counter()):
+                self._flush_pending()
+            if stopping and self._queue.qsize() == 0 and not self._pending:
+                break
+
+    def _flush_pending(self) -> None:
+        if not self._pending:
+            return
+        by_topic: "OrderedDict[str, List[OutboundMessage]]" = OrderedDict()
+        for message in self._pending.values():
+            by_topic.setdefault(message.topic, []).append(message)
+        self._pending.clear()
+        
+        for topic, messages in by_topic.items():
+            if len(messages) == 1:
+                payload = messages[0].payload
+            else:
+                payload = {"events": [message.payload for message in messages]}
+            self.stats.increment("mqtt_batches")
+            self.stats.increment("mqtt_messages", len(messages))
+            spoolable = any(message.spool for message in messages)
+            if self._send(topic, json.dumps(payload), spoolable):
+                now = time.perf_counter()
+                for message in messages:
+                    self.stats.record("mqtt_publish_latency", now - message.enqueued_at)
+
+    def _send(self, topic: str, payload: str, spoolable: bool = True) -> bool:
+        # Selama spool belum habis, pesan baru ikut masuk spool agar urutan tetap terjaga;
+        # pesan non-spool (ack, status, metrik) tidak bergantung urutan dan tetap dikirim langsung
+        if self._connected.is_set() and (not self._spooled or not spoolable):
+            info = self.client.publish(topic, payload, qos=PublisherConfig.QOS)
+            if info.rc == mqtt.MQTT_ERR_SUCCESS:
+                self._last_info = info
+                return True
+            self._publish_failed(info.rc)
+        if spoolable:
+            self._append_spool(topic, payload)
+        else:
+            self.stats.increment("mqtt_discarded")
+        return False
+
+    def _append_spool(self, topic: str, payload: str) -> None:
+        if self.spool_bytes() >= PublisherConfig.SPOOL_MAX_BYTES:
+            self.stats.increment("mqtt_spool_overflow")
+            return
+        directory = os.path.dirname(PublisherConfig.SPOOL_PATH)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(PublisherConfig.SPOOL_PATH, "a") as spool_file:
+            spool_file.write(json.dumps({"topic": topic, "payload": payload}) + "\n")
+        self._spooled = True
+        self.stats.increment("mqtt_spooled")
+
+    def _publish_failed(self, rc: int) -> None:
+        # Masih terhubung tapi publish ditolak (mis. MQTT_ERR_QUEUE_SIZE): coba lagi dari spool nanti
+        self.stats.increment("mqtt_publish_errors")
+        self._retry_at = time.perf_counter() + PublisherConfig.RETRY_INTERVAL
+
+    def _replay_spool(self) -> None:
+        if self.spool_bytes() == 0:
+            self._spooled = False
+            return
+        if not self._connected.is_set():
+            return
+        with open(PublisherConfig.SPOOL_PATH) as spool_file:
+            lines = spool_file.readlines()
+        
+        sent = 0
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                sent += 1       # baris rusak (misal terpotong saat listrik mati) dilewati
+                continue
+            info = self.client.publish(entry["topic"], entry["payload"], qos=PublisherConfig.QOS)
+            if info.rc != mqtt.MQTT_ERR_SUCCESS:
+                self._publish_failed(info.rc)
+                break
+            self._last_info = info
+            sent += 1
         
-        try:
-            on_time = datetime.strptime(self.schedule_on, "%H:%M").time()
-            off_time = datetime.strptime(self.schedule_off, "%H:%M").time()
-            
-            if on_time < off_time:
-                return on_time <= current_time < off_time
-            else:
-                return current_time >= on_time or current_time < off_time
-                
-        except (ValueError, TypeError):
-            return False
+        remaining = lines[sent:]
+        if remaining:
+            with open(PublisherConfig.SPOOL_PATH, "w") as spool_file:
+                spool_file.writelines(remaining)
+        else:
+            os.remove(PublisherConfig.SPOOL_PATH)
+            self._spooled = False
+        self.stats.increment("mqtt_replayed", sent)
+        if sent:
+            print(f"Replayed {sent} spooled MQTT messages")
 
-    def close(self) -> None:
-        self.instance.close()
+    def close(self, timeout: Optional[float] = None) -> None:
+        timeout = PublisherConfig.FLUSH_TIMEOUT if timeout is None else timeout
+        self._stopping.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout)
+        if self._last_info is not None and self._connected.is_set():
+            try:
+                self._last_info.wait_for_publish(timeout)
+            except (RuntimeError, ValueError):
+                pass
+
+def room_topic(topic: str, room: Optional[str] = None) -> str:
+    return topic if room is None else f"{topic}/{room}"
 
 class MQTTHandler:
-    def __init__(self, devices: Dict[str, SmartDevice]):
-        self.devices = devices
+    def __init__(self, controller: Optional[DeviceController], stats: Optional[StageStats] = None):
+        self.controller = controller
+        self.action_routes: Dict[str, DeviceController] = {}
+        self.settings_routes: Dict[str, DeviceController] = {}
+        self.topic_rooms: Dict[str, Optional[str]] = {}
+        # Menerima (resolved, room, command); consumer memanggil apply_config lalu config_applied di batas frame
+        self.config_listeners: List[Callable[[Tuple[Dict[str, Any], Optional[str], Optional[DeviceCommand]]], None]] = []
+        if controller is not None:
+            self.add_room(None, controller)
         self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
         self.client.username_pw_set(MQTTConfig.USERNAME, MQTTConfig.PASSWORD)
         self.client.on_connect = self._on_connect
+        self.client.on_disconnect = self._on_disconnect
         self.client.on_message = self._on_message
+        self.publisher = MQTTPublisher(self.client, stats)
         self._setup_ssl()
         self._setup_last_will()
 
+    def add_room(self, room: Optional[str], controller: DeviceController) -> None:
+        # Satu koneksi untuk semua ruangan, perintah diarahkan berdasarkan topic per ruangan
+        self.action_routes[room_topic(MQTTConfig.ACTION_TOPIC, room)] = controller
+        self.settings_routes[room_topic(MQTTConfig.SETTINGS_UPDATE_TOPIC, room)] = controller
+        self.topic_rooms[room_topic(MQTTConfig.ACTION_TOPIC, room)] = room
+        self.topic_rooms[room_topic(MQTTConfig.SETTINGS_UPDATE_TOPIC, room)] = room
+
     def _setup_ssl(self) -> None:
         context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH)
         context.check_hostname = False
@@ -282,15 +3261,18 @@ class MQTTHandler:
         if rc == 0:
             print(f"Successfully connected to EMQX Cloud at {MQTTConfig.BROKER}")
             
-            client.subscribe(MQTTConfig.ACTION_TOPIC)
-            print(f"Subscribed to action topic: {MQTTConfig.ACTION_TOPIC}")
+            for topic in self.action_routes:
+                client.subscribe(topic)
+                print(f"Subscribed to action topic: {topic}")
             
-            client.subscribe(MQTTConfig.SETTINGS_UPDATE_TOPIC)
-            print(f"Subscribed to settings topic: {MQTTConfig.SETTINGS_UPDATE_TOPIC}")
+            for topic in self.settings_routes:
+                client.subscribe(topic)
+                print(f"Subscribed to settings topic: {topic}")
 
             status_payload = json.dumps({"status": "online"})
             client.publish(MQTTConfig.STATUS_TOPIC, status_payload)
             print(f"Published ONLINE status to {MQTTConfig.STATUS_TOPIC}")
+            self.publisher.set_connected(True)
         else:
             error_messages = {
                 1: "Incorrect protocol version",
@@ -303,55 +3285,124 @@ class MQTTHandler:
             if rc in error_messages:
                 print(f"Error: {error_messages[rc]}")
 
+    def _on_disconnect(self, client, userdata, flags, rc, properties=None) -> None:
+        self.publisher.set_connected(False)
+        print(f"Disconnected from EMQX Cloud (code {rc}), outgoing messages will be spooled")
+
     def _on_message(self, client, userdata, msg) -> None:
+        received_at = time.perf_counter()
         try:
             payload = json.loads(msg.payload.decode())
+            if not isinstance(payload, dict):
+                raise ValueError("payload must be a JSON object")
             
-            if msg.topic == MQTTConfig.ACTION_TOPIC:
-                self._handle_action_message(payload)
-            elif msg.topic == MQTTConfig.SETTINGS_UPDATE_TOPIC:
-                self._handle_settings_message(payload)
+            room = self.topic_rooms.get(msg.topic)
+            if msg.topic in self.action_routes:
+                self._handle_action_message(payload, self.action_routes[msg.topic], room, received_at)
+            elif msg.topic in self.settings_routes:
+                if "config" in payload:
+                    self._handle_config_update(payload["config"], room, 
+                                               self._command(payload, "config", None, received_at))
+                self._handle_settings_message(payload, self.settings_routes[msg.topic], room, received_at)
                 
-        except json.JSONDecodeError as e:
+        except (json.JSONDecodeError, UnicodeDecodeError, ValueError) as e:
             print(f"Error decoding MQTT message: {e}")
         except Exception as e:
             print(f"Error handling MQTT message: {e}")
 
-    def _handle_action_message(self, payload: Dict[str, Any]) -> None:
-        device_name = payload.get("device")
+    @staticmethod
+    def _command(payload: Dict[str, Any], kind: str, value: Any, received_at: float) -> DeviceCommand:
+        command = DeviceCommand(kind, payload.get("device"), value)      # timestamp diisi clock controller
+        command.command_id = payload.get("id")
+        command.received_at = received_at
+        sent_at = payload.get("timestamp")
+        if isinstance(sent_at, (int, float)) and sent_at > 0:
+            command.sent_at = sent_at / 1000.0 if sent_at > 1e11 else float(sent_at)       # terima detik atau milidetik
+        return command
+
+    def _reject(self, command: DeviceCommand, error: str, room: Optional[str]) -> None:
+        print(f"Rejected {command.kind} command for {command.device}: {error}")
+        self.publish_ack(command, {"status": "rejected", "error": error}, room)
+
+    def _handle_action_message(self, 
+                               payload: Dict[str, Any], 
+                               controller: DeviceController,
+                               room: Optional[str],
+                               received_at: float) -> None:
+        # Callback paho hanya memvalidasi dan meneruskan perintah, perangkat diubah oleh thread actuator
         action = payload.get("action")
+        level = payload.get("level")
+        command = self._command(payload, "action", {"action": action, "level": level}, received_at)
         
-        if device_name in self.devices and action in ["turn_on", "turn_off"]:
-            device = self.devices[device_name]
-            device.set_mode("manual")
-            
-            if action == "turn_on":
-                device.turn_on()
-                print(f"Manual control: {device_name} turned ON")
-            elif action == "turn_off":
-                device.turn_off()
-                print(f"Manual control: {device_name} turned OFF")
-
-    def _handle_settings_message(self, payload: Dict[str, Any]) -> None:
+        if command.device not in controller.devices:
+            self._reject(command, f"unknown device {command.device!r}", room)
+        elif action not in ["turn_on", "turn_off", "set_level"]:
+            self._reject(command, f"unknown action {action!r}", room)
+        elif action == "set_level" and level is None:
+            self._reject(command, "set_level requires a level", room)
+        elif level is not None and (isinstance(level, bool) or not isinstance(level, (int, float)) or
+                                    not 0.0 <= level <= 1.0):
+            self._reject(command, f"level must be a number between 0 and 1, got {level!r}", room)
+        else:
+            controller.dispatch(command)
+
+    def _handle_settings_message(self, 
+                                 payload: Dict[str, Any], 
+                                 controller: DeviceController,
+                                 room: Optional[str],
+                                 received_at: float) -> None:
         device_name = payload.get("device")
+        if device_name is None and "config" in payload:
+            return      # update konfigurasi saja
         
-        if device_name in self.devices:
-            device = self.devices[device_name]
-            
-            if "mode" in payload:
-                new_mode = payload["mode"]
-                device.set_mode(new_mode)
-                print(f"Settings update: {device_name} mode set to {new_mode}")
-            
-            if "schedule_on" in payload and "schedule_off" in payload:
-                device.set_schedule(
-                    payload["schedule_on"], 
-                    payload["schedule_off"]
-                )
-                print(f"Settings update: {device_name} schedule updated")
+        if device_name not in controller.devices:
+            self._reject(self._command(payload, "settings", None, received_at), 
+                         f"unknown device {device_name!r}", room)
+            return
+        
+        if "mode" in payload:
+            command = self._command(payload, "mode", payload["mode"], received_at)
+            if payload["mode"] in ["auto", "manual", "scheduled"]:
+                controller.dispatch(command)
+            else:
+                self._reject(command, f"unknown mode {payload['mode']!r}", room)
+        
+        if "schedule" in payload:
+            controller.dispatch(self._command(payload, "schedule", {"windows": payload["schedule"]}, received_at))
+        elif "schedule_on" in payload and "schedule_off" in payload:
+            controller.dispatch(self._command(payload, "schedule", 
+                                              {"on_time": payload["schedule_on"], 
+                                               "off_time": payload["schedule_off"]}, received_at))
+
+    def _handle_config_update(self, updates: Dict[str, Any], room: Optional[str], 
+                              command: Optional[DeviceCommand] = None) -> None:
+        # Thread paho hanya memvalidasi; nilai diganti oleh thread vision di antara dua frame,
+        # jadi update multi-field tidak pernah terlihat setengah jadi dan resize buffer tidak balapan dengan tracker
+        try:
+            resolved = validate_config(updates, HOT_RELOAD_FIELDS)
+        except ConfigError as e:
+            print(f"Rejected config update: {e}")
+            self.publish_settings_error("system", "config", str(e), room)
+            if command is not None:
+                self.publish_ack(command, {"status": "rejected", "error": str(e)}, room)
+            return
+        if not self.config_listeners:
+            apply_config(resolved)      # belum ada consumer (mis. saat startup), tidak ada frame yang berjalan
+            self.config_applied(resolved, room, command)
+            return
+        for listener in self.config_listeners:
+            listener((resolved, room, command))
+
+    def config_applied(self, resolved: Dict[str, Any], room: Optional[str] = None, 
+                       command: Optional[DeviceCommand] = None) -> None:
+        print(f"Applied config update: {resolved}")
+        self.publish_sensor_data("system", {"config": resolved}, room)
+        if command is not None:
+            self.publish_ack(command, {"status": "applied"}, room)
 
     def connect(self) -> bool:
         try:
+            self.publisher.start()
             self.client.connect(MQTTConfig.BROKER, MQTTConfig.PORT, 60)
             self.client.loop_start()
             print("Connecting to EMQX Cloud...")
@@ -360,122 +3411,471 @@ class MQTTHandler:
             print(f"Error connecting to EMQX Cloud: {e}")
             return False
 
-    def publish_sensor_data(self, device_name: str, data: Dict[str, Any]) -> None:
-        payload = json.dumps({"device": device_name, **data})
-        self.client.publish(MQTTConfig.SENSOR_TOPIC, payload)
+    def publish_sensor_data(self, device_name: str, data: Dict[str, Any], 
+                            room: Optional[str] = None, timestamp: Optional[float] = None) -> None:
+        payload = {"device": device_name, "timestamp": timestamp or time.time(), **data}
+        # Hanya event yang sama persis (mis. motion_detected berulang) yang redundan; detected lalu cleared tetap dikirim dua-duanya
+        self.publisher.publish(room_topic(MQTTConfig.SENSOR_TOPIC, room), payload, 
+                               coalesce_key=("sensor", room, device_name, json.dumps(data, sort_keys=True, default=str)))
+
+    def publish_settings_error(self, device_name: str, setting: str, error: str, room: Optional[str] = None) -> None:
+        payload = {"device": device_name, "timestamp": time.time(), "setting": setting, "error": error}
+        self.publisher.publish(room_topic(MQTTConfig.SENSOR_TOPIC, room), payload, immediate=True)
 
     def publish_status(self, status: str) -> None:
-        payload = json.dumps({"status": status})
-        self.client.publish(MQTTConfig.STATUS_TOPIC, payload)
+        self.publisher.publish(MQTTConfig.STATUS_TOPIC, {"status": status}, 
+                               coalesce_key=("status",), immediate=True, spool=False)
+
+    def publish_ack(self, command: DeviceCommand, data: Dict[str, Any], room: Optional[str] = None) -> None:
+        # Latency perangkat: pesan diterima -> perintah diterapkan ke GPIO; end-to-end butuh jam aplikasi tersinkron
+        now = time.time()
+        payload = {"id": command.command_id, "device": command.device, "command": command.kind, 
+                   "timestamp": now, **data}
+        if command.received_at is not None:
+            payload["latency_ms"] = round((time.perf_counter() - command.received_at) * 1000.0, 2)
+        if command.sent_at is not None:
+            payload["end_to_end_ms"] = round((now - command.sent_at) * 1000.0, 2)
+        self.publisher.publish(room_topic(MQTTConfig.ACK_TOPIC, room), payload, immediate=True, spool=False)
+
+    def publish_rollups(self, rows: List[Dict[str, Any]]) -> None:
+        # Rollup per jam dari event store, di-spool saat offline agar tidak ada jam yang hilang
+        self.publisher.publish(MQTTConfig.SENSOR_TOPIC + "/rollups", {"timestamp": time.time(), "rollups": rows})
+
+    def publish_metrics(self, summary: Dict[str, Any], room: Optional[str] = None) -> None:
+        payload = {"timestamp": time.time(), **summary}
+        self.publisher.publish(room_topic(MQTTConfig.STATUS_TOPIC + "/metrics", room), payload, 
+                               coalesce_key=("metrics", room), spool=False)
 
     def disconnect(self) -> None:
         self.publish_status("offline")
-        time.sleep(0.5)
+        self.publisher.close()      # kirim sisa antrian lalu tunggu ack, tanpa sleep tetap
         self.client.loop_stop()
         self.client.disconnect()
 
-class SmartMotionDetectionSystem:
-    def __init__(self):
-        self.motion_tracker = MotionTracker()
-        self.consecutive_detections = 0
-        self.fps_buffer = []
+class RoomMQTTChannel:
+    def __init__(self, handler: MQTTHandler, room: str):
+        self.handler = handler
+        self.room = room
 
-        self.devices = {
-            "lamp": SmartDevice("lamp", DeviceConfig.LAMP_PIN),
-            "fan": SmartDevice("fan", DeviceConfig.FAN_PIN)
-        }
-        
-        self.mqtt_handler = MQTTHandler(self.devices)
+    def connect(self) -> bool:
+        return True     # koneksi bersama dibuka oleh FleetMotionDetectionSystem
+
+    def publish_sensor_data(self, device_name: str, data: Dict[str, Any], timestamp: Optional[float] = None) -> None:
+        self.handler.publish_sensor_data(device_name, data, self.room, timestamp)
+
+    def publish_settings_error(self, device_name: str, setting: str, error: str) -> None:
+        self.handler.publish_settings_error(device_name, setting, error, self.room)
+
+    def publish_status(self, status: str) -> None:
+        self.handler.publish_status(status)
+
+    def publish_metrics(self, summary: Dict[str, Any]) -> None:
+        self.handler.publish_metrics(summary, self.room)
+
+    def publish_ack(self, command: DeviceCommand, data: Dict[str, Any]) -> None:
+        self.handler.publish_ack(command, data, self.room)
+
+    def disconnect(self) -> None:
+        pass
+
+class FrameSource(ABC):
+    live = True         # False = file video, EOF berarti selesai (bukan kamera putus)
+
+    def __init__(self, source: str):
+        self.source = source
+        self._lock = threading.Lock()
+        # Frame di-decode bergiliran ke buffer yang sama, tanpa alokasi baru per frame
+        self._buffers: List[Optional[np.ndarray]] = [None] * max(1, CameraConfig.FRAME_BUFFERS)
+        self._next_buffer = 0
+
+    def _take_buffer(self) -> Tuple[int, Optional[np.ndarray]]:
+        index = self._next_buffer
+        return index, self._buffers[index]
+
+    def _commit_buffer(self, index: int, frame: np.ndarray) -> None:
+        self._buffers[index] = frame      # cv2 hanya mengalokasi ulang jika ukuran frame berubah
+        self._next_buffer = (index + 1) % len(self._buffers)
+
+    @abstractmethod
+    def open(self) -> bool:
+        ...
+
+    @abstractmethod
+    def read(self) -> Tuple[bool, Optional[np.ndarray]]:
+        ...
+
+    @abstractmethod
+    def isOpened(self) -> bool:
+        ...
+
+    @abstractmethod
+    def release(self) -> None:
+        ...
+
+    def apply_resolution(self) -> None:
+        pass
+
+    def reconnect(self) -> bool:
+        self.release()
+        return self.open()
+
+class CaptureSource(FrameSource):
+    def __init__(self, source: str):
+        super().__init__(source)
+        self._capture: Any = None
+
+    def _retrieve(self) -> Tuple[bool, Optional[np.ndarray]]:
+        index, buffer = self._take_buffer()
+        ok, frame = self._capture.retrieve(buffer)
+        if not ok:
+            return False, None
+        self._commit_buffer(index, frame)
+        return True, frame
+
+    def _hw_decode_params(self) -> List[int]:
+        if CameraConfig.HW_DECODE and hasattr(cv2, "CAP_PROP_HW_ACCELERATION"):
+            return [cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY]
+        return []
+
+    def isOpened(self) -> bool:
+        return self._capture is not None and self._capture.isOpened()
+
+    def set(self, prop: int, value: float) -> bool:
+        with self._lock:
+            return self._capture.set(prop, value)
+
+    def get(self, prop: int) -> float:
+        return self._capture.get(prop)
+
+    def release(self) -> None:
+        if self._capture is not None:
+            with self._lock:
+                self._capture.release()
+
+class V4L2Camera(CaptureSource):
+    def __init__(self, index: int):
+        super().__init__(f"usb{index}")
+        self.index = index
+        self._frame_period = 1.0 / CameraConfig.FPS
+
+    def open(self) -> bool:
+        self._capture = cv2.VideoCapture(self.index, cv2.CAP_V4L2)
+        if not self._capture.isOpened():
+            return False
+        # FOURCC harus diset sebelum resolusi agar driver memilih mode yang benar
+        self._capture.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*CameraConfig.FOURCC))
+        self._capture.set(cv2.CAP_PROP_FRAME_WIDTH, CameraConfig.RESOLUTION_WIDTH)
+        self._capture.set(cv2.CAP_PROP_FRAME_HEIGHT, CameraConfig.RESOLUTION_HEIGHT)
+        self._capture.set(cv2.CAP_PROP_FPS, CameraConfig.FPS)
+        self._capture.set(cv2.CAP_PROP_BUFFERSIZE, CameraConfig.DRIVER_BUFFERS)
         
-        self._initialize_camera()
-        self._initialize_model()
+        fps = self._capture.get(cv2.CAP_PROP_FPS) or CameraConfig.FPS
+        self._frame_period = 1.0 / fps
+        fourcc = int(self._capture.get(cv2.CAP_PROP_FOURCC)).to_bytes(4, "little").decode(errors="replace")
+        print(f"Camera {self.source}: {int(self._capture.get(cv2.CAP_PROP_FRAME_WIDTH))}x"
+              f"{int(self._capture.get(cv2.CAP_PROP_FRAME_HEIGHT))} @ {fps:.0f} fps, {fourcc}, "
+              f"{CameraConfig.DRIVER_BUFFERS} driver buffer(s)")
+        return True
 
-    def _initialize_camera(self) -> None:
-        if "usb" in CameraConfig.SOURCE:
-            camera_index = int(CameraConfig.SOURCE[3:])
-            self.camera = cv2.VideoCapture(camera_index)
-            self.camera.set(cv2.CAP_PROP_FRAME_WIDTH, CameraConfig.RESOLUTION_WIDTH)
-            self.camera.set(cv2.CAP_PROP_FRAME_HEIGHT, CameraConfig.RESOLUTION_HEIGHT)
+    def read(self) -> Tuple[bool, Optional[np.ndarray]]:
+        with self._lock:
+            # grab() yang kembali jauh lebih cepat dari periode frame = frame lama dari antrian driver, buang
+            for _ in range(CameraConfig.DRIVER_BUFFERS + 1):
+                start_time = time.perf_counter()
+                if not self._capture.grab():
+                    return False, None
+                if time.perf_counter() - start_time > self._frame_period / 2:
+                    break
+            return self._retrieve()
+
+    def apply_resolution(self) -> None:
+        self.set(cv2.CAP_PROP_FRAME_WIDTH, CameraConfig.RESOLUTION_WIDTH)
+        self.set(cv2.CAP_PROP_FRAME_HEIGHT, CameraConfig.RESOLUTION_HEIGHT)
+
+class StreamCamera(CaptureSource):
+    def __init__(self, url: str):
+        super().__init__(url)
+        self._grabbed = threading.Condition()
+        self._latest: Optional[np.ndarray] = None
+        self._grab_count = 0
+        self._read_count = 0
+        self._running = False
+        self._grabber: Optional[threading.Thread] = None
+
+    def open(self) -> bool:
+        self._capture = cv2.VideoCapture(self.source, cv2.CAP_FFMPEG, self._hw_decode_params())
+        if not self._capture.isOpened():
+            return False
+        self._running = True
+        self._grabber = threading.Thread(target=self._grab_loop, name=f"grab-{self.source}", daemon=True)
+        self._grabber.start()
+        return True
+
+    def _grab_loop(self) -> None:
+        # Buffer jaringan tidak bisa dibatasi seperti CAP_PROP_BUFFERSIZE, jadi stream terus dibaca 
+        # (bergantian ke dua buffer) dan read() hanya mengambil frame terakhir
+        frames: List[Optional[np.ndarray]] = [None, None]
+        slot = 0
+        while self._running:
+            ok, frame = self._capture.read(frames[slot])
+            with self._grabbed:
+                if not ok:
+                    self._running = False
+                else:
+                    frames[slot] = frame
+                    self._latest = frame
+                    self._grab_count += 1
+                self._grabbed.notify_all()
+            slot ^= 1
+
+    def read(self) -> Tuple[bool, Optional[np.ndarray]]:
+        with self._grabbed:
+            self._grabbed.wait_for(lambda: self._grab_count > self._read_count or not self._running, 
+                                   timeout=CameraConfig.READ_TIMEOUT)
+            if self._grab_count == self._read_count:
+                return False, None
+            self._read_count = self._grab_count
+            index, buffer = self._take_buffer()
+            if buffer is None or buffer.shape != self._latest.shape:
+                buffer = np.empty_like(self._latest)
+            np.copyto(buffer, self._latest)
+        self._commit_buffer(index, buffer)
+        return True, buffer
+
+    def set(self, prop: int, value: float) -> bool:
+        return False        # resolusi stream ditentukan oleh sumbernya
+
+    def release(self) -> None:
+        self._running = False
+        if self._grabber is not None:
+            self._grabber.join(timeout=CameraConfig.READ_TIMEOUT)
+            self._grabber = None
+        super().release()
+
+class FileSource(CaptureSource):
+    live = False
+
+    def open(self) -> bool:
+        self._capture = cv2.VideoCapture(self.source, cv2.CAP_ANY, self._hw_decode_params())
+        return self._capture.isOpened()
+
+    def read(self) -> Tuple[bool, Optional[np.ndarray]]:
+        with self._lock:
+            if not self._capture.grab():
+                return False, None
+            return self._retrieve()
+
+class Picamera2Camera(FrameSource):
+    def __init__(self, index: int):
+        super().__init__(f"picam{index}")
+        self.index = index
+        self._camera: Any = None
+
+    def _configure(self) -> None:
+        # RGB888 di libcamera = urutan byte BGR, langsung cocok dengan OpenCV
+        self._camera.configure(self._camera.create_video_configuration(
+            main={"size": (CameraConfig.RESOLUTION_WIDTH, CameraConfig.RESOLUTION_HEIGHT), "format": "RGB888"},
+            buffer_count=CameraConfig.DRIVER_BUFFERS + 1,
+            controls={"FrameRate": float(CameraConfig.FPS)}))
+
+    def open(self) -> bool:
+        try:
+            from picamera2 import Picamera2
+            self._camera = Picamera2(self.index)
+            self._configure()
+            self._camera.start()
+            return True
+        except Exception as e:
+            print(f"Failed to open {self.source}: {e}")
+            self._camera = None
+            return False
+
+    def read(self) -> Tuple[bool, Optional[np.ndarray]]:
+        from picamera2 import MappedArray
+        with self._lock:
+            try:
+                request = self._camera.capture_request()
+            except Exception as e:
+                print(f"Camera {self.source} read failed: {e}")
+                return False, None
+            try:
+                with MappedArray(request, "main") as mapped:
+                    width = self._camera.camera_config["main"]["size"][0]
+                    image = mapped.array[:, :width, :3]     # buang padding stride
+                    index, buffer = self._take_buffer()
+                    if buffer is None or buffer.shape != image.shape:
+                        buffer = np.empty(image.shape, dtype=np.uint8)
+                    np.copyto(buffer, image)
+            finally:
+                request.release()       # buffer libcamera dikembalikan secepatnya
+            self._commit_buffer(index, buffer)
+            return True, buffer
+
+    def isOpened(self) -> bool:
+        return self._camera is not None
+
+    def release(self) -> None:
+        with self._lock:
+            if self._camera is not None:
+                self._camera.close()
+                self._camera = None
+
+    def apply_resolution(self) -> None:
+        with self._lock:
+            self._camera.stop()
+            self._configure()
+            self._camera.start()
+
+def open_camera(source: str) -> FrameSource:
+    if source.startswith("usb"):
+        camera: FrameSource = V4L2Camera(int(source[3:]))
+    elif source.startswith("picam"):
+        camera = Picamera2Camera(int(source[5:] or 0))
+    elif "://" in source:
+        camera = StreamCamera(source)          # stream RTSP/HTTP
+    elif os.path.isfile(source):
+        camera = FileSource(source)
+    else:
+        raise ValueError(f"Invalid camera source configuration: {source}")
+    
+    if not camera.open():
+        raise RuntimeError(f"Failed to open camera {source}")
+    return camera
+
+class SmartMotionDetectionSystem:
+    def __init__(self, 
+                 camera: Any = None, 
+                 pose_backend: Any = None, 
+                 mqtt_handler: Any = None,
+                 clock: Callable[[], float] = time.time,
+                 device_controller: Optional[DeviceController] = None,
+                 name: Optional[str] = None,
+                 event_store: Optional[EventStore] = None):
+        self.clock = clock      # bisa diganti dengan waktu rekaman saat replay/benchmark
+        self.name = name        # nama ruangan saat berjalan dalam fleet mode
+        self.window_name = "Smart Motion Detection System" + (f" - {name}" if name else "")
+        self.motion_tracker = MultiPersonTracker()
+        self.presence_time = 0.0       # waktu orang terdeteksi (detik), dibatasi PRESENCE_SATURATION
+        self._last_presence_update: Optional[float] = None
+        self.fps_buffer: deque = deque(maxlen=CameraConfig.FPS_BUFFER_SIZE)
+        self._fps_sum = 0.0
+        self.average_fps = 0.0
+        self.stage_stats = StageStats()
+        self.metrics = MetricsRegistry()
+        self.metrics.add_stats(self.stage_stats, {"room": name} if name else None)
+        self.metrics_server: Optional[MetricsServer] = None
+        self.profiler: Optional[SamplingProfiler] = None
+        self._last_metrics_publish = time.perf_counter()
+        self._motion_triggered = False
+        self.config_updates: queue.Queue = queue.Queue()
+        self.inference_scheduler = InferenceScheduler(self.stage_stats)
+        self.roi_planner = RegionOfInterestPlanner(self.stage_stats)
+        self.stop_event = threading.Event()
+        self.preview_server: Optional[MJPEGPreviewServer] = None
+        self.preview_factor = 1        # pengali PREVIEW_EVERY_N dari QualityGovernor, 0 = preview mati
+        self.governor: Optional[QualityGovernor] = None
+        self._frame_counter = 0
+        self._last_stats_report = time.perf_counter()
+        self.startup_timer = StartupTimer()
+        self.mqtt_connected = False
+        self._first_frame_reported = False
+        self.trace_writer: Optional[KeypointTraceWriter] = None
+        self.inference_pool: Optional[InferenceWorkerPool] = None
+        if RecorderConfig.ENABLED:
+            trace_path = RecorderConfig.PATH
+            if name:
+                root, extension = os.path.splitext(trace_path)
+                trace_path = f"{root}_{name}{extension}"
+            self.trace_writer = KeypointTraceWriter(trace_path)
+            print(f"Recording keypoint trace to {trace_path}")
+
+        # Model (import + load + warm-up) dimuat paralel dengan kamera dan koneksi MQTT
+        self.camera = camera
+        self.pose_backend = pose_backend
+        with ThreadPoolExecutor(max_workers=3, thread_name_prefix="startup") as executor:
+            if pose_backend is None:
+                initialize = self._initialize_inference_pool if InferencePoolConfig.ENABLED else self._initialize_model
+                model_future = executor.submit(self.startup_timer.measure, "model", initialize)
+            if camera is None:
+                camera_future = executor.submit(self.startup_timer.measure, "camera", self._initialize_camera)
             
-            if not self.camera.isOpened():
-                raise RuntimeError("Failed to open camera")
-        else:
-            raise ValueError("Invalid camera source configuration")
+            if device_controller is None:
+                device_controller = DeviceController(self.startup_timer.measure("devices", lambda: {
+                    "lamp": SmartDevice("lamp", DeviceConfig.LAMP_PIN, "lamp" in DeviceConfig.PWM_DEVICES),
+                    "fan": SmartDevice("fan", DeviceConfig.FAN_PIN, "fan" in DeviceConfig.PWM_DEVICES)
+                }), self.clock)
+            self.device_controller = device_controller
+            self.devices = device_controller.devices
+            if mqtt_handler is None:
+                self.mqtt_handler = self.startup_timer.measure("mqtt_setup", MQTTHandler, self.device_controller, self.stage_stats)
+                mqtt_future = executor.submit(self.startup_timer.measure, "mqtt_connect", self.mqtt_handler.connect)
+                self.mqtt_connected = mqtt_future.result()
+            else:
+                self.mqtt_handler = mqtt_handler
+            
+            if camera is None:
+                camera_future.result()
+            if pose_backend is None:
+                model_future.result()
+        self.event_store = event_store
+        self._owns_event_store = event_store is None and EventStoreConfig.ENABLED      # fleet memakai satu store bersama
+        if self._owns_event_store:
+            self.event_store = EventStore(clock=self.clock, stats=self.stage_stats)
+            self.event_store.sync_publisher = getattr(self.mqtt_handler, "publish_rollups", None)
+        self.device_controller.start(self.mqtt_handler, self.stage_stats, self.event_store, name)
+        if hasattr(self.mqtt_handler, "config_listeners"):
+            self.mqtt_handler.config_listeners.append(self.config_updates.put)
+        self._register_gauges()
+        self.startup_timer.mark("ready")
+
+    def _initialize_camera(self) -> None:
+        self.camera = open_camera(CameraConfig.SOURCE)
+
+    def _register_gauges(self) -> None:
+        labels = {"room": self.name} if self.name else None
+        self.metrics.add_gauge("fps", lambda: self.average_fps, labels)
+        self.metrics.add_gauge("actuation_queue_depth", self.device_controller.queue_depth, labels)
+        publisher = getattr(self.mqtt_handler, "publisher", None)
+        if publisher is not None:
+            self.metrics.add_gauge("mqtt_queue_depth", publisher.queue_depth)
+            self.metrics.add_gauge("mqtt_spool_bytes", publisher.spool_bytes)
 
     def _initialize_model(self) -> None:
         try:
-            self.pose_model = YOLO("yolo11n-pose_ncnn_model", task="pose")
-            print("YOLO pose model loaded successfully")
+            self.pose_backend = self.startup_timer.measure("model_load", create_pose_backend)
+            self.startup_timer.measure("model_warmup", self.pose_backend.warmup)
+            print(f"YOLO pose model loaded successfully ({self.pose_backend.name} backend)")
         except Exception as e:
             raise RuntimeError(f"Failed to load YOLO model: {e}")
 
-    def _update_consecutive_detections(self, pose_found: bool) -> None:
+    def _initialize_inference_pool(self) -> None:
+        self.inference_pool = InferenceWorkerPool(stats=self.stage_stats)
+        self.inference_pool.start()
+        self.pose_backend = self.inference_pool
+
+    def _update_presence_time(self, pose_found: bool, current_time: float) -> None:
+        # Akumulasi waktu (bukan jumlah frame): naik selama orang terlihat, turun dengan laju sama saat hilang
+        elapsed = 0.0
+        if self._last_presence_update is not None:
+            elapsed = min(max(current_time - self._last_presence_update, 0.0), MotionDetectionConfig.MAX_PAIR_GAP)
+        self._last_presence_update = current_time
         if pose_found:
-            self.consecutive_detections = min(
-                self.consecutive_detections + 1, 
-                15
-            )
+            self.presence_time = min(self.presence_time + elapsed, MotionDetectionConfig.PRESENCE_SATURATION)
         else:
-            self.consecutive_detections = max(
-                self.consecutive_detections - 1, 
-                0
-            )
+            self.presence_time = max(self.presence_time - elapsed, 0.0)
 
     def _should_devices_be_active(self) -> bool:
         if MotionDetectionConfig.ENABLED:
-            return (self.consecutive_detections >= MotionDetectionConfig.STABLE_DETECTION_FRAMES and 
+            return (self.presence_time >= MotionDetectionConfig.STABLE_DETECTION_TIME and 
                     self.motion_tracker.motion_triggered and
-                    self.motion_tracker.stable_pose_count >= 5)
+                    self.motion_tracker.stable_pose_time >= MotionDetectionConfig.STABLE_POSE_TIME)
         else:
-            return self.consecutive_detections >= MotionDetectionConfig.STABLE_DETECTION_FRAMES
+            return self.presence_time >= MotionDetectionConfig.STABLE_DETECTION_TIME
 
     def _should_devices_be_inactive(self) -> bool:
-        return (self.consecutive_detections <= 0 or 
+        return (self.presence_time <= 0 or 
                 not self.motion_tracker.person_detected)
 
-    def _control_devices_auto_mode(self, should_be_active: bool, should_be_inactive: bool) -> None:
-        current_time = time.time()
-        
-        for device_name, device in self.devices.items():
-            if device.mode != "auto":
-                continue
-                
-            if should_be_active and device.state == 0:
-                device.turn_on()
-                device.no_motion_start_time = None
-                print(f"Auto control: {device_name} turned ON (motion detected)")
-            
-            elif should_be_inactive and device.state == 1:
-                if device.no_motion_start_time is None:
-                    device.no_motion_start_time = current_time
-                elif current_time - device.no_motion_start_time >= MotionDetectionConfig.AUTO_OFF_DELAY:
-                    device.turn_off()
-                    device.no_motion_start_time = None
-                    print(f"Auto control: {device_name} turned OFF (no motion)")
-
-            if should_be_active and not device.is_person_reported:
-                device.is_person_reported = True
-                self.mqtt_handler.publish_sensor_data(device_name, {"motion_detected": True})
-            elif should_be_inactive and device.is_person_reported:
-                device.is_person_reported = False
-                self.mqtt_handler.publish_sensor_data(device_name, {"motion_cleared": True})
-
-    def _control_devices_scheduled_mode(self) -> None:
-        current_time = datetime.now().time()
-        
-        for device_name, device in self.devices.items():
-            if device.mode != "scheduled":
-                continue
-                
-            is_active_time = device.is_scheduled_active(current_time)
-            
-            if is_active_time and device.state == 0:
-                device.turn_on()
-                print(f"Scheduled control: {device_name} turned ON")
-            elif not is_active_time and device.state == 1:
-                device.turn_off()
-                print(f"Scheduled control: {device_name} turned OFF")
-
     def _draw_device_status(self, frame: np.ndarray) -> None:
         y_position = 30
         
@@ -494,61 +3894,422 @@ class SmartMotionDetectionSystem:
                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, status_color, 2)
             y_position += 40
 
-    def _calculate_and_display_fps(self, frame: np.ndarray, processing_time: float) -> None:
+    def _update_fps(self, processing_time: float) -> None:
+        # Jumlah berjalan: O(1) per frame, tidak perlu np.mean di seluruh buffer
         if processing_time > 0:
             current_fps = 1 / processing_time
+            if len(self.fps_buffer) == self.fps_buffer.maxlen:
+                self._fps_sum -= self.fps_buffer[0]
             self.fps_buffer.append(current_fps)
-            
-            if len(self.fps_buffer) > CameraConfig.FPS_BUFFER_SIZE:
-                self.fps_buffer.pop(0)
-            
-            average_fps = np.mean(self.fps_buffer)
-            cv2.putText(frame, f'FPS: {average_fps:.2f}', 
+            self._fps_sum += current_fps
+            self.average_fps = self._fps_sum / len(self.fps_buffer)
+
+    def _calculate_and_display_fps(self, frame: np.ndarray, processing_time: float) -> None:
+        if self.fps_buffer:
+            cv2.putText(frame, f'FPS: {self.average_fps:.2f}', 
                        (CameraConfig.RESOLUTION_WIDTH - 150, 30), 
                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 0), 2)
 
-    def run(self) -> None:
-        if not self.mqtt_handler.connect():
-            print("Failed to connect to MQTT broker. Exiting...")
-            return
+    def _capture_frame(self) -> Tuple[bool, Optional[np.ndarray]]:
+        start_time = time.perf_counter()
+        ret, frame = self.camera.read()
+        if not ret and getattr(self.camera, "live", False) and not self.stop_event.is_set():
+            return self._reconnect_camera()
+        self.stage_stats.record("capture", time.perf_counter() - start_time)
+        return ret, frame
 
-        print("Smart Motion Detection System started successfully!")
-        print("Press 'q' to quit")
+    def _reconnect_camera(self) -> Tuple[bool, Optional[np.ndarray]]:
+        # Kamera/stream putus: coba buka ulang dengan backoff sampai berhasil atau sistem dihentikan
+        print(f"Camera {self.camera.source} disconnected, reconnecting...")
+        self.mqtt_handler.publish_sensor_data("camera", {"status": "disconnected"})
+        disconnected_at = time.perf_counter()
+        delay = CameraConfig.RECONNECT_DELAY
+        while not self.stop_event.wait(delay):
+            self.stage_stats.increment("camera_reconnect_attempts")
+            if self.camera.reconnect():
+                ret, frame = self.camera.read()
+                if ret:
+                    downtime = time.perf_counter() - disconnected_at
+                    self.stage_stats.increment("camera_reconnects")
+                    print(f"Camera {self.camera.source} reconnected after {downtime:.1f}s")
+                    self.mqtt_handler.publish_sensor_data("camera", {"status": "connected", "downtime": round(downtime, 1)})
+                    return ret, frame
+            delay = min(delay * 2, CameraConfig.RECONNECT_MAX_DELAY)
+        return False, None
+
+    def _crop_for_inference(self, frame: np.ndarray, 
+                            imgsz: Optional[int]) -> Tuple[np.ndarray, Optional[int], Optional[Tuple[int, int]]]:
+        roi, imgsz = self.roi_planner.plan(frame.shape, time.perf_counter(), imgsz)
+        if roi is None:
+            return frame, imgsz, None
+        left, top, right, bottom = roi
+        return frame[top:bottom, left:right], imgsz, (left, top)
+
+    def _restore_roi(self, detections: PoseDetections, origin: Optional[Tuple[int, int]]) -> PoseDetections:
+        if origin is not None:
+            detections = detections.translate(*origin)      # kembali ke koordinat frame untuk tracker
+        self.roi_planner.report(detections, origin is not None)
+        return detections
+
+    def _run_inference(self, frame: np.ndarray, imgsz: Optional[int] = None) -> PoseDetections:
+        start_time = time.perf_counter()
+        region, imgsz, origin = self._crop_for_inference(frame, imgsz)
+        detections = self._restore_roi(self.pose_backend.predict(region, imgsz), origin)
+        self.stage_stats.record("inference", time.perf_counter() - start_time)
+        return detections
+
+    def _run_scheduled_inference(self, frame: np.ndarray) -> Optional[PoseDetections]:
+        now = time.perf_counter()
+        should_infer, imgsz = self.inference_scheduler.plan(frame, now)
+        if not should_infer:
+            return None
+        
+        detections = self._run_inference(frame, imgsz)
+        self.inference_scheduler.report_result(len(detections) > 0, time.perf_counter())
+        return detections
+
+    def _process_detections(self, frame: np.ndarray, detections: Optional[PoseDetections], capture_time: float) -> None:
+        start_time = time.perf_counter()
+        if detections is not None:     # None = inferensi dilewati, state tracker dipertahankan
+            if self.trace_writer is not None:
+                self.trace_writer.append(self.clock(), detections)
+            pose_found = len(detections) > 0
+            keypoints = detections.keypoints if pose_found else None
+            boxes = detections.boxes if pose_found else None
+            
+            now = self.clock()
+            self.motion_tracker.update_motion_detection(keypoints, boxes, now)
+            self._update_presence_time(pose_found, now)
+            if self.motion_tracker.motion_triggered and not self._motion_triggered:
+                self.stage_stats.increment("motion_triggers")
+            self._motion_triggered = self.motion_tracker.motion_triggered
+        tracking_done = time.perf_counter()
+        self.stage_stats.record("tracking", tracking_done - start_time)
+        
+        # Hanya perubahan presence yang dikirim ke actuator, timer auto-off dan jadwal berjalan di sana
+        self.device_controller.update_presence(self._should_devices_be_active(), 
+                                               self._should_devices_be_inactive())
+        control_done = time.perf_counter()
+        self.stage_stats.record("control", control_done - tracking_done)
+        self.stage_stats.record("capture_to_actuation", control_done - capture_time)
+        self.stage_stats.mark_processed()
+        
+        if not self._first_frame_reported:
+            self._first_frame_reported = True
+            self.startup_timer.mark("first_actuation")
+            print(self.startup_timer.report())
+
+    def _render_frame(self, frame: np.ndarray, detections: Optional[PoseDetections], processing_time: float) -> np.ndarray:
+        start_time = time.perf_counter()
+        annotated_frame = detections.plot(frame) if detections is not None else frame.copy()
+        self._draw_device_status(annotated_frame)
+        self._calculate_and_display_fps(annotated_frame, processing_time)
+        self.stage_stats.record("render", time.perf_counter() - start_time)
+        return annotated_frame
+
+    def _present_frame(self, frame: np.ndarray, detections: Optional[PoseDetections], processing_time: float) -> bool:
+        self._frame_counter += 1
+        self._update_fps(processing_time)
+        annotated_frame = None
+        
+        if not DisplayConfig.HEADLESS:
+            annotated_frame = self._render_frame(frame, detections, processing_time)
+            cv2.imshow(self.window_name, annotated_frame)
+            
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                print("Quit command received")
+                return False
         
+        if (self.preview_server is not None and 
+            self.preview_factor > 0 and 
+            self.preview_server.has_viewers() and 
+            self._frame_counter % max(1, DisplayConfig.PREVIEW_EVERY_N * self.preview_factor) == 0):
+            if annotated_frame is None:
+                annotated_frame = self._render_frame(frame, detections, processing_time)
+            ok, jpeg = cv2.imencode(".jpg", annotated_frame, 
+                                    [cv2.IMWRITE_JPEG_QUALITY, DisplayConfig.PREVIEW_JPEG_QUALITY])
+            if ok:
+                self.preview_server.publish(jpeg.tobytes())
+        
+        return not self.stop_event.is_set()
+
+    def _request_stop(self, signum: int, frame: Any) -> None:
+        print(f"\nSignal {signal.Signals(signum).name} received, stopping...")
+        self.stop_event.set()
+
+    def _install_signal_handlers(self) -> None:
+        if threading.current_thread() is not threading.main_thread():
+            return
+        signal.signal(signal.SIGTERM, self._request_stop)
+        if DisplayConfig.HEADLESS:
+            signal.signal(signal.SIGINT, self._request_stop)
+        if self.profiler is not None and hasattr(signal, "SIGUSR1"):
+            signal.signal(signal.SIGUSR1, lambda signum, frame: self.profiler.toggle())
+
+    def _start_metrics(self) -> None:
+        self.profiler = SamplingProfiler()
+        if MetricsConfig.PROFILER_ENABLED:
+            self.profiler.toggle()
+        if not MetricsConfig.ENABLED:
+            return
+        self.metrics.add_system_gauges()
         try:
-            while True:
-                start_time = time.perf_counter()
-                
-                ret, frame = self.camera.read()
-                if not ret:
-                    print("Failed to capture frame")
-                    break
+            self.metrics_server = MetricsServer(MetricsConfig.HOST, MetricsConfig.PORT, self.metrics, self.profiler, 
+                                                self.event_store)
+            self.metrics_server.start()
+        except OSError as e:
+            self.metrics_server = None
+            print(f"Metrics server disabled: {e}")
 
-                results = self.pose_model.predict(frame, verbose=False)
-                annotated_frame = results[0].plot()
-                
-                pose_found = len(results) > 0 and len(results[0].keypoints) > 0
-                keypoints = results[0].keypoints.data.cpu().numpy() if pose_found else None
+    def _start_preview(self) -> None:
+        if not DisplayConfig.PREVIEW_ENABLED:
+            return
+        try:
+            self.preview_server = MJPEGPreviewServer(DisplayConfig.PREVIEW_HOST, DisplayConfig.PREVIEW_PORT)
+            self.preview_server.start()
+        except OSError as e:
+            self.preview_server = None
+            print(f"Preview server disabled: {e}")
+
+    def _start_governor(self) -> None:
+        if not GovernorConfig.ENABLED:
+            return
+        parallelism = InferencePoolConfig.WORKERS if self.inference_pool is not None else 1
+        self.governor = QualityGovernor(self.stage_stats, self._apply_quality, clock=self.clock, 
+                                        parallelism=parallelism, event_store=self.event_store)
+        self.governor.register_gauges(self.metrics)
+
+    def _apply_quality(self, settings: Dict[str, Any]) -> None:
+        self.inference_scheduler.max_imgsz = settings["imgsz"]
+        self.inference_scheduler.min_interval = 1.0 / settings["max_rate"] if settings["max_rate"] > 0 else 0.0
+        self.preview_factor = settings["preview"]
+        # Worker pool memakai THREADS_PER_WORKER sendiri; backend ncnn bisa diubah tanpa memuat ulang model
+        set_num_threads = getattr(self.pose_backend, "set_num_threads", None)
+        if set_num_threads is not None:
+            set_num_threads(settings["threads"])
+
+    @staticmethod
+    def _check_roi_backend() -> None:
+        # Graph ncnn hasil export memakai input tetap: crop ROI di-letterbox lagi ke ukuran penuh
+        if ROIConfig.ENABLED and InferenceConfig.BACKEND == "ncnn":
+            print("Warning: ROIConfig.ENABLED has no speedup on the ncnn backend (fixed input size, "
+                  "the crop is resized back to the full input); use the ultralytics backend or disable ROI")
+
+    def _apply_config_updates(self) -> None:
+        # Dipanggil di batas frame oleh thread yang menjalankan tracker
+        applied = drain_config_updates(self.config_updates)
+        if not applied:
+            return
+        changed: Dict[str, Any] = {}
+        for resolved, _, _ in applied:
+            changed.update(resolved)
+        self._resize_for_config(changed)
+        for resolved, room, command in applied:
+            self.mqtt_handler.config_applied(resolved, room, command)
+
+    def _resize_for_config(self, changed: Dict[str, Any]) -> None:
+        # Nilai config sudah diganti; di sini hanya state yang ukurannya ditentukan saat init
+        if changed.get("ROIConfig.ENABLED"):
+            self._check_roi_backend()
+        if "CameraConfig.FPS_BUFFER_SIZE" in changed:
+            self.fps_buffer = deque(self.fps_buffer, maxlen=CameraConfig.FPS_BUFFER_SIZE)
+            self._fps_sum = sum(self.fps_buffer)
+        if "MotionDetectionConfig.POSITION_BUFFER_SIZE" in changed:
+            self.motion_tracker.resize_history(MotionDetectionConfig.POSITION_BUFFER_SIZE)
+        if "CameraConfig.RESOLUTION_WIDTH" in changed or "CameraConfig.RESOLUTION_HEIGHT" in changed:
+            if hasattr(self.camera, "apply_resolution"):
+                self.camera.apply_resolution()
+            elif hasattr(self.camera, "set"):
+                self.camera.set(cv2.CAP_PROP_FRAME_WIDTH, CameraConfig.RESOLUTION_WIDTH)
+                self.camera.set(cv2.CAP_PROP_FRAME_HEIGHT, CameraConfig.RESOLUTION_HEIGHT)
+
+    def _maybe_report_stats(self) -> None:
+        self._apply_config_updates()
+        if self.governor is not None:
+            self.governor.update()
+        now = time.perf_counter()
+        if now - self._last_stats_report >= PipelineConfig.STATS_INTERVAL:
+            self._last_stats_report = now
+            print(self.stage_stats.report())
+        if (MetricsConfig.ENABLED and MetricsConfig.MQTT_SUMMARY_INTERVAL > 0 and 
+            now - self._last_metrics_publish >= MetricsConfig.MQTT_SUMMARY_INTERVAL):
+            self._last_metrics_publish = now
+            self.mqtt_handler.publish_metrics(self.metrics.summary())
+
+    def _run_sequential(self) -> None:
+        while not self.stop_event.is_set():
+            start_time = time.perf_counter()
+            
+            ret, frame = self._capture_frame()
+            if not ret:
+                print("Failed to capture frame")
+                break
+
+            detections = self._run_scheduled_inference(frame)
+            self._process_detections(frame, detections, start_time)
+            
+            end_time = time.perf_counter()
+            processing_time = end_time - start_time
+            self._maybe_report_stats()
+            
+            if not self._present_frame(frame, detections, processing_time):
+                break
+
+    def _capture_worker(self, frame_queue: LatestOnlyQueue, stop_event: threading.Event) -> None:
+        sequence = 0
+        while not stop_event.is_set():
+            capture_time = time.perf_counter()
+            ret, frame = self._capture_frame()
+            if not ret:
+                print("Failed to capture frame")
+                stop_event.set()
+                break
+            sequence += 1
+            frame_queue.put((sequence, capture_time, frame))
+
+    def _inference_worker(self, 
+                          frame_queue: LatestOnlyQueue, 
+                          result_queue: LatestOnlyQueue, 
+                          stop_event: threading.Event) -> None:
+        while not stop_event.is_set():
+            try:
+                sequence, capture_time, frame = frame_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            try:
+                detections = self._run_scheduled_inference(frame)
+            except Exception as e:
+                print(f"Inference error: {e}")
+                stop_event.set()
+                break
+            result_queue.put((sequence, capture_time, frame, detections))
+
+    def _run_pipelined(self) -> None:
+        stop_event = self.stop_event
+        frame_queue = LatestOnlyQueue(PipelineConfig.FRAME_QUEUE_SIZE, "frames", self.stage_stats)
+        result_queue = LatestOnlyQueue(PipelineConfig.RESULT_QUEUE_SIZE, "results", self.stage_stats)
+        self.metrics.add_gauge("frame_queue_depth", frame_queue.qsize)
+        self.metrics.add_gauge("result_queue_depth", result_queue.qsize)
+        
+        workers = [
+            threading.Thread(target=self._capture_worker, 
+                             args=(frame_queue, stop_event), 
+                             name="capture", daemon=True),
+            threading.Thread(target=self._inference_worker, 
+                             args=(frame_queue, result_queue, stop_event), 
+                             name="inference", daemon=True),
+        ]
+        for worker in workers:
+            worker.start()
+        
+        last_frame_time = time.perf_counter()
+        try:
+            while not stop_event.is_set():
+                try:
+                    sequence, capture_time, frame, detections = result_queue.get(timeout=0.1)
+                except queue.Empty:
+                    continue
                 
-                self.motion_tracker.update_motion_detection(keypoints)
-                self._update_consecutive_detections(pose_found)
+                self._process_detections(frame, detections, capture_time)
                 
-                should_be_active = self._should_devices_be_active()
-                should_be_inactive = self._should_devices_be_inactive()
+                now = time.perf_counter()
+                frame_interval = now - last_frame_time
+                last_frame_time = now
+                self._maybe_report_stats()
                 
-                self._control_devices_auto_mode(should_be_active, should_be_inactive)
-                self._control_devices_scheduled_mode()
-                self._draw_device_status(annotated_frame)
+                if not self._present_frame(frame, detections, frame_interval):
+                    break
+        finally:
+            stop_event.set()
+            for worker in workers:
+                worker.join(timeout=2.0)
+            print(self.stage_stats.report())
+
+    def _pool_dispatch_worker(self, frame_queue: LatestOnlyQueue, stop_event: threading.Event) -> None:
+        while not stop_event.is_set():
+            try:
+                sequence, capture_time, frame = frame_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            should_infer, imgsz = self.inference_scheduler.plan(frame, time.perf_counter())
+            region, origin = None, None
+            if should_infer:
+                region, imgsz, origin = self._crop_for_inference(frame, imgsz)
+            while not stop_event.is_set():
+                try:
+                    self.inference_pool.submit(region, imgsz, (capture_time, frame, origin), timeout=0.1)
+                    break
+                except queue.Empty:
+                    continue     # semua slot terpakai, frame baru tetap menumpuk di frame_queue
+
+    def _run_pooled(self) -> None:
+        stop_event = self.stop_event
+        frame_queue = LatestOnlyQueue(PipelineConfig.FRAME_QUEUE_SIZE, "frames", self.stage_stats)
+        self.metrics.add_gauge("frame_queue_depth", frame_queue.qsize)
+        workers = [
+            threading.Thread(target=self._capture_worker, 
+                             args=(frame_queue, stop_event), 
+                             name="capture", daemon=True),
+            threading.Thread(target=self._pool_dispatch_worker, 
+                             args=(frame_queue, stop_event), 
+                             name="dispatch", daemon=True),
+        ]
+        for worker in workers:
+            worker.start()
+        
+        last_frame_time = time.perf_counter()
+        try:
+            while not stop_event.is_set():
+                try:
+                    sequence, (capture_time, frame, origin), detections = self.inference_pool.get(timeout=0.1)
+                except queue.Empty:
+                    if not self.inference_pool.healthy():
+                        print("Inference worker exited unexpectedly")
+                        break
+                    continue
                 
-                end_time = time.perf_counter()
-                processing_time = end_time - start_time
-                self._calculate_and_display_fps(annotated_frame, processing_time)
+                if detections is not None:
+                    detections = self._restore_roi(detections, origin)
+                    self.inference_scheduler.report_result(len(detections) > 0, time.perf_counter())
+                self._process_detections(frame, detections, capture_time)
                 
-                cv2.imshow("Smart Motion Detection System", annotated_frame)
+                now = time.perf_counter()
+                frame_interval = now - last_frame_time
+                last_frame_time = now
+                self._maybe_report_stats()
                 
-                if cv2.waitKey(1) & 0xFF == ord('q'):
-                    print("Quit command received")
+                if not self._present_frame(frame, detections, frame_interval):
                     break
+        finally:
+            stop_event.set()
+            for worker in workers:
+                worker.join(timeout=2.0)
+            print(self.stage_stats.report())
+
+    def run(self) -> None:
+        if not self.mqtt_connected and not self.mqtt_handler.connect():
+            print("Failed to connect to MQTT broker. Exiting...")
+            return
+
+        print("Smart Motion Detection System started successfully!")
+        if DisplayConfig.HEADLESS:
+            print("Running headless, send SIGINT/SIGTERM to quit")
+        else:
+            print("Press 'q' to quit")
+        
+        self._start_metrics()
+        self._install_signal_handlers()
+        self._start_preview()
+        self._start_governor()
+        self._check_roi_backend()
+        
+        try:
+            if self.inference_pool is not None:
+                self._run_pooled()
+            elif PipelineConfig.ENABLED:
+                self._run_pipelined()
+            else:
+                self._run_sequential()
                     
         except KeyboardInterrupt:
             print("\nSystem interrupted by user")
@@ -559,18 +4320,316 @@ class SmartMotionDetectionSystem:
 
     def _cleanup(self) -> None:
         print("Cleaning up system resources...")
+        self.device_controller.close()     # event terakhir masih sempat masuk antrian MQTT
+        if self._owns_event_store:
+            self.event_store.close()
         self.mqtt_handler.disconnect()
         self.camera.release()
-        cv2.destroyAllWindows()
-        
-        for device in self.devices.values():
-            device.close()
+        if self.trace_writer is not None:
+            self.trace_writer.close()
+        if self.inference_pool is not None:
+            self.inference_pool.close()
+        if self.preview_server is not None:
+            self.preview_server.stop()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+        if self.profiler is not None and self.profiler.enabled:
+            print(self.profiler.report())
+        if not DisplayConfig.HEADLESS:
+            cv2.destroyAllWindows()
         
         print("System cleanup completed")
 
+class FleetMotionDetectionSystem:
+    def __init__(self, 
+                 rooms: Optional[List[Dict[str, Any]]] = None, 
+                 cameras: Optional[Dict[str, Any]] = None, 
+                 pose_backend: Any = None, 
+                 mqtt_handler: Any = None,
+                 clock: Callable[[], float] = time.time):
+        rooms = rooms if rooms is not None else FleetConfig.ROOMS
+        cameras = dict(cameras or {})
+        self.stage_stats = StageStats()
+        self.stop_event = threading.Event()
+        self.startup_timer = StartupTimer()
+        self.mqtt_connected = False
+        self._last_stats_report = time.perf_counter()
+        self._workers: List[threading.Thread] = []
+        self.inference_pool: Optional[InferenceWorkerPool] = None
+        self.metrics = MetricsRegistry()
+        self.metrics.add_stats(self.stage_stats)
+        self.metrics_server: Optional[MetricsServer] = None
+        self.profiler: Optional[SamplingProfiler] = None
+        self._last_metrics_publish = time.perf_counter()
+        self.clock = clock
+        self.governor: Optional[QualityGovernor] = None
+        self.event_store: Optional[EventStore] = None
+        if EventStoreConfig.ENABLED:
+            self.event_store = EventStore(clock=clock, stats=self.stage_stats)
+        
+        # Satu model, satu koneksi MQTT; hanya kamera, tracker dan perangkat yang dibuat per ruangan
+        self.pose_backend = pose_backend
+        with ThreadPoolExecutor(max_workers=2 + len(rooms), thread_name_prefix="startup") as executor:
+            if pose_backend is None:
+                model_future = executor.submit(self.startup_timer.measure, "model", self._initialize_model)
+            camera_futures = {room["name"]: executor.submit(open_camera, room["source"]) 
+                              for room in rooms if room["name"] not in cameras}
+            
+            room_controllers = {room["name"]: DeviceController({
+                                    device_name: SmartDevice(device_name, pin, device_name in DeviceConfig.PWM_DEVICES) 
+                                    for device_name, pin in room["devices"].items()}, clock) 
+                                for room in rooms}
+            if mqtt_handler is None:
+                self.mqtt_handler = MQTTHandler(None, self.stage_stats)
+                for room_name, controller in room_controllers.items():
+                    self.mqtt_handler.add_room(room_name, controller)
+                mqtt_future = executor.submit(self.startup_timer.measure, "mqtt_connect", self.mqtt_handler.connect)
+                self.mqtt_connected = mqtt_future.result()
+            else:
+                self.mqtt_handler = mqtt_handler
+            
+            for room_name, camera_future in camera_futures.items():
+                cameras[room_name] = camera_future.result()
+            if pose_backend is None:
+                model_future.result()
+        
+        self.rooms = [SmartMotionDetectionSystem(camera=cameras[room["name"]], 
+                                                 pose_backend=self.pose_backend, 
+                                                 mqtt_handler=RoomMQTTChannel(self.mqtt_handler, room["name"]), 
+                                                 clock=clock, 
+                                                 device_controller=room_controllers[room["name"]], 
+                                                 name=room["name"],
+                                                 event_store=self.event_store) 
+                      for room in rooms]
+        if self.event_store is not None:
+            self.event_store.sync_publisher = getattr(self.mqtt_handler, "publish_rollups", None)
+        for room in self.rooms:
+            self.metrics.include(room.metrics)
+        self.config_updates: queue.Queue = queue.Queue()
+        if hasattr(self.mqtt_handler, "config_listeners"):
+            self.mqtt_handler.config_listeners.append(self.config_updates.put)
+        publisher = getattr(self.mqtt_handler, "publisher", None)
+        if publisher is not None:
+            self.metrics.add_gauge("mqtt_queue_depth", publisher.queue_depth)
+            self.metrics.add_gauge("mqtt_spool_bytes", publisher.spool_bytes)
+        self.startup_timer.mark("ready")
+        print(f"Fleet mode: {len(self.rooms)} rooms sharing {self.pose_backend.name} backend")
+
+    def _initialize_model(self) -> None:
+        try:
+            if InferencePoolConfig.ENABLED:
+                # Frame dari semua ruangan dalam satu batch dibagi ke worker secara paralel
+                self.inference_pool = InferenceWorkerPool()
+                self.inference_pool.start()
+                self.pose_backend = self.inference_pool
+                return
+            self.pose_backend = self.startup_timer.measure("model_load", create_pose_backend)
+            self.startup_timer.measure("model_warmup", self.pose_backend.warmup)
+        except Exception as e:
+            raise RuntimeError(f"Failed to load YOLO model: {e}")
+
+    def _request_stop(self, signum: int, frame: Any) -> None:
+        print(f"\nSignal {signal.Signals(signum).name} received, stopping...")
+        self.stop_event.set()
+
+    def _install_signal_handlers(self) -> None:
+        if threading.current_thread() is not threading.main_thread():
+            return
+        signal.signal(signal.SIGTERM, self._request_stop)
+        if DisplayConfig.HEADLESS:
+            signal.signal(signal.SIGINT, self._request_stop)
+        if self.profiler is not None and hasattr(signal, "SIGUSR1"):
+            signal.signal(signal.SIGUSR1, lambda signum, frame: self.profiler.toggle())
+
+    def _start_metrics(self) -> None:
+        self.profiler = SamplingProfiler()
+        if MetricsConfig.PROFILER_ENABLED:
+            self.profiler.toggle()
+        if not MetricsConfig.ENABLED:
+            return
+        self.metrics.add_system_gauges()
+        try:
+            self.metrics_server = MetricsServer(MetricsConfig.HOST, MetricsConfig.PORT, self.metrics, self.profiler, 
+                                                self.event_store)
+            self.metrics_server.start()
+        except OSError as e:
+            self.metrics_server = None
+            print(f"Metrics server disabled: {e}")
+
+    def _start_governor(self) -> None:
+        # Satu governor untuk proses: suhu CPU dan backend dipakai bersama semua ruangan
+        if not GovernorConfig.ENABLED:
+            return
+        parallelism = InferencePoolConfig.WORKERS if self.inference_pool is not None else 1
+        self.governor = QualityGovernor(self.stage_stats, self._apply_quality, clock=self.clock, 
+                                        parallelism=parallelism, event_store=self.event_store)
+        self.governor.register_gauges(self.metrics)
+
+    def _apply_quality(self, settings: Dict[str, Any]) -> None:
+        for room in self.rooms:
+            room._apply_quality(settings)
+
+    def _start_capture(self) -> List[LatestOnlyQueue]:
+        frame_queues = []
+        for room in self.rooms:
+            frame_queue = LatestOnlyQueue(PipelineConfig.FRAME_QUEUE_SIZE, "frames", room.stage_stats)
+            self.metrics.add_gauge("frame_queue_depth", frame_queue.qsize, {"room": room.name})
+            worker = threading.Thread(target=room._capture_worker, 
+                                      args=(frame_queue, room.stop_event), 
+                                      name=f"capture-{room.name}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+            frame_queues.append(frame_queue)
+        return frame_queues
+
+    def _collect_batch(self, frame_queues: List[LatestOnlyQueue]) -> List[Tuple[SmartMotionDetectionSystem, float, np.ndarray]]:
+        deadline = time.perf_counter() + FleetConfig.BATCH_TIMEOUT
+        batch = []
+        for room, frame_queue in zip(self.rooms, frame_queues):
+            if room.stop_event.is_set():
+                continue
+            try:
+                sequence, capture_time, frame = frame_queue.get(timeout=max(0.0, deadline - time.perf_counter()))
+            except queue.Empty:
+                continue
+            batch.append((room, capture_time, frame))
+        return batch
+
+    def _run_batch_inference(self, batch: List[Tuple[SmartMotionDetectionSystem, float, np.ndarray]]) -> List[Optional[PoseDetections]]:
+        now = time.perf_counter()
+        groups: Dict[Optional[int], List[int]] = {}
+        regions: Dict[int, Tuple[np.ndarray, Optional[Tuple[int, int]]]] = {}
+        for index, (room, capture_time, frame) in enumerate(batch):
+            should_infer, imgsz = room.inference_scheduler.plan(frame, now)
+            if should_infer:
+                # ROI tiap ruangan dipotong dulu, imgsz hasil plan ROI menentukan grup batch
+                region, imgsz, origin = room._crop_for_inference(frame, imgsz)
+                regions[index] = (region, origin)
+                groups.setdefault(imgsz, []).append(index)
+        
+        # Frame dengan ukuran input yang sama dijalankan dalam satu panggilan model
+        results: List[Optional[PoseDetections]] = [None] * len(batch)
+        for imgsz, indices in groups.items():
+            start_time = time.perf_counter()
+            detections = self.pose_backend.predict_batch([regions[index][0] for index in indices], imgsz)
+            done = time.perf_counter()
+            self.stage_stats.record("inference", done - start_time)
+            self.stage_stats.increment("batched_frames", len(indices))
+            for index, room_detections in zip(indices, detections):
+                room = batch[index][0]
+                results[index] = room._restore_roi(room_detections, regions[index][1])
+                room.inference_scheduler.report_result(len(room_detections) > 0, done)
+        return results
+
+    def _apply_config_updates(self) -> None:
+        # Config berlaku untuk semua ruangan, diterapkan sekali lalu state tiap ruangan di-resize
+        applied = drain_config_updates(self.config_updates)
+        if not applied:
+            return
+        changed: Dict[str, Any] = {}
+        for resolved, _, _ in applied:
+            changed.update(resolved)
+        for room in self.rooms:
+            room._resize_for_config(changed)
+        for resolved, room_name, command in applied:
+            self.mqtt_handler.config_applied(resolved, room_name, command)
+
+    def _maybe_report_stats(self) -> None:
+        self._apply_config_updates()
+        if self.governor is not None:
+            self.governor.update()
+        now = time.perf_counter()
+        if now - self._last_stats_report >= PipelineConfig.STATS_INTERVAL:
+            self._last_stats_report = now
+            print(self.stage_stats.report())
+            for room in self.rooms:
+                print(f"[{room.name}] {room.stage_stats.report()}")
+        if (MetricsConfig.ENABLED and MetricsConfig.MQTT_SUMMARY_INTERVAL > 0 and 
+            now - self._last_metrics_publish >= MetricsConfig.MQTT_SUMMARY_INTERVAL):
+            self._last_metrics_publish = now
+            self.mqtt_handler.publish_metrics(self.metrics.summary())
+
+    def _run_loop(self) -> None:
+        frame_queues = self._start_capture()
+        last_frame_time = time.perf_counter()
+        while not self.stop_event.is_set():
+            if all(room.stop_event.is_set() for room in self.rooms):
+                print("All camera sources stopped")
+                break
+            
+            batch = self._collect_batch(frame_queues)
+            if not batch:
+                continue
+            results = self._run_batch_inference(batch)
+            
+            now = time.perf_counter()
+            frame_interval = now - last_frame_time
+            last_frame_time = now
+            for (room, capture_time, frame), detections in zip(batch, results):
+                room._process_detections(frame, detections, capture_time)
+                if not room._present_frame(frame, detections, frame_interval) and not room.stop_event.is_set():
+                    self.stop_event.set()
+            self.stage_stats.mark_processed()
+            self._maybe_report_stats()
+
+    def run(self) -> None:
+        if not self.mqtt_connected and not self.mqtt_handler.connect():
+            print("Failed to connect to MQTT broker. Exiting...")
+            return
+
+        print("Smart Motion Detection System started in fleet mode!")
+        if DisplayConfig.HEADLESS:
+            print("Running headless, send SIGINT/SIGTERM to quit")
+        else:
+            print("Press 'q' to quit")
+        
+        self._start_metrics()
+        self._install_signal_handlers()
+        self._start_governor()
+        try:
+            self._run_loop()
+        except KeyboardInterrupt:
+            print("\nSystem interrupted by user")
+        except Exception as e:
+            print(f"System error: {e}")
+        finally:
+            self._cleanup()
+
+    def _cleanup(self) -> None:
+        self.stop_event.set()
+        for room in self.rooms:
+            room.stop_event.set()
+        for worker in self._workers:
+            worker.join(timeout=2.0)
+        print(self.stage_stats.report())
+        
+        for room in self.rooms:
+            room._cleanup()
+        if self.event_store is not None:
+            self.event_store.close()
+        if self.inference_pool is not None:
+            self.inference_pool.close()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+        if self.profiler is not None and self.profiler.enabled:
+            print(self.profiler.report())
+        self.mqtt_handler.disconnect()
+
 def main():
     try:
-        system = SmartMotionDetectionSystem()
+        load_config()
+        if not MQTTConfig.BROKER:
+            raise ConfigError("MQTTConfig.BROKER is not set (config file or DMOUV_MQTT__BROKER)")
+    except ConfigError as e:
+        print(f"Invalid configuration: {e}")
+        return 1
+    
+    if DeviceConfig.SET_GIL_SWITCH_INTERVAL:
+        # Berlaku untuk seluruh proses (semua ruangan di mode fleet), jadi hanya diatur di sini
+        sys.setswitchinterval(DeviceConfig.GIL_SWITCH_INTERVAL)
+    
+    try:
+        system = FleetMotionDetectionSystem() if FleetConfig.ENABLED else SmartMotionDetectionSystem()
         system.run()
     except Exception as e:
         print(f"Failed to initialize system: {e}")
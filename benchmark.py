@@ -0,0 +1,666 @@
+"""Offline replay and benchmark harness for the Smart Motion Detection System.
+
+Runs SmartMotionDetectionSystem without camera, GPIO pins or MQTT broker:
+
+    python3 benchmark.py video recording.mp4 --labels labels.npy
+    python3 benchmark.py trace trace.npz --set MotionDetectionConfig.MOVEMENT_SPEED_THRESHOLD=0.5
+    python3 benchmark.py extract recording.mp4 trace.npz --labels labels.npy
+    python3 benchmark.py trace traces/keypoints.dmkt --labels labels.npy
+    python3 benchmark.py consistency trace.npz --strides 1,2,3 --scales 0.5,1,2
+    python3 benchmark.py governor --minutes 30 --inference-ms 120 --fixed-input
+    python3 benchmark.py tracker --people 10 --frames 3000
+    python3 benchmark.py actuator --busy-threads 3 --commands 200
+
+A keypoint trace (.npz) contains `timestamps` (F,), `keypoints` (F, P, 17, 3)
+padded with NaN, optional `boxes` (F, P, 4) and optional `labels` (F,) with
+the ground-truth motion state of every frame. Traces recorded on a unit with
+RecorderConfig.ENABLED (.dmkt) are streamed from a memory map instead.
+
+The consistency command replays one trace with every Nth frame, rescaled
+keypoints and jittered/dropped frames, and fails if the motion triggers and
+clears drift from the full-rate replay by more than the tolerance plus one
+frame interval.
+
+The governor command drives QualityGovernor and InferenceScheduler on a
+virtual clock with a simple cost model (inference time scales with input
+area and thread count) and the simulated thermal sensor, and reports the
+levels chosen, the peak temperature and the lowest inference rate.
+
+The tracker command times MultiPersonTracker.update_motion_detection on
+synthetic people walking in front of the camera, to check the per-frame
+tracking budget on the target device.
+
+The actuator command sends manual commands to a DeviceController on mock
+GPIO pins while busy threads hold the GIL, and reports the command-to-GPIO
+latency with the default Python switch interval and with
+DeviceConfig.GIL_SWITCH_INTERVAL.
+"""
+import sys
+import json
+import time
+import resource
+import threading
+import argparse
+import numpy as np
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import AIoT_DMouv as dmouv
+
+class StubMQTTHandler:
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self.events: List[Tuple[float, str, Dict[str, Any]]] = []
+        self.statuses: List[Tuple[float, str]] = []
+
+    def connect(self) -> bool:
+        return True
+
+    def publish_sensor_data(self, device_name: str, data: Dict[str, Any], timestamp: Optional[float] = None) -> None:
+        # Event dikirim dari thread actuator, pakai waktu saat perintah dibuat bila ada
+        self.events.append((self.clock() if timestamp is None else timestamp, device_name, data))
+
+    def publish_settings_error(self, device_name: str, setting: str, error: str) -> None:
+        self.events.append((self.clock(), device_name, {"setting": setting, "error": error}))
+
+    def publish_status(self, status: str) -> None:
+        self.statuses.append((self.clock(), status))
+
+    def publish_metrics(self, summary: Dict[str, Any]) -> None:
+        pass
+
+    def publish_ack(self, command: Any, data: Dict[str, Any]) -> None:
+        pass
+
+    def disconnect(self) -> None:
+        pass
+
+class TraceReplay:
+    def __init__(self, path: str, frames: Optional[Iterable[Tuple[float, Any]]] = None):
+        self.labels = None
+        if frames is not None:
+            self._frames = iter(frames)
+        elif path.endswith(".npz"):
+            self._frames = self._npz_frames(path)
+        else:
+            self._frames = dmouv.KeypointTraceReader(path).iter_frames()     # memory-mapped .dmkt
+        self.timestamps: List[float] = []
+        self._detections = dmouv.PoseDetections.empty()
+        self._frame = np.zeros((1, 1, 3), dtype=np.uint8)
+        self.name = "trace"
+
+    def _npz_frames(self, path: str):
+        trace = np.load(path)
+        timestamps = trace["timestamps"].astype(np.float64)
+        keypoints = trace["keypoints"].astype(np.float32)
+        boxes = trace["boxes"].astype(np.float32) if "boxes" in trace else None
+        self.labels = trace["labels"].astype(bool) if "labels" in trace else None
+        for index, timestamp in enumerate(timestamps):
+            present = ~np.isnan(keypoints[index]).any(axis=(1, 2))
+            frame_keypoints = keypoints[index][present]
+            if boxes is not None:
+                frame_boxes = boxes[index][present]
+            else:
+                frame_boxes = dmouv.MultiPersonTracker._keypoint_boxes(frame_keypoints)
+            yield float(timestamp), dmouv.PoseDetections(frame_boxes, frame_keypoints[:, :, 2].mean(axis=1),
+                                                         frame_keypoints)
+
+    def read(self) -> Tuple[bool, Optional[np.ndarray]]:
+        try:
+            timestamp, self._detections = next(self._frames)
+        except StopIteration:
+            return False, None
+        self.timestamps.append(timestamp)
+        return True, self._frame
+
+    def isOpened(self) -> bool:
+        return True
+
+    def release(self) -> None:
+        pass
+
+    def clock(self) -> float:
+        return self.timestamps[-1] if self.timestamps else 0.0
+
+    def warmup(self, imgsz: Optional[int] = None) -> None:
+        pass
+
+    def predict(self, frame: np.ndarray, imgsz: Optional[int] = None) -> dmouv.PoseDetections:
+        return self._detections
+
+class VideoReplay:
+    def __init__(self, path: str, start_time: Optional[float] = None):
+        self.capture = dmouv.cv2.VideoCapture(path)
+        if not self.capture.isOpened():
+            raise RuntimeError(f"Failed to open video {path}")
+        self.fps = self.capture.get(dmouv.cv2.CAP_PROP_FPS) or 30.0
+        self.start_time = time.time() if start_time is None else start_time
+        self.index = -1
+
+    def read(self) -> Tuple[bool, Optional[np.ndarray]]:
+        ret, frame = self.capture.read()
+        if ret:
+            self.index += 1
+        return ret, frame
+
+    def isOpened(self) -> bool:
+        return self.capture.isOpened()
+
+    def release(self) -> None:
+        self.capture.release()
+
+    def clock(self) -> float:
+        return self.start_time + max(self.index, 0) / self.fps
+
+def label_segments(timestamps: np.ndarray, labels: np.ndarray) -> List[Tuple[float, float]]:
+    padded = np.concatenate([[False], labels, [False]]).astype(np.int8)
+    edges = np.diff(padded)
+    starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1) - 1
+    return [(float(timestamps[start]), float(timestamps[end])) for start, end in zip(starts, ends)]
+
+def motion_events(events: List[Tuple[float, str, Dict[str, Any]]]) -> Tuple[np.ndarray, np.ndarray]:
+    devices = sorted({device for _, device, _ in events})
+    reference_device = devices[0] if devices else None
+    triggers = np.array([t for t, device, data in events
+                         if device == reference_device and data.get("motion_detected")])
+    clears = np.array([t for t, device, data in events
+                       if device == reference_device and data.get("motion_cleared")])
+    return triggers, clears
+
+def evaluate_triggers(events: List[Tuple[float, str, Dict[str, Any]]],
+                      timestamps: np.ndarray,
+                      labels: np.ndarray,
+                      tolerance: float) -> Dict[str, Any]:
+    triggers, clears = motion_events(events)
+    segments = label_segments(timestamps, labels)
+
+    trigger_latencies, clear_latencies, missed = [], [], 0
+    matched_triggers = np.zeros(len(triggers), dtype=bool)
+    for index, (start, end) in enumerate(segments):
+        next_start = segments[index + 1][0] if index + 1 < len(segments) else np.inf
+        in_segment = (triggers >= start - tolerance) & (triggers <= end + tolerance)
+        matched_triggers |= in_segment
+        if in_segment.any():
+            trigger_latencies.append(float(triggers[in_segment][0] - start))
+        else:
+            missed += 1
+            continue
+        after_end = clears[(clears >= end - tolerance) & (clears < next_start)]
+        if len(after_end):
+            clear_latencies.append(float(after_end[0] - end))
+
+    def describe(values: List[float]) -> Dict[str, float]:
+        if not values:
+            return {}
+        p50, p95 = np.percentile(values, [50, 95])
+        return {"mean_s": float(np.mean(values)), "p50_s": float(p50),
+                "p95_s": float(p95), "max_s": float(np.max(values))}
+
+    return {
+        "segments": len(segments),
+        "triggered": len(trigger_latencies),
+        "missed": missed,
+        "false_triggers": int(np.count_nonzero(~matched_triggers)),
+        "trigger_latency": describe(trigger_latencies),
+        "clear_latency": describe(clear_latencies),
+    }
+
+def resource_usage() -> Dict[str, float]:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return {"cpu_s": usage.ru_utime + usage.ru_stime, "max_rss_mb": usage.ru_maxrss / 1024.0}
+
+def apply_overrides(overrides: List[str]) -> None:
+    updates: Dict[str, Dict[str, Any]] = {}
+    for override in overrides:
+        name, _, raw_value = override.partition("=")
+        section_name, _, field = name.partition(".")
+        updates.setdefault(section_name, {})[field] = raw_value
+    # Tipe dan batas nilai dicek dengan aturan yang sama seperti file config
+    resolved = dmouv.validate_config(updates)
+    dmouv.apply_config(resolved)
+    for name, value in resolved.items():
+        print(f"Override {name} = {value!r}")
+
+def configure_offline(pipelined: bool) -> None:
+    from gpiozero import Device
+    from gpiozero.pins.mock import MockFactory
+    Device.pin_factory = MockFactory()
+
+    dmouv.DisplayConfig.HEADLESS = True
+    dmouv.DisplayConfig.PREVIEW_ENABLED = False
+    dmouv.PipelineConfig.ENABLED = pipelined
+    dmouv.PipelineConfig.LATENCY_WINDOW = 10 ** 6
+    dmouv.PipelineConfig.STATS_INTERVAL = float("inf")
+    dmouv.MetricsConfig.ENABLED = False
+    dmouv.EventStoreConfig.ENABLED = False
+    dmouv.GovernorConfig.ENABLED = False      # kualitas tetap, hasil bisa dibandingkan antar run
+
+def run_benchmark(camera: Any, backend: Any, clock, labels: Optional[np.ndarray],
+                  timestamps_of, tolerance: float, default_labels=lambda: None) -> Dict[str, Any]:
+    mqtt_handler = StubMQTTHandler(clock)
+    system = dmouv.SmartMotionDetectionSystem(camera=camera, pose_backend=backend,
+                                              mqtt_handler=mqtt_handler, clock=clock)
+    before = resource_usage()
+    wall_start = time.perf_counter()
+    system.run()
+    wall_time = time.perf_counter() - wall_start
+    after = resource_usage()
+
+    summary = system.stage_stats.summary()
+    report = {
+        "frames": summary["processed"],
+        "wall_s": wall_time,
+        "fps": summary["processed"] / wall_time if wall_time > 0 else 0.0,
+        "cpu_utilization": (after["cpu_s"] - before["cpu_s"]) / wall_time if wall_time > 0 else 0.0,
+        "max_rss_mb": after["max_rss_mb"],
+        "stages": summary["stages"],
+        "dropped": summary["dropped"],
+        "counters": summary["counters"],
+        "events": len(mqtt_handler.events),
+    }
+    triggers, clears = motion_events(mqtt_handler.events)
+    report["motion_events"] = {"triggers": triggers.tolist(), "clears": clears.tolist()}
+    labels = default_labels() if labels is None else labels
+    if labels is not None:
+        timestamps = timestamps_of()
+        report["detection"] = evaluate_triggers(mqtt_handler.events, timestamps[:len(labels)],
+                                                labels[:len(timestamps)], tolerance)
+    return report
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(f"\nFrames: {report['frames']}  wall: {report['wall_s']:.2f}s  FPS: {report['fps']:.1f}")
+    print(f"CPU utilization: {report['cpu_utilization'] * 100:.0f}%  max RSS: {report['max_rss_mb']:.0f} MB")
+    print(f"{'stage':<22}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for stage, values in report["stages"].items():
+        print(f"{stage:<22}{values['p50_ms']:>10.2f}{values['p95_ms']:>10.2f}"
+              f"{values['p99_ms']:>10.2f}{values['max_ms']:>10.2f}")
+    if report["dropped"] or report["counters"]:
+        print(f"Dropped: {report['dropped']}  counters: {report['counters']}")
+    if "detection" in report:
+        detection = report["detection"]
+        print(f"Ground truth segments: {detection['segments']}  triggered: {detection['triggered']}  "
+              f"missed: {detection['missed']}  false triggers: {detection['false_triggers']}")
+        for name in ("trigger_latency", "clear_latency"):
+            if detection[name]:
+                values = detection[name]
+                print(f"{name}: mean {values['mean_s']:.2f}s  p50 {values['p50_s']:.2f}s  "
+                      f"p95 {values['p95_s']:.2f}s  max {values['max_s']:.2f}s")
+
+def trace_variants(strides: List[int], scales: List[float], 
+                   drop: float, jitter: float) -> List[Dict[str, Any]]:
+    variants = [{"name": "baseline", "stride": 1, "scale": 1.0, "drop": 0.0, "jitter": 0.0}]
+    variants += [{"name": f"stride {stride}", "stride": stride, "scale": 1.0, "drop": 0.0, "jitter": 0.0}
+                 for stride in strides if stride != 1]
+    variants += [{"name": f"scale {scale:g}", "stride": 1, "scale": scale, "drop": 0.0, "jitter": 0.0}
+                 for scale in scales if scale != 1.0]
+    if drop > 0 or jitter > 0:
+        # Frame rate tidak rata: sebagian frame dilewati dan timestamp bergeser
+        variants.append({"name": f"drop {drop:g} jitter {jitter:g}s", "stride": 1, "scale": 1.0, 
+                         "drop": drop, "jitter": jitter})
+    return variants
+
+def resample_frames(frames: List[Tuple[float, Any]], labels: Optional[np.ndarray],
+                    variant: Dict[str, Any], seed: int) -> Tuple[List[Tuple[float, Any]], Optional[np.ndarray]]:
+    rng = np.random.default_rng(seed)
+    indices = np.arange(0, len(frames), variant["stride"])
+    if variant["drop"] > 0:
+        indices = indices[rng.random(len(indices)) >= variant["drop"]]
+    timestamps = np.array([frames[index][0] for index in indices], dtype=np.float64)
+    if variant["jitter"] > 0 and len(timestamps) > 1:
+        # Jitter dibatasi setengah interval terkecil agar urutan frame tetap
+        limit = min(variant["jitter"], float(np.diff(timestamps).min()) / 2)
+        timestamps = timestamps + rng.uniform(-limit, limit, len(timestamps))
+    resampled = [(float(timestamp), frames[index][1].scale(variant["scale"]) if variant["scale"] != 1.0 
+                  else frames[index][1]) for timestamp, index in zip(timestamps, indices)]
+    return resampled, (labels[indices[indices < len(labels)]] if labels is not None else None)
+
+def compare_events(baseline: np.ndarray, variant: np.ndarray) -> Optional[float]:
+    # Jumlah event harus sama, selisih waktu terbesar dikembalikan (None jika jumlah berbeda)
+    if len(baseline) != len(variant):
+        return None
+    return float(np.abs(variant - baseline).max()) if len(baseline) else 0.0
+
+def run_consistency(path: str, labels: Optional[np.ndarray], strides: List[int], scales: List[float],
+                    drop: float, jitter: float, tolerance: float, seed: int) -> Dict[str, Any]:
+    dmouv.InferenceSchedulerConfig.ENABLED = False
+    source = TraceReplay(path)
+    frames = [(timestamp, detections) for timestamp, detections in source._frames]
+    labels = source.labels if labels is None else labels
+    timestamps = np.array([timestamp for timestamp, _ in frames])
+    frame_interval = float(np.median(np.diff(timestamps))) if len(timestamps) > 1 else 0.0
+
+    results = []
+    baseline_events = None
+    for variant in trace_variants(strides, scales, drop, jitter):
+        variant_frames, variant_labels = resample_frames(frames, labels, variant, seed)
+        replay = TraceReplay(path, variant_frames)
+        report = run_benchmark(replay, replay, replay.clock, variant_labels,
+                               lambda: np.array(replay.timestamps), tolerance)
+        events = {name: np.array(values) for name, values in report["motion_events"].items()}
+        if baseline_events is None:
+            baseline_events = events
+        # Keputusan hanya bisa diambil di frame yang ada, toleransi ditambah satu interval frame varian
+        allowed = tolerance + frame_interval * variant["stride"] / max(1.0 - variant["drop"], 0.1) + variant["jitter"]
+        drift = {name: compare_events(baseline_events[name], events[name]) for name in events}
+        consistent = all(value is not None and value <= allowed for value in drift.values())
+        results.append({**variant, "frames": report["frames"], "triggers": len(events["triggers"]),
+                        "clears": len(events["clears"]), "drift_s": drift, "allowed_s": allowed,
+                        "consistent": consistent, "detection": report.get("detection")})
+    return {"variants": results, "consistent": all(result["consistent"] for result in results)}
+
+def print_consistency(report: Dict[str, Any]) -> None:
+    print(f"\n{'variant':<26}{'frames':>8}{'triggers':>10}{'clears':>8}{'drift s':>10}{'allowed s':>11}  result")
+    for result in report["variants"]:
+        drifts = list(result["drift_s"].values())
+        drift = "count" if None in drifts else f"{max(drifts, default=0.0):.2f}"
+        print(f"{result['name']:<26}{result['frames']:>8}{result['triggers']:>10}{result['clears']:>8}"
+              f"{drift:>10}{result['allowed_s']:>11.2f}  {'ok' if result['consistent'] else 'MISMATCH'}")
+    print(f"\nConsistent: {'yes' if report['consistent'] else 'no'}")
+
+def run_governor_simulation(minutes: float, camera_fps: float, inference_ms: float, 
+                            fixed_input: bool, cores: int) -> Dict[str, Any]:
+    # Kasus terberat: orang bergerak terus, scheduler meminta inferensi di setiap frame
+    dmouv.InferenceSchedulerConfig.ENABLED = False
+    now = [0.0]
+    cpu = [0.0, 0.0]        # detik CPU sejak pembacaan sensor terakhir, waktu pembacaan terakhir
+    stats = dmouv.StageStats()
+    scheduler = dmouv.InferenceScheduler(stats)
+    knobs: Dict[str, Any] = {}
+
+    def load() -> float:
+        busy, since = cpu
+        cpu[:] = [0.0, now[0]]
+        return min(1.0, busy / (now[0] - since) / cores) if now[0] > since else 0.0
+
+    def apply(settings: Dict[str, Any]) -> None:
+        knobs.update(settings)
+        scheduler.max_imgsz = settings["imgsz"]
+        scheduler.min_interval = 1.0 / settings["max_rate"] if settings["max_rate"] > 0 else 0.0
+
+    sensor = dmouv.SimulatedThermalSensor(load, clock=lambda: now[0])
+    governor = dmouv.QualityGovernor(stats, apply, sensor, clock=lambda: now[0], scalable_input=not fixed_input)
+    full_threads = dmouv.InferenceConfig.NUM_THREADS
+    changes, rates, level_time = [], [], {}
+    max_temperature = sensor.temperature
+    while now[0] < minutes * 60:
+        # Frame berikutnya dari kamera; frame yang terlewat saat inferensi dibuang
+        started = now[0]
+        now[0] = float(np.ceil(now[0] * camera_fps - 1e-9)) / camera_fps
+        level = governor.level
+        should_infer, imgsz = scheduler.plan(None, now[0])
+        elapsed = 0.002
+        if should_infer:
+            area = 1.0 if fixed_input else (imgsz / 640.0) ** 2
+            seconds = inference_ms / 1000.0 * area * (full_threads / knobs["threads"]) ** 0.8
+            stats.record("inference", seconds)
+            cpu[0] += seconds * knobs["threads"]
+            elapsed += seconds
+        cpu[0] += 0.002
+        now[0] += elapsed
+        level_time[level] = level_time.get(level, 0.0) + float(now[0] - started)
+        if should_infer:
+            scheduler.report_result(True, now[0])
+        stats.mark_processed()
+        if governor.update():
+            changes.append({"time_s": now[0], "level": governor.level, "temperature": governor.temperature})
+        if governor.inference_rate is not None and now[0] > dmouv.GovernorConfig.INTERVAL * 2:
+            rates.append(governor.inference_rate)
+        max_temperature = max(max_temperature, sensor.temperature)
+    return {
+        "changes": changes,
+        "level_time_s": {level: round(seconds, 1) for level, seconds in sorted(level_time.items())},
+        "max_temperature": max_temperature,
+        "final_temperature": sensor.temperature,
+        "min_inference_rate": min(rates, default=0.0),
+        "mean_inference_rate": stats.histogram_snapshot().get("inference", ([], 0.0, 0))[2] / now[0],
+    }
+
+def print_governor(report: Dict[str, Any]) -> None:
+    for change in report["changes"]:
+        print(f"{change['time_s']:8.1f}s  level {change['level']}  {change['temperature']:.1f}C")
+    print(f"\nTime per level (s):  {report['level_time_s']}")
+    print(f"Temperature (C):     max {report['max_temperature']:.1f}, final {report['final_temperature']:.1f}")
+    print(f"Inference rate (/s): min {report['min_inference_rate']:.2f}, mean {report['mean_inference_rate']:.2f} "
+          f"(floor {dmouv.GovernorConfig.MIN_INFERENCE_RATE})")
+
+def run_tracker_benchmark(people: int, frames: int, fps: float, seed: int) -> Dict[str, Any]:
+    # Orang sintetis berayun di depan kamera dengan noise keypoint dan confidence acak
+    dmouv.TrackingConfig.MAX_TRACKS = max(dmouv.TrackingConfig.MAX_TRACKS, people)
+    rng = np.random.default_rng(seed)
+    anchors = rng.uniform(50, 600, (people, 1, 2)) + rng.normal(0, 30, (people, 17, 2))
+    amplitude = rng.uniform(0, 40, (people, 1, 1))
+    tracker = dmouv.MultiPersonTracker()
+    warmup = min(frames // 10, int(fps * dmouv.MotionDetectionConfig.MOTION_WINDOW))
+    durations = []
+    for frame in range(frames):
+        keypoints = np.empty((people, 17, 3), dtype=np.float32)
+        keypoints[..., :2] = (anchors + np.sin(frame / 10 + np.arange(people))[:, None, None] * amplitude + 
+                              rng.normal(0, 2, (people, 17, 2)))
+        keypoints[..., 2] = rng.uniform(0.3, 1.0, (people, 17))
+        boxes = np.concatenate([keypoints[..., :2].min(axis=1), keypoints[..., :2].max(axis=1)], axis=1)
+        start = time.perf_counter()
+        tracker.update_motion_detection(keypoints, boxes, frame / fps)
+        if frame >= warmup:
+            durations.append(time.perf_counter() - start)
+    values = np.array(durations) * 1000
+    return {
+        "people": people,
+        "frames": len(values),
+        "filter": dmouv.KeypointFilterConfig.ENABLED,
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "max_ms": float(values.max()),
+    }
+
+def print_tracker(report: Dict[str, Any]) -> None:
+    print(f"MultiPersonTracker, {report['people']} people, keypoint filter {'on' if report['filter'] else 'off'}: "
+          f"p50 {report['p50_ms']:.3f} ms, p95 {report['p95_ms']:.3f} ms, max {report['max_ms']:.3f} ms "
+          f"over {report['frames']} frames")
+
+class AckRecorder:
+    def publish_ack(self, command: Any, data: Dict[str, Any]) -> None:
+        pass
+
+def busy_loop(stop: threading.Event) -> None:
+    # Kode Python murni (tracker, filter) memegang GIL sampai interpreter memaksa pergantian
+    while not stop.is_set():
+        sum(value * value for value in range(2000))
+
+def measure_actuator(busy_threads: int, commands: int, interval: float, seed: int) -> Dict[str, Any]:
+    rng = np.random.default_rng(seed)
+    devices = {"lamp": dmouv.SmartDevice("lamp", 26), "fan": dmouv.SmartDevice("fan", 19)}
+    controller = dmouv.DeviceController(devices)
+    stats = dmouv.StageStats(window=commands)
+    controller.start(AckRecorder(), stats)
+    stop = threading.Event()
+    workers = [threading.Thread(target=busy_loop, args=(stop,), daemon=True) for _ in range(busy_threads)]
+    for worker in workers:
+        worker.start()
+    try:
+        for index in range(commands):
+            time.sleep(rng.uniform(0.01, 0.03))
+            command = dmouv.DeviceCommand("action", "lamp", {"action": "turn_on" if index % 2 == 0 else "turn_off"})
+            command.received_at = time.perf_counter()
+            controller.dispatch(command)
+        deadline = time.perf_counter() + 5.0
+        while (stats.summary()["stages"].get("command_latency", {}).get("count", 0) < commands and 
+               time.perf_counter() < deadline):
+            time.sleep(0.01)
+    finally:
+        stop.set()
+        for worker in workers:
+            worker.join()
+        controller.close()
+    latency = stats.summary()["stages"]["command_latency"]
+    return {"switch_interval_ms": interval * 1000, **{key: latency[key] for key in ("count", "p50_ms", "p95_ms", "max_ms")}}
+
+def run_actuator_benchmark(busy_threads: int, commands: int, seed: int) -> Dict[str, Any]:
+    default_interval = sys.getswitchinterval()
+    runs = []
+    try:
+        for interval in (default_interval, dmouv.DeviceConfig.GIL_SWITCH_INTERVAL):
+            sys.setswitchinterval(interval)
+            runs.append(measure_actuator(busy_threads, commands, interval, seed))
+    finally:
+        sys.setswitchinterval(default_interval)
+    return {"busy_threads": busy_threads, "runs": runs}
+
+def print_actuator(report: Dict[str, Any]) -> None:
+    print(f"Command-to-GPIO latency with {report['busy_threads']} busy threads:")
+    for run in report["runs"]:
+        print(f"  switch interval {run['switch_interval_ms']:.1f} ms: p50 {run['p50_ms']:.2f} ms, "
+              f"p95 {run['p95_ms']:.2f} ms, max {run['max_ms']:.2f} ms over {run['count']} commands")
+
+def extract_trace(video_path: str, output_path: str, labels_path: Optional[str]) -> None:
+    video = VideoReplay(video_path, start_time=0.0)
+    backend = dmouv.create_pose_backend()
+    timestamps, keypoints, boxes = [], [], []
+    while True:
+        ret, frame = video.read()
+        if not ret:
+            break
+        detections = backend.predict(frame)
+        timestamps.append(video.clock())
+        keypoints.append(detections.keypoints)
+        boxes.append(detections.boxes)
+
+    max_people = max((len(k) for k in keypoints), default=0)
+    padded_keypoints = np.full((len(keypoints), max(max_people, 1), 17, 3), np.nan, dtype=np.float32)
+    padded_boxes = np.full((len(boxes), max(max_people, 1), 4), np.nan, dtype=np.float32)
+    for index, (frame_keypoints, frame_boxes) in enumerate(zip(keypoints, boxes)):
+        padded_keypoints[index, :len(frame_keypoints)] = frame_keypoints
+        padded_boxes[index, :len(frame_boxes)] = frame_boxes
+
+    arrays = {"timestamps": np.array(timestamps), "keypoints": padded_keypoints, "boxes": padded_boxes}
+    if labels_path:
+        arrays["labels"] = np.load(labels_path).astype(bool)[:len(timestamps)]
+    np.savez_compressed(output_path, **arrays)
+    print(f"Saved {len(timestamps)} frames to {output_path}")
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Offline benchmark for the Smart Motion Detection System")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    video_parser = subparsers.add_parser("video", help="Replay a recorded video through the full pipeline")
+    video_parser.add_argument("path")
+    video_parser.add_argument("--pipelined", action="store_true", help="Use the threaded pipeline")
+
+    trace_parser = subparsers.add_parser("trace", help="Replay a saved keypoint trace (.npz or .dmkt)")
+    trace_parser.add_argument("path")
+
+    consistency_parser = subparsers.add_parser("consistency", 
+                                               help="Check motion decisions across frame strides and resolutions")
+    consistency_parser.add_argument("path")
+    consistency_parser.add_argument("--strides", default="1,2,3", help="Comma separated frame strides")
+    consistency_parser.add_argument("--scales", default="0.5,1,2", help="Comma separated resolution scales")
+    consistency_parser.add_argument("--drop", type=float, default=0.3, help="Fraction of frames dropped at random")
+    consistency_parser.add_argument("--jitter", type=float, default=0.01, help="Timestamp jitter (seconds)")
+    consistency_parser.add_argument("--seed", type=int, default=0)
+
+    for sub in (video_parser, trace_parser, consistency_parser):
+        sub.add_argument("--labels", help="Per-frame ground-truth labels (.npy), overrides trace labels")
+        sub.add_argument("--tolerance", type=float, default=0.5, help="Seconds of slack when matching events")
+        sub.add_argument("--config", help="Config file (same format as the device config.yaml)")
+        sub.add_argument("--set", action="append", default=[], metavar="Config.FIELD=value")
+        sub.add_argument("--json", help="Write the report as JSON to this file")
+    video_parser.add_argument("--backend", default=None, help="Inference backend (ncnn or ultralytics)")
+
+    governor_parser = subparsers.add_parser("governor", help="Simulate the quality governor on a virtual clock")
+    governor_parser.add_argument("--minutes", type=float, default=30.0)
+    governor_parser.add_argument("--camera-fps", type=float, default=15.0)
+    governor_parser.add_argument("--inference-ms", type=float, default=120.0,
+                                 help="Inference time at 640 px with InferenceConfig.NUM_THREADS threads")
+    governor_parser.add_argument("--fixed-input", action="store_true",
+                                 help="Input size does not change inference time (exported ncnn graph)")
+    governor_parser.add_argument("--cores", type=int, default=4)
+    governor_parser.add_argument("--config", help="Config file (same format as the device config.yaml)")
+    governor_parser.add_argument("--set", action="append", default=[], metavar="Config.FIELD=value")
+    governor_parser.add_argument("--json", help="Write the report as JSON to this file")
+
+    tracker_parser = subparsers.add_parser("tracker", help="Time the multi-person tracker per frame")
+    tracker_parser.add_argument("--people", type=int, default=10)
+    tracker_parser.add_argument("--frames", type=int, default=3000)
+    tracker_parser.add_argument("--fps", type=float, default=30.0)
+    tracker_parser.add_argument("--seed", type=int, default=0)
+    tracker_parser.add_argument("--config", help="Config file (same format as the device config.yaml)")
+    tracker_parser.add_argument("--set", action="append", default=[], metavar="Config.FIELD=value")
+    tracker_parser.add_argument("--json", help="Write the report as JSON to this file")
+
+    actuator_parser = subparsers.add_parser("actuator", help="Measure command-to-GPIO latency with busy threads")
+    actuator_parser.add_argument("--busy-threads", type=int, default=3)
+    actuator_parser.add_argument("--commands", type=int, default=200)
+    actuator_parser.add_argument("--seed", type=int, default=0)
+    actuator_parser.add_argument("--config", help="Config file (same format as the device config.yaml)")
+    actuator_parser.add_argument("--set", action="append", default=[], metavar="Config.FIELD=value")
+    actuator_parser.add_argument("--json", help="Write the report as JSON to this file")
+
+    extract_parser = subparsers.add_parser("extract", help="Run the pose model on a video and save a trace")
+    extract_parser.add_argument("video")
+    extract_parser.add_argument("output")
+    extract_parser.add_argument("--labels")
+
+    args = parser.parse_args()
+
+    if args.command == "extract":
+        extract_trace(args.video, args.output, args.labels)
+        return 0
+
+    if args.config:
+        dmouv.load_config(args.config, environ={})
+    configure_offline(pipelined=getattr(args, "pipelined", False))
+    apply_overrides(args.set)
+    if args.command == "governor":
+        report = run_governor_simulation(args.minutes, args.camera_fps, args.inference_ms, 
+                                         args.fixed_input, args.cores)
+        print_governor(report)
+        if args.json:
+            with open(args.json, "w") as report_file:
+                json.dump(report, report_file, indent=2)
+        return 0
+    if args.command == "tracker":
+        report = run_tracker_benchmark(args.people, args.frames, args.fps, args.seed)
+        print_tracker(report)
+        if args.json:
+            with open(args.json, "w") as report_file:
+                json.dump(report, report_file, indent=2)
+        return 0
+    if args.command == "actuator":
+        report = run_actuator_benchmark(args.busy_threads, args.commands, args.seed)
+        print_actuator(report)
+        if args.json:
+            with open(args.json, "w") as report_file:
+                json.dump(report, report_file, indent=2)
+        return 0
+    labels = np.load(args.labels).astype(bool) if args.labels else None
+
+    if args.command == "consistency":
+        report = run_consistency(args.path, labels, [int(value) for value in args.strides.split(",")],
+                                 [float(value) for value in args.scales.split(",")],
+                                 args.drop, args.jitter, args.tolerance, args.seed)
+        print_consistency(report)
+        if args.json:
+            with open(args.json, "w") as report_file:
+                json.dump(report, report_file, indent=2)
+        return 0 if report["consistent"] else 1
+
+    if args.command == "trace":
+        dmouv.InferenceSchedulerConfig.ENABLED = False      # trace tidak berisi piksel
+        replay = TraceReplay(args.path)
+        report = run_benchmark(replay, replay, replay.clock, labels,
+                               lambda: np.array(replay.timestamps), args.tolerance,
+                               lambda: replay.labels)
+    else:
+        replay = VideoReplay(args.path)
+        backend = dmouv.create_pose_backend(args.backend)
+        backend.warmup()
+        report = run_benchmark(replay, backend, replay.clock, labels,
+                               lambda: replay.start_time + np.arange(replay.index + 1) / replay.fps,
+                               args.tolerance)
+
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as report_file:
+            json.dump(report, report_file, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
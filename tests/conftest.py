@@ -0,0 +1,35 @@
+import os
+import sys
+import copy
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import AIoT_DMouv as dmouv
+from gpiozero import Device
+from gpiozero.pins.mock import MockFactory, MockPWMPin
+
+Device.pin_factory = MockFactory(pin_class=MockPWMPin)
+
+def snapshot_config():
+    return {section: copy.deepcopy({key: value for key, value in vars(cls).items() if key.isupper()})
+            for section, cls in dmouv.CONFIG_SECTIONS.items()}
+
+def restore_config(snapshot):
+    for section, values in snapshot.items():
+        for key, value in values.items():
+            setattr(dmouv.CONFIG_SECTIONS[section], key, value)
+
+@pytest.fixture(autouse=True)
+def config():
+    # Config adalah atribut class global, setiap tes mulai dari nilai yang sama
+    snapshot = snapshot_config()
+    yield
+    restore_config(snapshot)
+
+@pytest.fixture(scope="module")
+def module_config():
+    snapshot = snapshot_config()
+    yield
+    restore_config(snapshot)
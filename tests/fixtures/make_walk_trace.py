@@ -0,0 +1,47 @@
+"""Regenerates walk_trace.npz, the synthetic trace used by test_consistency.py.
+
+One person stands still, walks back and forth, stands still again and then
+leaves the frame. Frames in the walking segment are labeled as motion.
+
+    python3 tests/fixtures/make_walk_trace.py
+"""
+import os
+import numpy as np
+
+FPS = 30.0
+STILL_BEFORE, WALKING, STILL_AFTER, ABSENT = 6.0, 8.0, 4.0, 8.0
+
+# Pose berdiri (COCO 17 keypoint) relatif ke titik tengah pinggul, dalam piksel
+SKELETON = np.array([
+    [0, -150], [-6, -156], [6, -156], [-14, -152], [14, -152],
+    [-30, -110], [30, -110], [-38, -60], [38, -60], [-40, -15], [40, -15],
+    [-18, 0], [18, 0], [-20, 70], [20, 70], [-20, 140], [20, 140],
+], dtype=np.float32)
+LEGS_AND_ARMS = np.array([7, 8, 9, 10, 13, 14, 15, 16])
+
+def make_trace(seed: int = 0):
+    rng = np.random.default_rng(seed)
+    timestamps = 1000.0 + np.arange(int((STILL_BEFORE + WALKING + STILL_AFTER + ABSENT) * FPS)) / FPS
+    elapsed = timestamps - timestamps[0]
+    walking = (elapsed >= STILL_BEFORE) & (elapsed < STILL_BEFORE + WALKING)
+    # Jalan ke kanan lalu kembali dengan ~190 px/detik (~0.6 diagonal badan per detik)
+    phase = np.clip(elapsed - STILL_BEFORE, 0.0, WALKING)
+    offset = 190.0 * np.minimum(phase, WALKING - phase)
+    swing = np.where(walking, np.sin(2 * np.pi * 1.5 * elapsed), 0.0)
+
+    keypoints = np.empty((len(timestamps), 1, 17, 3), dtype=np.float32)
+    for index, (x, amount) in enumerate(zip(offset, swing)):
+        points = SKELETON.copy()
+        points[LEGS_AND_ARMS, 0] += amount * 8.0 * np.array([1, -1, 1, -1, -1, 1, -1, 1])
+        points += np.array([300.0 + x, 360.0]) + rng.normal(0, 0.5, points.shape)
+        keypoints[index, 0, :, :2] = points
+        keypoints[index, 0, :, 2] = rng.uniform(0.8, 0.95, 17)
+    keypoints[elapsed >= STILL_BEFORE + WALKING + STILL_AFTER] = np.nan      # orang keluar dari frame
+    return timestamps, keypoints, walking
+
+if __name__ == "__main__":
+    timestamps, keypoints, labels = make_trace()
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "walk_trace.npz")
+    # Box dihitung ulang dari keypoint saat replay, float16 cukup seperti trace .dmkt
+    np.savez_compressed(path, timestamps=timestamps, keypoints=keypoints.astype(np.float16), labels=labels)
+    print(f"Saved {len(timestamps)} frames to {path}")
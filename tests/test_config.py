@@ -0,0 +1,88 @@
+import json
+import queue
+
+import pytest
+
+import AIoT_DMouv as dmouv
+from AIoT_DMouv import ConfigError, HOT_RELOAD_FIELDS, _coerce_config_value, load_config, validate_config
+
+@pytest.mark.parametrize("value", [float("nan"), float("inf"), float("-inf"), ".nan", ".inf", "-.inf"])
+def test_non_finite_numbers_are_rejected(value):
+    with pytest.raises(ConfigError, match="finite"):
+        _coerce_config_value("MotionDetectionConfig.MOVEMENT_SPEED_THRESHOLD", 0.4, value)
+
+def test_nan_from_mqtt_json_is_rejected():
+    updates = json.loads('{"MotionDetectionConfig": {"MOVEMENT_SPEED_THRESHOLD": NaN}}')
+    with pytest.raises(ConfigError, match="finite"):
+        validate_config(updates, HOT_RELOAD_FIELDS)
+
+@pytest.mark.parametrize("current, value", [(10, True), (10, False), (0.5, True), (10, "true"), (10, 2.5)])
+def test_bool_is_not_a_number(current, value):
+    with pytest.raises(ConfigError):
+        _coerce_config_value("Test.FIELD", current, value)
+
+def test_numbers_are_coerced_to_the_default_type():
+    assert _coerce_config_value("Test.FIELD", 10, 3.0) == 3
+    assert isinstance(_coerce_config_value("Test.FIELD", 10, 3.0), int)
+    assert _coerce_config_value("Test.FIELD", 0.5, 1) == 1.0
+    assert isinstance(_coerce_config_value("Test.FIELD", 0.5, 1), float)
+    assert _coerce_config_value("Test.FIELD", 0.5, "0.25") == 0.25
+    with pytest.raises(ConfigError, match="true/false"):
+        _coerce_config_value("Test.FIELD", False, 1)
+
+def test_tuple_fields_keep_their_type():
+    assert _coerce_config_value("InferenceSchedulerConfig.MOTION_GRID", (80, 60), [40, 30]) == (40, 30)
+    assert _coerce_config_value("DeviceConfig.PWM_DEVICES", (), '["fan"]') == ("fan",)
+    with pytest.raises(ConfigError, match="expected a list"):
+        _coerce_config_value("DeviceConfig.PWM_DEVICES", (), "fan")
+
+@pytest.mark.parametrize("grid", [[40], [40, 30, 20], [40.5, 30], [True, 30], [4, 30]])
+def test_invalid_motion_grid_is_rejected(grid):
+    with pytest.raises(ConfigError, match="MOTION_GRID"):
+        validate_config({"InferenceSchedulerConfig": {"MOTION_GRID": grid}})
+
+def test_limits_and_cross_field_checks():
+    with pytest.raises(ConfigError, match="outside"):
+        validate_config({"MotionDetectionConfig": {"CONFIDENCE_THRESHOLD": 1.5}})
+    with pytest.raises(ConfigError, match="MIN_PAIR_INTERVAL"):
+        validate_config({"MotionDetectionConfig": {"MIN_PAIR_INTERVAL": 2.0}})
+    with pytest.raises(ConfigError, match="multiple of 32"):
+        validate_config({"ROIConfig": {"MIN_IMGSZ": 250}})
+
+def test_update_is_all_or_nothing():
+    threshold = dmouv.MotionDetectionConfig.MOVEMENT_SPEED_THRESHOLD
+    with pytest.raises(ConfigError) as error:
+        validate_config({"MotionDetectionConfig": {"MOVEMENT_SPEED_THRESHOLD": 0.9, "NOT_A_FIELD": 1},
+                         "InferenceConfig": {"MODEL_PATH": "other"}}, HOT_RELOAD_FIELDS)
+    assert "NOT_A_FIELD" in str(error.value)
+    assert "cannot be changed at runtime" in str(error.value)
+    assert dmouv.MotionDetectionConfig.MOVEMENT_SPEED_THRESHOLD == threshold
+
+def test_environment_overrides_are_validated():
+    load_config(environ={"DMOUV_MOTIONDETECTION__AUTO_OFF_DELAY": "30",
+                         "DMOUV_INFERENCESCHEDULER__MOTION_GRID": "[40, 30]"})
+    assert dmouv.MotionDetectionConfig.AUTO_OFF_DELAY == 30.0
+    assert dmouv.InferenceSchedulerConfig.MOTION_GRID == (40, 30)
+    with pytest.raises(ConfigError):
+        load_config(environ={"DMOUV_MOTIONDETECTION__AUTO_OFF_DELAY": "nan"})
+
+def test_mqtt_update_is_applied_by_the_consumer():
+    handler = dmouv.MQTTHandler(None)
+    acks = []
+    handler.publish_sensor_data = lambda device, data, room=None, timestamp=None: acks.append(data)
+    updates = queue.Queue()
+    handler.config_listeners.append(updates.put)
+    threshold = dmouv.MotionDetectionConfig.MOVEMENT_SPEED_THRESHOLD
+   
+    handler._handle_config_update({"MotionDetectionConfig": {"MOVEMENT_SPEED_THRESHOLD": 0.9,
+                                                             "MOTION_WINDOW": 5.0}}, None)
+    # Thread MQTT hanya memvalidasi, nilai belum berubah sampai consumer mengambil update di batas frame
+    assert dmouv.MotionDetectionConfig.MOVEMENT_SPEED_THRESHOLD == threshold
+    assert acks == []
+   
+    for resolved, room, command in dmouv.drain_config_updates(updates):
+        handler.config_applied(resolved, room, command)
+    assert dmouv.MotionDetectionConfig.MOVEMENT_SPEED_THRESHOLD == 0.9
+    assert dmouv.MotionDetectionConfig.MOTION_WINDOW == 5.0
+    assert acks == [{"config": {"MotionDetectionConfig.MOVEMENT_SPEED_THRESHOLD": 0.9,
+                                "MotionDetectionConfig.MOTION_WINDOW": 5.0}}]
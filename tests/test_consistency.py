@@ -0,0 +1,47 @@
+import os
+
+import numpy as np
+import pytest
+
+import AIoT_DMouv as dmouv
+import benchmark
+
+TRACE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "walk_trace.npz")
+
+@pytest.fixture(scope="module")
+def report(module_config):
+    benchmark.configure_offline(pipelined=False)
+    return benchmark.run_consistency(TRACE, None, strides=[2, 3], scales=[0.5, 2.0], 
+                                     drop=0.3, jitter=0.01, tolerance=0.5, seed=0)
+
+def variant(report, name):
+    return next(result for result in report["variants"] if result["name"] == name)
+
+def test_trace_fixture_matches_generator():
+    from fixtures.make_walk_trace import make_trace
+    timestamps, keypoints, labels = make_trace()
+    trace = np.load(TRACE)
+    np.testing.assert_array_equal(trace["timestamps"], timestamps)
+    np.testing.assert_array_equal(trace["labels"], labels)
+    np.testing.assert_array_equal(trace["keypoints"], keypoints.astype(np.float16))
+
+def test_labeled_segment_triggers_and_clears(report):
+    detection = variant(report, "baseline")["detection"]
+    assert detection["segments"] == 1
+    assert detection["triggered"] == 1
+    assert detection["missed"] == 0
+    assert detection["false_triggers"] == 0
+    assert detection["clear_latency"]
+
+@pytest.mark.parametrize("name", ["stride 2", "stride 3", "scale 0.5", "scale 2", "drop 0.3 jitter 0.01s"])
+def test_variant_matches_full_rate_decisions(report, name):
+    result = variant(report, name)
+    assert result["consistent"], result
+    assert (result["triggers"], result["clears"]) == (1, 1)
+    assert result["detection"]["triggered"] == 1
+    assert result["detection"]["false_triggers"] == 0
+
+def test_position_buffer_covers_motion_window():
+    # Buffer lama (15 posisi) hanya menyimpan 0.5 detik pada 30 fps
+    fps = 1.0 / float(np.median(np.diff(np.load(TRACE)["timestamps"])))
+    assert dmouv.MotionDetectionConfig.POSITION_BUFFER_SIZE >= fps * dmouv.MotionDetectionConfig.MOTION_WINDOW
@@ -0,0 +1,61 @@
+from contextlib import closing
+
+import pytest
+
+from AIoT_DMouv import EventStore
+
+HOUR = 1_800_000_000 // 3600 * 3600
+
+def rollup_table(store, metric):
+    return {(row["hour"] - HOUR) // 3600: row["seconds"] for row in store.rollups(HOUR, metric=metric)}
+
+@pytest.fixture
+def clock():
+    now = [HOUR]
+    return now
+
+@pytest.fixture
+def store(tmp_path, clock):
+    store = EventStore(str(tmp_path / "events.db"), clock=lambda: clock[0])
+    yield store
+    store.close()
+
+def test_intervals_are_split_at_hour_boundaries(store, clock):
+    store.record(HOUR + 3000, None, "occupancy", value=1.0)
+    store.record(HOUR + 3300, None, "device", "lamp", 0.5)
+    store.record(HOUR + 3600 + 1200, None, "occupancy", value=0.0)
+    store.record(HOUR + 7200 + 60, None, "device", "lamp", 0.0)
+    clock[0] = HOUR + 7200 + 600
+    store.close()
+    
+    assert rollup_table(store, "occupied_seconds") == {0: pytest.approx(600), 1: pytest.approx(1200)}
+    assert rollup_table(store, "on_seconds") == {0: pytest.approx(300), 1: pytest.approx(3600), 2: pytest.approx(60)}
+    assert rollup_table(store, "level_seconds") == {0: pytest.approx(150), 1: pytest.approx(1800), 
+                                                    2: pytest.approx(30)}
+    assert [event["kind"] for event in store.events()] == ["occupancy", "device", "occupancy", "device"]
+
+def test_open_interval_is_credited_until_close(store, clock):
+    store.record(HOUR + 1800, "bedroom", "occupancy", value=1.0)
+    clock[0] = HOUR + 3600 + 900
+    store.close()
+    
+    rows = store.rollups(HOUR, metric="occupied_seconds", room="bedroom")
+    assert [(row["hour"], row["seconds"]) for row in rows] == [(HOUR, pytest.approx(1800)), 
+                                                               (HOUR + 3600, pytest.approx(900))]
+    assert store.rollups(HOUR, room="kitchen") == []
+
+def test_sync_sends_each_completed_hour_once(store, clock):
+    sent = []
+    store.sync_publisher = sent.append
+    store.record(HOUR + 3000, None, "occupancy", value=1.0)
+    clock[0] = HOUR + 3600 + 600
+    store.close()
+    
+    with closing(store._connect()) as connection:
+        store._sync(connection)
+        # Jam berjalan (HOUR + 3600) belum dikirim; setelah jam berganti hanya jam itu yang dikirim
+        clock[0] = HOUR + 7200 + 10
+        store._sync(connection)
+        store._sync(connection)
+    assert [[(row["hour"] - HOUR, row["seconds"]) for row in batch] for batch in sent] == [
+        [(0, 600.0)], [(3600, 600.0)]]
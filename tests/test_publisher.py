@@ -0,0 +1,94 @@
+import json
+import os
+import time
+
+import pytest
+
+from AIoT_DMouv import MQTTHandler, MQTTPublisher, MQTTConfig, PublisherConfig, mqtt
+
+class PublishInfo:
+    def __init__(self, rc):
+        self.rc = rc
+
+    def wait_for_publish(self, timeout=None):
+        pass
+
+class FakeClient:
+    def __init__(self, failures=0):
+        self.failures = failures        # jumlah publish berikutnya yang ditolak
+        self.published = []
+
+    def publish(self, topic, payload, qos=0):
+        if self.failures:
+            self.failures -= 1
+            return PublishInfo(mqtt.MQTT_ERR_QUEUE_SIZE)
+        self.published.append((topic, json.loads(payload)))
+        return PublishInfo(mqtt.MQTT_ERR_SUCCESS)
+
+def events(client):
+    # Batch {"events": [...]} dibuka lagi menjadi pesan satu per satu
+    for topic, payload in client.published:
+        yield from ((topic, event) for event in payload.get("events", [payload]))
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+@pytest.fixture(autouse=True)
+def spool_path(tmp_path):
+    PublisherConfig.SPOOL_PATH = str(tmp_path / "spool" / "mqtt_spool.jsonl")
+    PublisherConfig.BATCH_MAX_DELAY = 0.05
+    PublisherConfig.RETRY_INTERVAL = 0.05
+    return PublisherConfig.SPOOL_PATH
+
+def test_repeated_sensor_events_coalesce_but_transitions_are_kept():
+    handler = MQTTHandler(None)
+    client = FakeClient()
+    handler.publisher = MQTTPublisher(client)
+    handler.publisher.set_connected(True)
+    PublisherConfig.BATCH_MAX_DELAY = 60.0      # semua pesan masuk satu batch, dikirim saat close
+    handler.publisher.start()
+    
+    handler.publish_sensor_data("lamp", {"motion_detected": True}, timestamp=1.0)
+    handler.publish_sensor_data("lamp", {"motion_detected": True}, timestamp=2.0)
+    handler.publish_sensor_data("lamp", {"motion_cleared": True}, timestamp=3.0)
+    handler.publish_sensor_data("fan", {"motion_detected": True}, timestamp=4.0)
+    handler.publisher.close()
+    
+    sent = [(event["device"], event["timestamp"], "motion_detected" in event) for _, event in events(client)]
+    assert sent == [("lamp", 2.0, True), ("lamp", 3.0, False), ("fan", 4.0, True)]
+    assert all(topic == MQTTConfig.SENSOR_TOPIC for topic, _ in client.published)
+
+def test_offline_messages_are_spooled_and_replayed_in_order(spool_path):
+    client = FakeClient()
+    publisher = MQTTPublisher(client)
+    publisher.start()
+    for index in range(5):
+        publisher.publish("sensor", {"index": index})
+    publisher.close()
+    assert client.published == []
+    assert os.path.getsize(spool_path) > 0
+    
+    # Proses baru menemukan spool lama dan memutarnya ulang setelah terhubung, sebelum pesan baru
+    publisher = MQTTPublisher(client)
+    publisher.start()
+    publisher.publish("sensor", {"index": 5})
+    publisher.set_connected(True)
+    publisher.close()
+    assert [event["index"] for _, event in events(client)] == list(range(6))
+    assert not os.path.exists(spool_path)
+
+def test_rejected_publish_is_retried_from_spool(spool_path):
+    client = FakeClient(failures=1)
+    publisher = MQTTPublisher(client)
+    publisher.set_connected(True)
+    publisher.start()
+    for index in range(3):
+        publisher.publish("sensor", {"index": index}, immediate=True)
+        time.sleep(0.01)
+    wait_until(lambda: publisher.stats.counters.get("mqtt_replayed", 0) > 0 and not publisher._spooled)
+    publisher.close()
+    assert [event["index"] for _, event in events(client)] == [0, 1, 2]
+    assert publisher.stats.counters["mqtt_publish_errors"] == 1
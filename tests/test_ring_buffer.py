@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from AIoT_DMouv import KeypointRingBuffer
+
+def brute_force(frames):
+    valid = sum(1 for frame in frames if frame["valid"])
+    significant = [frame["pair"][1] for frame in frames if frame["pair"] is not None and frame["pair"][0]]
+    return valid, len(significant), sum(significant)
+
+def assert_matches(buffer, frames):
+    valid, movements, duration = brute_force(frames)
+    assert buffer.count == len(frames)
+    assert buffer.valid_frames == valid
+    assert buffer.significant_movements == movements
+    assert buffer.significant_duration == pytest.approx(duration, abs=1e-9)
+    np.testing.assert_array_equal(buffer.timestamps[buffer.ordered_indices()], 
+                                  [frame["timestamp"] for frame in frames])
+
+@pytest.mark.parametrize("seed", range(5))
+def test_incremental_sums_match_brute_force(seed):
+    rng = np.random.default_rng(seed)
+    size, window = 32, 1.0
+    buffer = KeypointRingBuffer(size)
+    frames = []
+    timestamp = 0.0
+    for step in range(2000):
+        timestamp += rng.uniform(0.01, 0.08)
+        use_window = rng.random() < 0.7
+        present = rng.random() < 0.8
+        keypoints = rng.normal(size=(17, 3)).astype(np.float32) if present else None
+        buffer.append(keypoints, np.ones(17, dtype=bool) if present else None, (0.0, 0.0) if present else None, 
+                      timestamp, window=window if use_window else None)
+        
+        # Model: buang frame terlama saat penuh, lalu frame di luar window
+        if len(frames) == size:
+            frames.pop(0)
+        if use_window:
+            frames = [frame for frame in frames if frame["timestamp"] >= timestamp - window]
+        frames.append({"timestamp": timestamp, "valid": present, "pair": None})
+        
+        if present and rng.random() < 0.6:
+            significant, duration = bool(rng.random() < 0.5), float(rng.uniform(0.01, 0.1))
+            buffer.set_newest_pair(significant, True, duration)
+            frames[-1]["pair"] = (significant, duration)
+        
+        if step % 250 == 249:
+            size = int(rng.integers(2, 64))
+            buffer.resize(size)
+            frames = frames[-size:]
+        assert_matches(buffer, frames)
+
+def test_clear_resets_counters():
+    buffer = KeypointRingBuffer(8)
+    for index in range(5):
+        buffer.append(np.zeros((17, 3), dtype=np.float32), np.ones(17, dtype=bool), (0.0, 0.0), float(index))
+        buffer.set_newest_pair(True, True, 0.1)
+    buffer.clear()
+    assert_matches(buffer, [])
@@ -0,0 +1,52 @@
+from datetime import datetime
+
+import pytest
+
+from AIoT_DMouv import DeviceSchedule, ScheduleError
+
+def at(day, hour, minute=0):
+    # 19 Oktober 2026 adalah hari Senin (waktu lokal, seperti state_at)
+    return datetime(2026, 10, 19 + day, hour, minute).timestamp()
+
+def test_window_across_midnight():
+    schedule = DeviceSchedule([{"on": "22:00", "off": "06:30"}])
+    assert schedule.state_at(at(0, 21, 59)) == (False, at(0, 22))
+    assert schedule.state_at(at(0, 23)) == (True, at(1, 6, 30))
+    assert schedule.state_at(at(1, 3)) == (True, at(1, 6, 30))
+    assert schedule.state_at(at(1, 6, 30)) == (False, at(1, 22))
+    assert schedule.state_at(at(6, 23)) == (True, at(7, 6, 30))      # Minggu -> Senin
+
+def test_weekday_window_skips_weekend():
+    schedule = DeviceSchedule([{"on": "07:00", "off": "09:00", "days": "weekdays"}])
+    assert schedule.state_at(at(4, 8))[0]                  # Jumat
+    assert schedule.state_at(at(4, 9)) == (False, at(7, 7))     # berikutnya Senin
+    assert not schedule.state_at(at(5, 8))[0]              # Sabtu
+    assert not schedule.state_at(at(6, 8))[0]              # Minggu
+
+def test_sunday_night_window_wraps_to_monday():
+    schedule = DeviceSchedule([{"on": "23:00", "off": "01:00", "days": ["sun"]}])
+    assert schedule.state_at(at(6, 23, 30)) == (True, at(7, 1))
+    assert schedule.state_at(at(0, 0, 30))[0]               # Senin dini hari, dari window hari Minggu
+    assert not schedule.state_at(at(5, 23, 30))[0]
+
+def test_overlapping_windows_merge():
+    schedule = DeviceSchedule([{"on": "08:00", "off": "12:00", "days": ["mon", 2]}, 
+                               {"on": "11:00", "off": "13:00", "days": "mon"}])
+    assert schedule.state_at(at(0, 11, 30)) == (True, at(0, 13))
+    assert schedule.state_at(at(2, 12, 30))[0] is False
+
+@pytest.mark.parametrize("windows", [
+    [],
+    ["08:00-09:00"],
+    [{"on": "08:00", "off": "08:00"}],
+    [{"on": "24:00", "off": "08:00"}],
+    [{"on": "8", "off": "09:00"}],
+    [{"on": "aa:bb", "off": "09:00"}],
+    [{"on": None, "off": "09:00"}],
+    [{"on": "08:00", "off": "09:00", "days": ["someday"]}],
+    [{"on": "08:00", "off": "09:00", "days": [7]}],
+    [{"on": "08:00", "off": "09:00", "days": []}],
+])
+def test_invalid_schedules_are_rejected(windows):
+    with pytest.raises(ScheduleError):
+        DeviceSchedule(windows)
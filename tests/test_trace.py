@@ -0,0 +1,84 @@
+import os
+
+import numpy as np
+
+from AIoT_DMouv import KeypointTraceReader, KeypointTraceWriter, PoseDetections, TRACE_ROW
+
+def make_detections(rng, people):
+    keypoints = rng.uniform(0, 640, (people, 17, 3)).astype(np.float32)
+    keypoints[..., 2] = rng.uniform(0, 1, (people, 17))
+    boxes = np.concatenate([keypoints[..., :2].min(axis=1), keypoints[..., :2].max(axis=1)], axis=1)
+    return PoseDetections(boxes, rng.uniform(0.3, 1.0, people).astype(np.float32), keypoints)
+
+def write_frames(writer, rng, count, start_time=0.0):
+    frames = []
+    for index in range(count):
+        timestamp, detections = start_time + index / 30.0, make_detections(rng, int(rng.integers(0, 4)))
+        writer.append(timestamp, detections)
+        frames.append((timestamp, detections))
+    return frames
+
+def assert_frames_equal(actual, expected):
+    assert len(actual) == len(expected)
+    for (timestamp, detections), (expected_timestamp, expected_detections) in zip(actual, expected):
+        assert timestamp == expected_timestamp
+        assert len(detections) == len(expected_detections)
+        # Trace menyimpan float16
+        np.testing.assert_allclose(detections.keypoints, expected_detections.keypoints, rtol=1e-3, atol=0.5)
+        np.testing.assert_allclose(detections.boxes, expected_detections.boxes, rtol=1e-3, atol=0.5)
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "trace.dmkt")
+    rng = np.random.default_rng(0)
+    writer = KeypointTraceWriter(path, chunk_frames=16, max_people=4)
+    frames = write_frames(writer, rng, 100)
+    writer.close()
+    
+    reader = KeypointTraceReader(path)
+    assert len(reader) == 100
+    assert len(reader.index) == 7        # 6 chunk penuh + sisa 4 frame saat close
+    assert_frames_equal(list(reader.iter_frames()), frames)
+    # Batch kecil dan start_time tidak mengubah isi
+    batched = [frame for batch in reader.iter_batches(max_rows=10) for frame in batch.frames()]
+    assert_frames_equal(batched, frames)
+    assert next(reader.iter_batches(start_time=2.0)).timestamps[0] <= 2.0
+
+def test_resume_from_index(tmp_path):
+    path = str(tmp_path / "trace.dmkt")
+    rng = np.random.default_rng(1)
+    writer = KeypointTraceWriter(path, chunk_frames=8, max_people=4)
+    frames = write_frames(writer, rng, 40)
+    writer.close()
+    
+    writer = KeypointTraceWriter(path, chunk_frames=8, max_people=4)
+    assert writer.frame_number == 40
+    frames += write_frames(writer, rng, 20, start_time=10.0)
+    writer.close()
+    
+    reader = KeypointTraceReader(path)
+    assert len(reader) == 60
+    np.testing.assert_array_equal(np.unique(reader.rows["frame"]), np.arange(60))
+    assert_frames_equal(list(reader.iter_frames()), frames)
+
+def test_resume_after_torn_write(tmp_path):
+    path = str(tmp_path / "trace.dmkt")
+    rng = np.random.default_rng(2)
+    writer = KeypointTraceWriter(path, chunk_frames=8, max_people=4)
+    frames = write_frames(writer, rng, 24)
+    writer.close()
+    # Proses mati di tengah chunk: index terakhir hilang dan baris terakhir terpotong
+    with open(path + ".idx", "r+b") as index_file:
+        index_file.truncate(os.path.getsize(path + ".idx") - 1)
+    with open(path, "ab") as data_file:
+        data_file.write(b"\0" * (TRACE_ROW.itemsize // 2))
+    
+    reader = KeypointTraceReader(path)
+    assert len(reader) == 24
+    assert_frames_equal(list(reader.iter_frames()), frames)
+    del reader
+    
+    writer = KeypointTraceWriter(path, chunk_frames=8, max_people=4)
+    assert writer.frame_number == 24
+    frames += write_frames(writer, rng, 8, start_time=5.0)
+    writer.close()
+    assert_frames_equal(list(KeypointTraceReader(path).iter_frames()), frames)